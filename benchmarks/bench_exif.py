@@ -0,0 +1,65 @@
+"""
+Compares the header-only EXIF date parser with the Pillow path.
+
+Usage:
+    python -m benchmarks.bench_exif [photo_dir]
+
+Without arguments, a corpus of 300 JPEGs with camera-style EXIF is created
+in a temporary directory. Both paths must agree on every file; mismatches
+are listed.
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.exif_extractor import (parse_exif_dates, _read_exif_dates_pillow, read_exif_dates,
+                                HEADER_READ_SIZE)
+
+def _make_corpus(directory, count=300):
+    for i in range(count):
+        exif = Image.Exif()
+        exif[271] = "Camera Maker"
+        exif[306] = f"2023:05:{i % 28 + 1:02d} 10:00:00"
+        if i % 3:
+            exif.get_ifd(0x8769)[36867] = f"2022:04:{i % 28 + 1:02d} 09:30:00"
+        Image.new('RGB', (1600, 1200), color=(i % 256, 40, 90)).save(
+            Path(directory) / f"IMG_{i:04d}.jpg", exif=exif, quality=85)
+
+def _time(func, paths):
+    start = time.perf_counter()
+    results = [func(p) for p in paths]
+    return time.perf_counter() - start, results
+
+def run(directory):
+    paths = sorted(str(p) for p in Path(directory).rglob("*")
+                   if p.suffix.lower() in {'.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff'})
+    slow_time, slow = _time(_read_exif_dates_pillow, paths)
+    fast_time, fast = _time(read_exif_dates, paths)
+    mismatches = [p for p, a, b in zip(paths, fast, slow)
+                  if any((a.get(t) or None) != (b.get(t) or None) for t in (36867, 306))]
+    parsed = 0
+    for p in paths:
+        with open(p, 'rb') as f:
+            parsed += parse_exif_dates(f.read(HEADER_READ_SIZE)) is not None
+    n = len(paths)
+    print(f"files:            {n} ({parsed} handled by the fast path)")
+    print(f"Pillow:           {slow_time / n * 1e6:8.1f} us/file")
+    print(f"header parser:    {fast_time / n * 1e6:8.1f} us/file")
+    print(f"speedup:          {slow_time / fast_time:8.1f}x")
+    print(f"mismatches:       {len(mismatches)}")
+    for p in mismatches:
+        print(f"  {p}")
+
+def main():
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        _make_corpus(tmp)
+        run(tmp)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compares digest algorithms, block sizes and read strategies of get_file_hash.
+
+Usage:
+    python -m benchmarks.bench_hashing [file ...]
+
+Without arguments, a synthetic 8 MB "JPEG" and 48 MB "RAW" file are created
+in a temporary directory. Pass real photos to measure your own library.
+Numbers include page-cache effects: run twice and read the second pass for
+CPU-bound figures.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.deduplicator import get_file_hash
+
+ALGORITHMS = ("md5", "sha256", "blake2b")
+BLOCK_SIZES = (65536, 262144, 1048576)
+
+def _read_loop(path, block_size, algorithm):
+    # Pre-change implementation: a new bytes object per chunk
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _file_digest(path, block_size, algorithm):
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, algorithm).hexdigest()
+
+STRATEGIES = {
+    "read-loop": _read_loop,
+    "readinto": lambda p, b, a: get_file_hash(p, block_size=b, algorithm=a),
+    "mmap": lambda p, b, a: get_file_hash(p, block_size=b, algorithm=a, use_mmap=True),
+}
+if hasattr(hashlib, "file_digest"):
+    STRATEGIES["file_digest"] = _file_digest
+
+def _time(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(paths):
+    print(f"{'file':<14}{'algorithm':<10}{'block':>9}  {'strategy':<12}{'MB/s':>9}")
+    for path in paths:
+        size_mb = os.path.getsize(path) / 1e6
+        for algorithm in ALGORITHMS:
+            for block_size in BLOCK_SIZES:
+                for name, func in STRATEGIES.items():
+                    if name == "file_digest" and block_size != BLOCK_SIZES[0]:
+                        continue  # file_digest picks its own buffer size
+                    seconds = _time(func, path, block_size, algorithm)
+                    print(f"{Path(path).name[:13]:<14}{algorithm:<10}{block_size:>9}  "
+                          f"{name:<12}{size_mb / seconds:>9.1f}")
+
+def main():
+    if len(sys.argv) > 1:
+        run(sys.argv[1:])
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for name, size in (("sample.jpg", 8 * 10**6), ("sample.cr2", 48 * 10**6)):
+            path = Path(tmp) / name
+            path.write_bytes(os.urandom(size))
+            paths.append(str(path))
+        run(paths)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import logging
+import os
+import threading
+import time
+from src.spool import SpoolQueue
+
+class DebounceScheduler:
+    """
+    Hands paths to a worker pool once they stopped changing.
+    submit() only records the path, so it never blocks the caller (e.g. the
+    watchdog dispatch thread). A timer thread re-stats each pending path
+    when its deadline is reached: if size and mtime are unchanged since the
+    last look and have been for settle_interval seconds, the path is passed
+    to callback on one of the workers; otherwise its deadline moves on.
+    Paths that disappear while pending are dropped.
+    Pending and running paths are kept in a map keyed by absolute path, so
+    any number of events for one file coalesce into a single callback; an
+    event that arrives while the file is being processed schedules one more
+    look at it afterwards (normally a no-op, since the file was moved away).
+    Settled paths wait for a worker in a SpoolQueue holding at most
+    max_queued of them in memory. With a spool_path the rest spill to disk
+    and survive restarts; without one the timer waits for room, while
+    submit() keeps accepting events.
+    With a key function (e.g. which inbox a path belongs to), each key gets
+    its own queue (and spool file) and workers take from the queues in
+    turn, so a burst under one key never delays the others by more than
+    one file per queue. quotas caps how many files of a key are processed
+    at once; keys without a quota may use every worker.
+    """
+    def __init__(self, callback, workers=4, settle_interval=1.0, spool_path=None, max_queued=10000,
+                 on_done=None, metrics=None, key=None, quotas=None):
+        self.callback = callback
+        # Called with the absolute path whenever a path leaves the scheduler
+        # (processed, vanished or discarded), e.g. to track progress
+        self.on_done = on_done
+        # Optional Metrics: worker busy time and first-seen-to-done latency
+        self.metrics = metrics
+        self.workers = workers
+        self.settle_interval = settle_interval
+        self.spool_path = spool_path
+        self.max_queued = max_queued
+        self.key = key
+        # key -> max files of that key processed at once (None: no limit)
+        self.quotas = dict(quotas or {})
+        # key -> SpoolQueue, in round-robin order; created on first use, or
+        # up front for known keys so their spools are replayed. Paths
+        # without a key (no key function) go to the None queue.
+        self._queues = {}
+        for name in [None] + list(self.quotas):
+            self._queue_for(name)
+        self._turn = 0
+        # key -> number of its files being processed
+        self._active = {}
+        self._stopping = False
+        self._cond = threading.Condition()
+        # path -> {"signature": (size, mtime_ns), "deadline": monotonic time,
+        #          "since": wall time it was first seen}
+        self._pending = {}
+        # paths handed to a worker, and those of them touched again since
+        self._running = set()
+        self._dirty = set()
+        # settled paths taken out of _pending but not queued yet
+        self._handoff = 0
+        self._closed = False
+        self._timer = threading.Thread(target=self._run, name="debounce", daemon=True)
+        self._timer.start()
+        self._workers = [threading.Thread(target=self._work, name=f"ingest-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, path):
+        """
+        Schedules path for processing once it has settled. Submitting a path
+        that is already pending only pushes its deadline back.
+        Returns False when the path was ignored (missing, or the scheduler is
+        closed); otherwise on_done will be called for it.
+        """
+        path = os.path.abspath(path)
+        with self._cond:
+            if self._closed:
+                return False
+            if path in self._running:
+                self._dirty.add(path)
+                return True
+            state = self._pending.get(path)
+            if state is not None:
+                state["deadline"] = time.monotonic() + self.settle_interval
+                return True
+        signature = self._signature(path)
+        if signature is None:
+            return False  # Already gone, e.g. a late event for a processed file
+        with self._cond:
+            if self._closed:
+                return False
+            if path not in self._pending and path not in self._running:
+                self._pending[path] = {"signature": signature, "since": time.time(),
+                                       "deadline": time.monotonic() + self.settle_interval}
+                self._cond.notify_all()
+            return True
+
+    def discard(self, path):
+        """
+        Forgets a pending path, e.g. a temporary file that was renamed.
+        """
+        path = os.path.abspath(path)
+        with self._cond:
+            if self._pending.pop(path, None) is None:
+                return
+            self._cond.notify_all()
+        self._done(path)
+
+    def pending(self):
+        """
+        Returns the number of paths waiting to settle, queued or being
+        processed.
+        """
+        with self._cond:
+            return len(self._pending) + self._handoff + self._depth() + len(self._running)
+
+    def stats(self):
+        """
+        Returns {"settling", "queued", "running", "oldest_queued_age"} for
+        monitoring; the age is in seconds (None when nothing is queued).
+        """
+        with self._cond:
+            ages = [age for age in (queue.oldest_age() for queue in self._queues.values())
+                    if age is not None]
+            return {"settling": len(self._pending), "queued": self._depth() + self._handoff,
+                    "running": len(self._running), "oldest_queued_age": max(ages) if ages else None}
+
+    def key_stats(self):
+        """
+        Returns {key: {"queued", "running", "quota"}} for every key seen.
+        """
+        with self._cond:
+            return {name: {"queued": queue.depth(), "running": self._active.get(name, 0),
+                           "quota": self.quotas.get(name)}
+                    for name, queue in self._queues.items()}
+
+    def drain(self, timeout=None):
+        """
+        Blocks until nothing is pending or running. Returns False on timeout.
+        """
+        return self._wait_idle(timeout, lambda: self.pending() == 0)
+
+    def close(self, wait=True):
+        """
+        Stops the scheduler; paths still settling are dropped. Files being
+        processed are always finished. Queued files are kept in the spool
+        for the next run when there is one; otherwise wait=True processes
+        them first and wait=False drops them.
+        """
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+        if wait and self.spool_path is None:
+            self._wait_idle(None, lambda: self.pending() == 0)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            queues = list(self._queues.values())
+        for queue in queues:
+            queue.close()
+        self._timer.join()
+        for worker in self._workers:
+            worker.join()
+
+    def _wait_idle(self, timeout, idle):
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not idle():
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    due = [(path, state["signature"]) for path, state in self._pending.items()
+                           if state["deadline"] <= now]
+                    if due:
+                        break
+                    if self._pending:
+                        next_deadline = min(state["deadline"] for state in self._pending.values())
+                        self._cond.wait(next_deadline - now)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            # stat outside the lock, so slow disks never block submit()
+            checked = [(path, old, self._signature(path)) for path, old in due]
+            settled = []
+            vanished = []
+            with self._cond:
+                now = time.monotonic()
+                for path, old, signature in checked:
+                    state = self._pending.get(path)
+                    if state is None or self._closed:
+                        continue
+                    if signature is None:
+                        del self._pending[path]  # Gone (moved away or deleted) before it settled
+                        vanished.append(path)
+                        self._cond.notify_all()
+                    elif signature != old:
+                        state["signature"] = signature
+                        state["deadline"] = now + self.settle_interval
+                    else:
+                        settled.append((path, self._pending.pop(path)["since"]))
+                self._handoff += len(settled)
+            for path in vanished:
+                self._done(path)
+            for path, since in settled:
+                with self._cond:
+                    queue = self._queue_for(self._key_of(path))
+                queue.put(path, since)
+                with self._cond:
+                    self._handoff -= 1
+                    self._cond.notify_all()
+
+    def _queue_for(self, name):
+        """
+        Returns the queue of key name, creating it. Called under _cond (or
+        before the threads start).
+        """
+        queue = self._queues.get(name)
+        if queue is None:
+            spool_path = self.spool_path
+            if spool_path and name is not None:
+                spool_path = f"{spool_path}.{name}"
+            queue = self._queues[name] = SpoolQueue(spool_path, max_memory=self.max_queued)
+        return queue
+
+    def _key_of(self, path):
+        if self.key is None:
+            return None
+        try:
+            return self.key(path)
+        except Exception as e:
+            logging.error(f"Error computing the queue key of {path}: {e}")
+            return None
+
+    def _depth(self):
+        return sum(queue.depth() for queue in self._queues.values())
+
+    def _next_item(self):
+        """
+        Waits for a queued path whose key is under its quota, taking the
+        queues in turn. Returns (key, path, since), or None once closed.
+        """
+        with self._cond:
+            while not self._stopping:
+                names = list(self._queues)
+                for offset in range(len(names)):
+                    name = names[(self._turn + offset) % len(names)]
+                    quota = self.quotas.get(name)
+                    if quota is not None and self._active.get(name, 0) >= quota:
+                        continue
+                    item = self._queues[name].get_item(timeout=0)
+                    if item is None:
+                        continue
+                    self._turn = (self._turn + offset + 1) % len(names)
+                    return (name,) + tuple(item)
+                # Woken when the timer queues something or a file finishes
+                self._cond.wait()
+            return None
+
+    def _work(self):
+        while True:
+            item = self._next_item()
+            if item is None:
+                return  # Closed
+            name, path, since = item
+            with self._cond:
+                if path in self._running:
+                    # Queued twice and already being processed: coalesce
+                    self._dirty.add(path)
+                    self._cond.notify_all()
+                    continue
+                self._running.add(path)
+                self._active[name] = self._active.get(name, 0) + 1
+            try:
+                self._process(path, since)
+            finally:
+                with self._cond:
+                    self._active[name] -= 1
+                    self._cond.notify_all()
+
+    def _process(self, path, since=None):
+        start = time.perf_counter()
+        try:
+            # Spooled entries may be stale (replayed after a crash, or the
+            # file was queued twice and is already processed)
+            if self._signature(path) is not None:
+                self.callback(path)
+                if self.metrics is not None and since is not None:
+                    self.metrics.observe("total", max(time.time() - since, 0.0))
+        except Exception as e:
+            logging.error(f"Error processing {path}: {e}")
+        finally:
+            if self.metrics is not None:
+                self.metrics.inc("worker_busy_seconds_total", time.perf_counter() - start)
+            with self._cond:
+                touched = path in self._dirty
+            # Touched while being processed: look again once it settles
+            signature = self._signature(path) if touched else None
+            with self._cond:
+                self._running.discard(path)
+                self._dirty.discard(path)
+                requeued = signature is not None and not self._closed
+                if requeued:
+                    self._pending[path] = {"signature": signature, "since": time.time(),
+                                           "deadline": time.monotonic() + self.settle_interval}
+                self._cond.notify_all()
+            if not requeued:
+                self._done(path)
+
+    def _done(self, path):
+        if self.on_done is not None:
+            try:
+                self.on_done(path)
+            except Exception as e:
+                logging.error(f"Error in on_done for {path}: {e}")
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
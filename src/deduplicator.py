@@ -1,83 +1,889 @@
-
+import contextlib
+import errno
+import functools
+import gc
 import hashlib
+import json
+import logging
+import mmap
 import os
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
+from src.hash_index import HashIndex
+from src.name_registry import NameRegistry
+
+# Bytes read from each end of a file for the partial hash stage
+PARTIAL_HASH_SIZE = 4096
+
+# Digest used when none is requested, kept for backward compatibility
+DEFAULT_ALGORITHM = "md5"
+
+def get_file_hash(file_path, block_size=65536, algorithm=DEFAULT_ALGORITHM, use_mmap=False):
+    """
+    Calculates the hash of a file with the given hashlib algorithm
+    (e.g. "md5", "sha256", "blake2b").
+    Reads into a single reusable buffer (or an mmap of the file), so no new
+    bytes object is allocated per chunk.
+    """
+    digest = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        if use_mmap:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for offset in range(0, size, block_size):
+                            digest.update(view[offset:offset + block_size])
+                    finally:
+                        view.release()
+            return digest.hexdigest()
+
+        buffer = bytearray(block_size)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
 
-def get_file_hash(file_path, block_size=65536):
+def get_partial_hash(file_path, size=None, block_size=PARTIAL_HASH_SIZE, algorithm=DEFAULT_ALGORITHM):
     """
-    Calculates the MD5 hash of a file.
-    Uses chunking to handle large files efficiently.
+    Calculates the hash of the first and last block_size bytes of a file.
+    Files up to twice block_size are hashed whole, so for them the partial
+    hash is as conclusive as the full one.
     """
-    md5 = hashlib.md5()
+    if size is None:
+        size = os.path.getsize(file_path)
+    digest = hashlib.new(algorithm)
     with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(block_size), b''):
-            md5.update(chunk)
-    return md5.hexdigest()
+        if size <= 2 * block_size:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(block_size))
+            f.seek(-block_size, os.SEEK_END)
+            digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+# JPEG markers without a length field
+_JPEG_STANDALONE = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+# PNG chunks that define the pixels; everything else is metadata
+_PNG_CONTENT_CHUNKS = {b"IHDR", b"PLTE", b"tRNS", b"IDAT"}
+
+def get_content_hash(file_path, block_size=65536, algorithm=DEFAULT_ALGORITHM):
+    """
+    Calculates a metadata-insensitive hash of an image.
+    For JPEG, APPn (EXIF, XMP, ICC...) and COM segments are skipped and the
+    tables plus the entropy-coded scan data are hashed. For PNG, only the
+    IHDR, PLTE, tRNS and IDAT chunks are hashed. Nothing is decoded, so it
+    costs about the same as get_file_hash. Other or malformed files fall back
+    to the plain byte hash.
+    """
+    digest = hashlib.new(algorithm)
+    try:
+        with open(file_path, 'rb') as f:
+            signature = f.read(8)
+            if signature[:2] == b"\xff\xd8":
+                f.seek(2)
+                _hash_jpeg_content(f, digest, block_size)
+                return digest.hexdigest()
+            if signature == b"\x89PNG\r\n\x1a\n":
+                _hash_png_content(f, digest)
+                return digest.hexdigest()
+    except ValueError:
+        pass
+    return get_file_hash(file_path, block_size, algorithm)
+
+def _hash_jpeg_content(f, digest, block_size):
+    while True:
+        byte = f.read(1)
+        if byte != b"\xff":
+            raise ValueError("JPEG marker expected")
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            raise ValueError("Truncated JPEG")
+        code = marker[0]
+        if code == 0xD9:  # EOI before any scan
+            return
+        if code in _JPEG_STANDALONE:
+            continue
+        header = f.read(2)
+        if len(header) != 2:
+            raise ValueError("Truncated JPEG")
+        length = int.from_bytes(header, "big")
+        if 0xE0 <= code <= 0xEF or code == 0xFE:
+            f.seek(length - 2, os.SEEK_CUR)
+            continue
+        digest.update(b"\xff" + marker + header)
+        digest.update(f.read(length - 2))
+        if code == 0xDA:
+            # Start of scan: the rest is entropy-coded data (and any later
+            # scans of a progressive JPEG)
+            for chunk in iter(lambda: f.read(block_size), b''):
+                digest.update(chunk)
+            return
+
+def _hash_png_content(f, digest):
+    while True:
+        header = f.read(8)
+        if not header:
+            return
+        if len(header) != 8:
+            raise ValueError("Truncated PNG")
+        length = int.from_bytes(header[:4], "big")
+        chunk_type = header[4:]
+        if chunk_type in _PNG_CONTENT_CHUNKS:
+            digest.update(chunk_type)
+            digest.update(f.read(length))
+            f.seek(4, os.SEEK_CUR)  # CRC
+        else:
+            f.seek(length + 4, os.SEEK_CUR)
+        if chunk_type == b"IEND":
+            return
+
+# ioctl request number of FICLONE (Linux, btrfs/XFS/bcachefs...)
+FICLONE = 0x40049409
+
+def reflink_file(source_path, target_path):
+    """
+    Creates target_path as a copy-on-write clone of source_path.
+    Raises OSError where the platform or filesystem has no reflink support.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+    with open(source_path, 'rb') as src, open(target_path, 'xb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(target_path)
+            raise
+
+def restore_from_manifest(manifest_path):
+    """
+    Undoes the link replacements recorded by a Deduplicator manifest: every
+    linked duplicate becomes an independent copy again, with its original
+    mtime. Entries whose file was since deleted or replaced are skipped.
+    The kept copy is checked against the digest recorded at link time while
+    it is copied; if it changed since, ValueError is raised rather than
+    restoring different bytes. Returns the number of files restored.
+    """
+    # Imported here: the transfer engine imports this module
+    from src.transfer import copy_file
+
+    with open(manifest_path, encoding="utf-8") as manifest:
+        records = [json.loads(line) for line in manifest if line.strip()]
+
+    restored = 0
+    for record in reversed(records):
+        path = Path(record["path"])
+        try:
+            st = path.stat()
+            canonical_st = os.stat(record["canonical"])
+        except OSError:
+            continue
+        if st.st_size != record["size"]:
+            continue
+        if record["method"] == "hardlink" and st.st_ino != canonical_st.st_ino:
+            continue  # Link already broken
+        tmp_path = path.with_name(f".{path.name}.restore-tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()  # Left by an interrupted restore
+        if "digest" not in record:
+            # Manifests written before digests were recorded
+            shutil.copyfile(record["canonical"], tmp_path)
+        else:
+            try:
+                copy_file(record["canonical"], tmp_path, verify=True,
+                          algorithm=record["algorithm"], expected=record["digest"])
+            except OSError as e:
+                if e.errno != errno.EIO:
+                    raise
+                raise ValueError(f"{record['canonical']} changed since {path} was linked to it; "
+                                 f"refusing to restore it") from e
+        os.utime(tmp_path, ns=(record["mtime_ns"], record["mtime_ns"]))
+        os.replace(tmp_path, path)
+        restored += 1
+    return restored
+
+def _synchronized(method):
+    """
+    Runs method while holding the instance's lock.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class Deduplicator:
-    def __init__(self, quarantine_dir="Quarantine"):
-        self.seen_hashes = set()
+    """
+    Detects duplicate files with a staged cascade:
+    1. File size (no read at all)
+    2. Partial hash of the first and last PARTIAL_HASH_SIZE bytes
+    3. Full hash, only when the previous stages collide
+    Hashes of known files are computed lazily, the first time another file
+    lands in the same bucket.
+    An optional HashIndex persists the known files and their hashes, so the
+    state survives restarts and unchanged files are never rehashed.
+
+    With key="content", files are instead keyed by get_content_hash, so
+    images that differ only in metadata count as duplicates. Sizes differ in
+    that case, so the size and partial stages are skipped.
+
+    Duplicates are moved to quarantine by default. With action="hardlink"
+    or "reflink" they are replaced in place by a link to the kept copy,
+    reclaiming the space at once, and each replacement is appended to the
+    JSON-lines manifest_path so restore_from_manifest can undo it.
+    """
+    KEYS = ("bytes", "content")
+
+    ACTIONS = ("quarantine", "hardlink", "reflink")
+
+    def __init__(self, quarantine_dir="Quarantine", index=None, algorithm=DEFAULT_ALGORITHM,
+                 key="bytes", action="quarantine", manifest_path=None):
         self.quarantine_dir = Path(quarantine_dir)
-        
-    def process_file(self, file_path):
+        # Free quarantine names, resolved without probing the disk per file
+        self.name_registry = NameRegistry()
+        self.index = index
+        # Validate early: hashlib.new raises ValueError on unknown names
+        hashlib.new(algorithm)
+        self.algorithm = algorithm
+        if key not in self.KEYS:
+            raise ValueError(f"Unknown dedup key {key!r}, expected one of {self.KEYS}")
+        self.key = key
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown dedup action {action!r}, expected one of {self.ACTIONS}")
+        if action != "quarantine" and key != "bytes":
+            # Linking would silently drop the duplicate's own metadata
+            raise ValueError("hardlink/reflink actions require key='bytes'")
+        self.action = action
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self._reclaimed_bytes = 0
+        # Tag stored with hashes in the index, so byte and content hashes never mix
+        self._index_tag = algorithm if key == "bytes" else f"content-{algorithm}"
+        # content digest -> entry, only used with key="content"
+        self._by_content = {}
+        # size -> list of entries {"path", "stat", "partial", "full"}
+        self._by_size = {}
+        # absolute path -> entry, used to recognise known files and follow moves
+        self._entries = {}
+        # (absolute path, "partial"/"full") -> digest computed ahead of time
+        # by the parallel stage of scan_directory
+        self._prefetched = {}
+        self._hashed_bytes = 0
+        # Journal of the scan in progress, if any
+        self._journal = None
+        # Serializes process_file/relocate/scan_directory so concurrent
+        # workers (e.g. the monitor's pool) can share one instance
+        self._lock = threading.RLock()
+        # Notified when a file marked with moving() reached its new path
+        self._moved = threading.Condition(self._lock)
+        if index is not None:
+            self._load_index()
+
+    def _load_index(self):
+        # Paths stay plain (absolute) strings here and the cyclic GC is paused:
+        # both would otherwise dominate warm-start time on a million rows.
+        by_size = self._by_size
+        entries = self._entries
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for path, size, mtime_ns, inode, partial, full in self.index.load(self._index_tag):
+                entry = {"path": path, "stat": (size, mtime_ns, inode),
+                         "partial": partial, "full": full}
+                bucket = by_size.get(size)
+                if bucket is None:
+                    by_size[size] = [entry]
+                else:
+                    bucket.append(entry)
+                entries[path] = entry
+                if full is not None and self.key == "content":
+                    self._by_content.setdefault(full, entry)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    @_synchronized
+    def process_file(self, file_path, hashes=None, quarantine_dir=None):
         """
         Checks if file is a duplicate based on hash.
         If duplicate, moves to quarantine.
-        If not, records hash and leaves file alone.
-        Returns: 'duplicate' or 'unique'
+        If not, records the file and leaves it alone.
+        Returns: 'duplicate', 'unique' or 'skipped'
+        hashes can carry the file's "stat", "partial" and "full" hashes (with
+        this deduplicator's algorithm) when they were already computed in
+        the same read as something else (see ingest_file); they are used
+        instead of reading the file again, and kept on the entry of a unique
+        file so it never has to be re-read.
+        They are ignored when the file changed since or in content mode.
+        quarantine_dir overrides the instance's for this file, so sources
+        sharing one deduplicator can keep separate quarantines.
         """
         file_path = Path(file_path)
-        if not file_path.exists():
-            return "skipped"
-            
-        file_hash = get_file_hash(file_path)
-        
-        if file_hash in self.seen_hashes:
-            self._quarantine_file(file_path)
-            return "duplicate"
-        else:
-            self.seen_hashes.add(file_hash)
-            return "unique"
-            
-    def _quarantine_file(self, file_path):
-        """
-        Moves file to quarantine directory.
-        """
-        self.quarantine_dir.mkdir(parents=True, exist_ok=True)
-        target_path = self.quarantine_dir / file_path.name
-        
-        # Handle collision in quarantine too
-        counter = 1
-        stem = file_path.stem
-        suffix = file_path.suffix
-        while target_path.exists():
-            target_path = self.quarantine_dir / f"{stem}_{counter}{suffix}"
-            counter += 1
-            
-        shutil.move(str(file_path), str(target_path))
-
-    def scan_directory(self, directory):
+        seeded = self._seed_hashes(file_path, hashes) if hashes else None
+        status, stage = self._classify_when_settled(file_path, quarantine_dir)
+        if seeded is not None:
+            for kind in ("partial", "full"):
+                self._prefetched.pop((seeded, kind), None)
+            entry = self._entries.get(seeded)
+            if status == "unique" and stage != "index" and entry is not None:
+                entry["partial"] = entry["partial"] or hashes["partial"]
+                entry["full"] = entry["full"] or hashes["full"]
+                if self.index is not None:
+                    self.index.record(entry["path"], entry["stat"], entry["partial"],
+                                      entry["full"], self._index_tag)
+        if self.index is not None:
+            self.index.commit()
+        return status
+
+    def _seed_hashes(self, file_path, hashes):
+        """
+        Stores precomputed hashes of file_path as prefetched ones. Returns
+        its key, or None when they cannot be trusted.
+        """
+        if self.key != "bytes":
+            return None
+        try:
+            if HashIndex.stat_key(file_path.stat()) != tuple(hashes["stat"]):
+                return None
+        except OSError:
+            return None
+        path = os.path.abspath(file_path)
+        for kind in ("partial", "full"):
+            if hashes.get(kind) is not None:
+                self._prefetched[(path, kind)] = hashes[kind]
+        return path
+
+    @contextlib.contextmanager
+    def moving(self, file_path):
+        """
+        Wraps the move of a known file done outside the deduplicator (e.g.
+        organize_file followed by relocate()). Until the block exits, other
+        threads needing the file's hashes wait for relocate() instead of
+        finding it gone and forgetting it.
+        """
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(file_path))
+            if entry is not None:
+                entry["moving"] = True
+        try:
+            yield
+        finally:
+            if entry is not None:
+                with self._lock:
+                    entry.pop("moving", None)
+                    self._moved.notify_all()
+
+    @_synchronized
+    def relocate(self, old_path, new_path):
+        """
+        Updates the recorded location of a unique file after it was moved
+        (e.g. by organize_file), so its hashes can still be computed lazily.
+        """
+        entry = self._entries.pop(os.path.abspath(old_path), None)
+        if entry is None:
+            return
+        entry.pop("moving", None)
+        self._moved.notify_all()
+        entry["path"] = Path(new_path)
+        try:
+            entry["stat"] = HashIndex.stat_key(os.stat(new_path))
+        except OSError:
+            pass
+        self._entries[os.path.abspath(new_path)] = entry
+        if self.index is not None:
+            self.index.remove(old_path)
+            self.index.record(new_path, entry["stat"], entry["partial"], entry["full"], self._index_tag)
+
+    def _classify_when_settled(self, file_path, quarantine_dir=None):
+        """
+        Runs _classify, waiting for any known file it needs that is being
+        moved (see moving()) and then starting over: everything the cascade
+        does before deciding is safe to repeat, and starting over keeps the
+        decision consistent although the lock is released while waiting.
+        """
+        while True:
+            try:
+                return self._classify(file_path, quarantine_dir)
+            except _EntryMoving as moving:
+                while moving.entry.get("moving"):
+                    self._moved.wait()  # Releases the lock, so relocate() can run
+
+    def _classify(self, file_path, quarantine_dir=None):
+        """
+        Runs the cascade for a single file.
+        Returns (status, stage) where stage is the cascade step that decided;
+        "index" means the file was already known and unchanged.
+        """
+        try:
+            stat_key = HashIndex.stat_key(file_path.stat())
+        except FileNotFoundError:
+            return "skipped", None
+
+        known = self._entries.get(os.path.abspath(file_path))
+        if known is not None:
+            # In content mode a known file is only settled once it has a digest
+            if known["stat"] == stat_key and (self.key == "bytes" or known["full"] is not None):
+                return "unique", "index"
+            self._forget(known)
+
+        size = stat_key[0]
+        entry = {"path": file_path, "stat": stat_key, "partial": None, "full": None}
+        bucket = self._by_size.setdefault(size, [])
+
+        if self.key == "content":
+            entry["full"] = self._hash(file_path, "full", size)
+            canonical = self._by_content.get(entry["full"])
+            if canonical is not None and self._entry_hash(canonical, "full") == entry["full"]:
+                self._handle_duplicate(file_path, canonical, quarantine_dir)
+                return "duplicate", "content"
+            self._register(bucket, entry)
+            return "unique", "content"
+
+        if not bucket:
+            self._register(bucket, entry)
+            return "unique", "size"
+
+        entry["partial"] = self._hash(file_path, "partial", size)
+        matches = [c for c in list(bucket)
+                   if self._entry_hash(c, "partial") == entry["partial"]]
+        if not matches:
+            self._register(bucket, entry)
+            return "unique", "partial"
+
+        if size <= 2 * PARTIAL_HASH_SIZE:
+            # The partial hash already covered the whole file
+            self._handle_duplicate(file_path, matches[0], quarantine_dir)
+            return "duplicate", "partial"
+
+        entry["full"] = self._hash(file_path, "full", size)
+        for candidate in matches:
+            if self._entry_hash(candidate, "full") == entry["full"]:
+                self._handle_duplicate(file_path, candidate, quarantine_dir, digest=entry["full"])
+                return "duplicate", "full"
+
+        self._register(bucket, entry)
+        return "unique", "full"
+
+    def _register(self, bucket, entry):
+        bucket.append(entry)
+        self._entries[os.path.abspath(entry["path"])] = entry
+        if self.key == "content":
+            self._by_content.setdefault(entry["full"], entry)
+        if self.index is not None:
+            self.index.record(entry["path"], entry["stat"], entry["partial"], entry["full"], self._index_tag)
+
+    def _forget(self, entry):
+        bucket = self._by_size.get(entry["stat"][0], [])
+        if entry in bucket:
+            bucket.remove(entry)
+        self._entries.pop(os.path.abspath(entry["path"]), None)
+        if self._by_content.get(entry["full"]) is entry:
+            del self._by_content[entry["full"]]
+        if self.index is not None:
+            self.index.remove(entry["path"])
+
+    def _entry_hash(self, entry, kind):
+        """
+        Returns the cached partial/full hash of a known entry, computing it on
+        first use. Cached hashes are only trusted while the file is unchanged;
+        entries whose file vanished or changed size are forgotten.
+        """
+        if entry.get("moving"):
+            # Not at its old path much longer (or already gone from it)
+            raise _EntryMoving(entry)
+        if entry[kind] is not None and self.index is None:
+            return entry[kind]
+        try:
+            stat_key = HashIndex.stat_key(os.stat(entry["path"]))
+        except OSError:
+            self._forget(entry)
+            return None
+        if stat_key != entry["stat"]:
+            if stat_key[0] != entry["stat"][0]:
+                self._forget(entry)
+                return None
+            if self._by_content.get(entry["full"]) is entry:
+                del self._by_content[entry["full"]]
+            entry.update(stat=stat_key, partial=None, full=None)
+        if entry[kind] is None:
+            entry[kind] = self._hash(entry["path"], kind, stat_key[0])
+            if self.key == "content":
+                self._by_content.setdefault(entry["full"], entry)
+            if self.index is not None:
+                self.index.record(entry["path"], entry["stat"], entry["partial"], entry["full"], self._index_tag)
+            if self._journal is not None:
+                # Re-mark so a resumed scan does not hash it again
+                self._mark_unique(self._journal, entry["path"])
+        return entry[kind]
+
+    def _hash(self, path, kind, size):
+        """
+        Returns the partial or full hash of path, preferring a prefetched one.
+        In content mode the "full" hash is the content hash.
+        """
+        digest = self._prefetched.pop((os.path.abspath(path), kind), None)
+        if digest is None:
+            if kind == "partial":
+                digest = get_partial_hash(path, size, algorithm=self.algorithm)
+                self._hashed_bytes += min(size, 2 * PARTIAL_HASH_SIZE)
+            elif self.key == "content":
+                digest = get_content_hash(path, algorithm=self.algorithm)
+                self._hashed_bytes += size
+            else:
+                digest = get_file_hash(path, algorithm=self.algorithm)
+                self._hashed_bytes += size
+        return digest
+
+    def _handle_duplicate(self, file_path, canonical, quarantine_dir=None, digest=None):
+        """
+        Applies the configured action to a duplicate of canonical (an entry).
+        Link actions fall back to quarantine when the filesystem refuses them
+        (different device, no reflink support...). digest is the duplicate's
+        full byte hash when the cascade computed it.
+        """
+        if self.action != "quarantine":
+            try:
+                self._link_duplicate(file_path, canonical)
+                return
+            except OSError as e:
+                logging.warning(f"Could not {self.action} {file_path}, quarantining instead: {e}")
+        self._quarantine_file(file_path, quarantine_dir, digest)
+
+    def _link_duplicate(self, file_path, canonical):
+        """
+        Replaces file_path with a hardlink or reflink to the canonical entry's
+        file and records the replacement in the manifest. The link is then
+        registered with the canonical's hashes, so rescans don't re-read it.
+        """
+        canonical_path = Path(canonical["path"])
+        st = file_path.stat()
+        canonical_st = canonical_path.stat()
+        if (st.st_dev, st.st_ino) == (canonical_st.st_dev, canonical_st.st_ino):
+            # Already a hardlink of the canonical copy
+            self._register_link(file_path, canonical)
+            return
+        tmp_path = file_path.with_name(f".{file_path.name}.dedup-tmp")
+        try:
+            if self.action == "hardlink":
+                os.link(canonical_path, tmp_path)
+            else:
+                reflink_file(canonical_path, tmp_path)
+                os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp_path, file_path)
+        except OSError:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        self._reclaimed_bytes += st.st_size
+        if self.manifest_path is not None:
+            digest = canonical["full"]
+            if digest is None:
+                # Decided on the partial hash, which covered the whole (small) file
+                digest = get_file_hash(canonical_path, algorithm=self.algorithm)
+            record = {"path": os.path.abspath(file_path),
+                      "canonical": os.path.abspath(canonical_path),
+                      "method": self.action,
+                      "size": st.st_size,
+                      "mtime_ns": st.st_mtime_ns,
+                      "algorithm": self.algorithm,
+                      "digest": digest}
+            with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+                manifest.write(json.dumps(record) + "\n")
+        self._register_link(file_path, canonical)
+
+    def _register_link(self, file_path, canonical):
+        entry = {"path": file_path, "stat": HashIndex.stat_key(file_path.stat()),
+                 "partial": canonical["partial"], "full": canonical["full"]}
+        self._register(self._by_size.setdefault(entry["stat"][0], []), entry)
+
+    def _quarantine_file(self, file_path, quarantine_dir=None, digest=None):
+        """
+        Moves file to quarantine directory. A move across filesystems is
+        checked against digest (the file's full hash) when it is known.
+        """
+        # Imported here: the transfer engine imports this module
+        from src.transfer import move_file
+
+        quarantine_dir = Path(quarantine_dir) if quarantine_dir else self.quarantine_dir
+        quarantine_dir.mkdir(parents=True, exist_ok=True)
+        journal = self._journal
+        while True:
+            # Handle collision in quarantine too
+            target_path = self.name_registry.reserve(quarantine_dir, file_path.name)
+            intent_id = journal.intend(file_path, target_path) if journal is not None else None
+            try:
+                move_file(file_path, target_path, algorithm=self.algorithm, expected=digest)
+            except FileExistsError:
+                # Another deduplicator or program wrote that name meanwhile
+                if journal is not None:
+                    journal.abort(intent_id)
+                self.name_registry.taken(target_path)
+                continue
+            except OSError:
+                self.name_registry.release(target_path)
+                if journal is not None:
+                    journal.abort(intent_id)
+                raise
+            break
+        if journal is not None:
+            journal.complete(intent_id)
+
+    @_synchronized
+    def scan_directory(self, directory, workers=None, use_processes=False, journal=None):
         """
         Scans a directory and processes all files.
+        Besides the unique/duplicate counts, "eliminated" reports how many
+        files each cascade stage proved unique ("index" counts files that were
+        already known and unchanged), "reclaimed_bytes" the space freed by
+        link actions and "throughput" the hashing rate.
+
+        With workers > 1, the hashes the cascade will need are computed up
+        front by a thread pool (hashlib releases the GIL on large buffers) or,
+        with use_processes, a process pool. Decisions are still taken serially
+        in walk order, so the first file walked is always the one kept.
+
+        With a Journal, quarantine moves are logged before and after they
+        happen and every unique file is marked with its hashes. Calling again
+        with the same journal after a crash rolls interrupted moves forward
+        or back and skips the files already settled, without rehashing them.
+        The journal is reset once the scan completes.
         """
-        directory = Path(directory)
-        results = {"unique": 0, "duplicate": 0}
-        
-        # Walk effectively to process all files recursively? 
-        # The prompt implies we might process incoming files, but scanning existing is also good.
-        for root, _, files in os.walk(directory):
-            # Skip quarantine itself if it is inside the scanned directory
-            if self.quarantine_dir.resolve().is_relative_to(Path(root).resolve()):
-               continue
+        start = time.perf_counter()
+        bytes_before = self._hashed_bytes
+        reclaimed_before = self._reclaimed_bytes
+        results = {"unique": 0, "duplicate": 0,
+                   "eliminated": dict.fromkeys(self._stages(), 0)}
 
-            for file in files:
-                file_path = Path(root) / file
-                # Skip quarantine dir check again just in case relative path logic is tricky
-                if self.quarantine_dir.name in file_path.parts:
-                    continue
-                    
-                status = self.process_file(file_path)
+        if journal is not None:
+            results["recovered"] = journal.recover()
+            self._resume_from_journal(journal)
+        self._journal = journal
+
+        try:
+            file_paths = self._collect_files(Path(directory))
+            if workers and workers > 1:
+                self._prefetch_hashes(file_paths, workers, use_processes)
+
+            for file_path in file_paths:
+                status, stage = self._classify_when_settled(file_path)
                 if status in results:
                     results[status] += 1
+                if status == "unique":
+                    results["eliminated"][stage] += 1
+                    if journal is not None and stage != "index":
+                        self._mark_unique(journal, file_path)
+        finally:
+            self._journal = None
+            self._prefetched.clear()
+            if self.index is not None:
+                self.index.commit()
+        if journal is not None:
+            journal.reset()
+
+        results["reclaimed_bytes"] = self._reclaimed_bytes - reclaimed_before
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        results["throughput"] = {
+            "seconds": elapsed,
+            "files_per_s": len(file_paths) / elapsed,
+            "mb_per_s": (self._hashed_bytes - bytes_before) / elapsed / 1e6,
+        }
         return results
+
+    def find_near_duplicates(self, directory, max_distance=6, method="dhash", workers=None):
+        """
+        Groups visually similar images (re-exports, recompressions, edited
+        metadata) using a perceptual hash ("dhash" or "phash") indexed in a
+        BK-tree, so each lookup only visits a small part of the library.
+        Returns a list of clusters, each a list of paths in walk order whose
+        first element is the image that would be kept. Files are not moved.
+        Requires numpy.
+        """
+        from src.perceptual_hash import HASH_FUNCTIONS, BKTree
+
+        hash_function = HASH_FUNCTIONS[method]
+        file_paths = self._collect_files(Path(directory))
+        if workers and workers > 1:
+            # Pillow releases the GIL while decoding, so threads scale here
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                hashes = list(executor.map(lambda p: _safe_image_hash(hash_function, p), file_paths))
+        else:
+            hashes = [_safe_image_hash(hash_function, p) for p in file_paths]
+
+        # Leader clustering: each image joins the cluster of its nearest
+        # representative within max_distance, or starts a new cluster.
+        # Only representatives go into the tree, so clusters never chain.
+        tree = BKTree()
+        clusters = []
+        for file_path, hash_value in zip(file_paths, hashes):
+            if hash_value is None:
+                continue
+            matches = tree.search(hash_value, max_distance)
+            if matches:
+                _, cluster_id = min(matches)
+                clusters[cluster_id].append(file_path)
+            else:
+                tree.add(hash_value, len(clusters))
+                clusters.append([file_path])
+        return [cluster for cluster in clusters if len(cluster) > 1]
+
+    def _mark_unique(self, journal, file_path):
+        entry = self._entries.get(os.path.abspath(file_path))
+        if entry is not None:
+            journal.mark(os.path.abspath(file_path), stat=list(entry["stat"]), tag=self._index_tag,
+                         partial=entry["partial"], full=entry["full"])
+
+    def _resume_from_journal(self, journal):
+        """
+        Re-registers the unique files settled by an interrupted scan.
+        """
+        for path, record in journal.marks().items():
+            if path in self._entries or record.get("tag") != self._index_tag:
+                continue
+            entry = {"path": path, "stat": tuple(record["stat"]),
+                     "partial": record["partial"], "full": record["full"]}
+            self._register(self._by_size.setdefault(entry["stat"][0], []), entry)
+
+    def _stages(self):
+        if self.key == "content":
+            return ("index", "content")
+        return ("index", "size", "partial", "full")
+
+    def _collect_files(self, directory):
+        """
+        Returns all files under directory in walk order, skipping quarantine.
+        """
+        quarantine = self.quarantine_dir.resolve()
+        file_paths = []
+        for root, dirs, files in os.walk(directory):
+            # Skip quarantine itself if it is inside the scanned directory
+            if Path(root).resolve().is_relative_to(quarantine):
+                dirs[:] = []
+                continue
+            file_paths.extend(Path(root) / file for file in files)
+        return file_paths
+
+    def _prefetch_hashes(self, file_paths, workers, use_processes):
+        """
+        Computes, in parallel, every partial and full hash the serial cascade
+        is going to ask for, and stores them in self._prefetched.
+        """
+        # Current size of every new file and of every known file it may meet
+        sizes = {}
+        for file_path in file_paths:
+            try:
+                stat_key = HashIndex.stat_key(file_path.stat())
+            except OSError:
+                continue
+            known = self._entries.get(os.path.abspath(file_path))
+            if known is not None and known["stat"] == stat_key:
+                if self.key == "bytes" or known["full"] is not None:
+                    continue
+            sizes[os.path.abspath(file_path)] = stat_key[0]
+
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        if self.key == "content":
+            # No cheap pre-filter applies: every new file needs its content hash
+            with executor_class(max_workers=workers) as executor:
+                self._run_hash_jobs(executor, "full", list(sizes.items()), use_processes)
+            return
+
+        groups = {}
+        for path, size in sizes.items():
+            groups.setdefault(size, []).append(path)
+        # Known files that are unchanged keep their cached hashes (from this
+        # run or from the HashIndex) and only take part in the grouping
+        cached = {}
+        for size, paths in groups.items():
+            for entry in self._by_size.get(size, []):
+                path = os.path.abspath(entry["path"])
+                if path in sizes:
+                    continue
+                paths.append(path)
+                try:
+                    if HashIndex.stat_key(os.stat(path)) == entry["stat"]:
+                        cached[path] = entry
+                except OSError:
+                    pass
+
+        with executor_class(max_workers=workers) as executor:
+            candidates = [(path, size) for size, paths in groups.items()
+                          if len(paths) > 1 for path in paths]
+            partial_jobs = [(path, size) for path, size in candidates
+                            if path not in cached or cached[path]["partial"] is None]
+            self._run_hash_jobs(executor, "partial", partial_jobs, use_processes)
+
+            collisions = {}
+            for path, size in candidates:
+                if path in cached and cached[path]["partial"] is not None:
+                    digest = cached[path]["partial"]
+                else:
+                    digest = self._prefetched.get((path, "partial"))
+                if digest is not None and size > 2 * PARTIAL_HASH_SIZE:
+                    collisions.setdefault((size, digest), []).append(path)
+            full_jobs = [(path, size) for (size, _), paths in collisions.items()
+                         if len(paths) > 1 for path in paths
+                         if path not in cached or cached[path]["full"] is None]
+            self._run_hash_jobs(executor, "full", full_jobs, use_processes)
+
+    def _run_hash_jobs(self, executor, kind, jobs, use_processes):
+        if kind == "partial":
+            func = _safe_partial_hash
+        elif self.key == "content":
+            func = _safe_content_hash
+        else:
+            func = _safe_file_hash
+        chunksize = max(1, len(jobs) // 256) if use_processes else 1
+        tasks = [(path, size, self.algorithm) for path, size in jobs]
+        digests = list(executor.map(func, tasks, chunksize=chunksize))
+        for (path, size), digest in zip(jobs, digests):
+            if digest is not None:
+                self._prefetched[(path, kind)] = digest
+                self._hashed_bytes += min(size, 2 * PARTIAL_HASH_SIZE) if kind == "partial" else size
+        return digests
+
+class _EntryMoving(Exception):
+    """
+    Raised by _entry_hash for an entry whose file is being moved.
+    """
+    def __init__(self, entry):
+        super().__init__(entry["path"])
+        self.entry = entry
+
+def _safe_image_hash(hash_function, file_path):
+    # Anything Pillow cannot decode is simply not an image candidate
+    try:
+        return hash_function(file_path)
+    except ImportError:
+        raise
+    except Exception:
+        return None
+
+def _safe_partial_hash(job):
+    # Module-level so process pools can pickle it
+    try:
+        return get_partial_hash(job[0], job[1], algorithm=job[2])
+    except OSError:
+        return None
+
+def _safe_content_hash(job):
+    try:
+        return get_content_hash(job[0], algorithm=job[2])
+    except OSError:
+        return None
+
+def _safe_file_hash(job):
+    try:
+        return get_file_hash(job[0], algorithm=job[2])
+    except OSError:
+        return None
@@ -1,38 +1,324 @@
-
 from PIL import Image
 from PIL.ExifTags import TAGS
 from datetime import datetime
 import os
+import re
+import struct
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+# EXIF tags used for dating a photo
+TAG_DATETIME_ORIGINAL = 36867
+TAG_DATETIME = 306
+TAG_EXIF_IFD = 34665
+
+EXIF_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# Bytes read by the fast path; EXIF must fit in the first APP1 segment (64 KB)
+HEADER_READ_SIZE = 128 * 1024
+
+# How file names are used for dating:
+#   "ignore"   - never (EXIF, then mtime); the default
+#   "fallback" - when EXIF has no date (EXIF, then file name, then mtime)
+#   "trust"    - first, without opening the file (file name, then EXIF, then mtime)
+FILENAME_POLICIES = ("ignore", "fallback", "trust")
+DEFAULT_FILENAME_POLICY = "ignore"
+
+# Patterns tried in order against the file name; named groups year, month
+# and day are required, hour, minute, second and ampm are optional.
+FILENAME_PATTERNS = []
+
+def register_filename_pattern(pattern, first=False):
+    """
+    Adds a pattern to FILENAME_PATTERNS, compiled once here.
+    With first=True it is tried before the built-in ones.
+    """
+    compiled = re.compile(pattern, re.IGNORECASE)
+    if not {"year", "month", "day"} <= set(compiled.groupindex):
+        raise ValueError("Filename patterns need year, month and day groups")
+    if first:
+        FILENAME_PATTERNS.insert(0, compiled)
+    else:
+        FILENAME_PATTERNS.append(compiled)
+    return compiled
+
+# IMG_20230514_101233.jpg, PXL_20230514_101233123.jpg, VID_..., Screenshot_20230514-101233.png
+register_filename_pattern(
+    r"^(?:IMG|VID|PXL|MVIMG|PANO|BURST|Screenshot)[_-]"
+    r"(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})[_-]"
+    r"(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})")
+# WhatsApp Image 2023-05-14 at 10.12.33.jpeg / ... at 10.12.33 AM.jpeg
+register_filename_pattern(
+    r"^WhatsApp (?:Image|Video) (?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2}) at "
+    r"(?P<hour>\d{1,2})\.(?P<minute>\d{2})\.(?P<second>\d{2})(?: (?P<ampm>AM|PM))?")
+# IMG-20230514-WA0001.jpg (WhatsApp on Android, date only)
+register_filename_pattern(
+    r"^(?:IMG|VID)-(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})-WA\d+")
+# 2023-05-14 10.12.33.jpg (Dropbox camera uploads) and similar
+register_filename_pattern(
+    r"^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})[ _]"
+    r"(?P<hour>\d{2})[.\-:](?P<minute>\d{2})[.\-:](?P<second>\d{2})")
+
+def date_from_filename(image_path):
+    """
+    Infers the capture date from the file name alone (no I/O).
+    Returns a datetime, or None when no pattern yields a valid date.
+    """
+    name = os.path.basename(image_path)
+    for pattern in FILENAME_PATTERNS:
+        match = pattern.search(name)
+        if not match:
+            continue
+        fields = match.groupdict()
+        hour = int(fields.get("hour") or 0)
+        ampm = (fields.get("ampm") or "").upper()
+        if ampm == "PM" and hour < 12:
+            hour += 12
+        elif ampm == "AM" and hour == 12:
+            hour = 0
+        try:
+            return datetime(int(fields["year"]), int(fields["month"]), int(fields["day"]),
+                            hour, int(fields.get("minute") or 0), int(fields.get("second") or 0))
+        except ValueError:
+            continue  # e.g. month 13: not a date after all
+    return None
 
-def get_image_date(image_path):
+def get_image_date(image_path, cache=None, filename_policy=DEFAULT_FILENAME_POLICY):
     """
     Extracts the date from an image file.
     Priority:
     1. EXIF DateTimeOriginal
     2. EXIF DateTime
-    3. File modification time
+    3. Date in the file name (see FILENAME_POLICIES)
+    4. File modification time
+    An optional MetadataCache skips re-reading files already inspected.
+    """
+    return get_image_date_with_source(image_path, cache, filename_policy)[0]
+
+def get_image_date_with_source(image_path, cache=None, filename_policy=DEFAULT_FILENAME_POLICY,
+                               header=None, st=None):
+    """
+    Same as get_image_date, but returns (datetime, source) where source is
+    "DateTimeOriginal", "DateTime", "filename" or "mtime".
+    Callers that already read the start of the file (header) and/or its
+    stat result (st) can pass them to avoid doing it again.
+    """
+    if filename_policy not in FILENAME_POLICIES:
+        raise ValueError(f"Unknown filename policy {filename_policy!r}")
+    if filename_policy == "trust":
+        date = date_from_filename(image_path)
+        if date is not None:
+            return date, "filename"
+
+    if st is None:
+        st = os.stat(image_path)
+    result = cache.get(st) if cache is not None else None
+    if result is None:
+        result = _read_exif_date(image_path, header)
+        if cache is not None:
+            cache.put(st, result)
+    if result[0] is not None:
+        return result
+
+    if filename_policy == "fallback":
+        date = date_from_filename(image_path)
+        if date is not None:
+            return date, "filename"
+
+    # Fallback to file modification time
+    return datetime.fromtimestamp(st.st_mtime), "mtime"
+
+def get_image_dates(paths, workers=8, ordered=True, max_in_flight=None, cache=None,
+                    filename_policy=DEFAULT_FILENAME_POLICY):
+    """
+    Batch version of get_image_date_with_source.
+    Yields (path, datetime, source) for each path, reading up to workers
+    files at a time so I/O latency (network shares especially) overlaps.
+    At most max_in_flight (default 4 * workers) lookups are pending, so the
+    input iterable is consumed lazily. With ordered=False results come back
+    as soon as they are ready.
+    Files that cannot be read yield (path, None, None).
+    """
+    def lookup(path):
+        try:
+            return (path, *get_image_date_with_source(path, cache, filename_policy))
+        except OSError:
+            return path, None, None
+
+    return _bounded_map(lookup, paths, workers, ordered, max_in_flight)
+
+def _bounded_map(func, items, workers, ordered=True, max_in_flight=None):
+    """
+    Yields func(item) for each item from a thread pool, keeping at most
+    max_in_flight (default 4 * workers) calls pending and consuming items
+    lazily. With ordered=False results come back as soon as they are ready.
+    """
+    if max_in_flight is None:
+        max_in_flight = 4 * workers
+    max_in_flight = max(max_in_flight, 1)
+    items = iter(items)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if ordered:
+            pending = deque(executor.submit(func, i) for i in islice(items, max_in_flight))
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(items, 1):
+                    pending.append(executor.submit(func, item))
+                yield result
+        else:
+            pending = {executor.submit(func, i) for i in islice(items, max_in_flight)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for item in islice(items, len(done)):
+                    pending.add(executor.submit(func, item))
+                for future in done:
+                    yield future.result()
+
+def _read_exif_date(image_path, header=None):
+    """
+    Returns (datetime, tag name) from EXIF, or (None, None) when there is
+    no usable EXIF date.
     """
     try:
-        with Image.open(image_path) as image:
-            exif_data = image.getexif()
-            
-            # 36867 is DateTimeOriginal
-            date_time_original = exif_data.get(36867)
-            if date_time_original:
-                return datetime.strptime(date_time_original, "%Y:%m:%d %H:%M:%S")
-                
-            # 306 is DateTime
-            date_time = exif_data.get(306)
-            if date_time:
-                return datetime.strptime(date_time, "%Y:%m:%d %H:%M:%S")
+        tags = read_exif_dates(image_path, header)
+
+        date_time_original = tags.get(TAG_DATETIME_ORIGINAL)
+        if date_time_original:
+            return datetime.strptime(date_time_original, EXIF_DATE_FORMAT), "DateTimeOriginal"
+
+        date_time = tags.get(TAG_DATETIME)
+        if date_time:
+            return datetime.strptime(date_time, EXIF_DATE_FORMAT), "DateTime"
             
     except Exception as e:
         # Log error if needed, but for now just fall through to file time
         pass
-        
-    # Fallback to file modification time
-    timestamp = os.path.getmtime(image_path)
-    return datetime.fromtimestamp(timestamp)
+    return None, None
+
+def read_exif_dates(image_path, header=None):
+    """
+    Returns {tag: value} for DateTimeOriginal and DateTime.
+    JPEG and TIFF headers are parsed directly from the first
+    HEADER_READ_SIZE bytes (read here unless header is given); anything
+    else goes through Pillow.
+    """
+    if header is None:
+        with open(image_path, 'rb') as f:
+            header = f.read(HEADER_READ_SIZE)
+    tags = parse_exif_dates(header)
+    if tags is None:
+        tags = _read_exif_dates_pillow(image_path)
+    return tags
+
+def _read_exif_dates_pillow(image_path):
+    with Image.open(image_path) as image:
+        exif_data = image.getexif()
+        # DateTimeOriginal normally lives in the Exif sub-IFD, not in IFD0
+        date_time_original = exif_data.get(TAG_DATETIME_ORIGINAL)
+        if not date_time_original:
+            date_time_original = exif_data.get_ifd(TAG_EXIF_IFD).get(TAG_DATETIME_ORIGINAL)
+        return {TAG_DATETIME_ORIGINAL: date_time_original,
+                TAG_DATETIME: exif_data.get(TAG_DATETIME)}
+
+def parse_exif_dates(header):
+    """
+    Parses the date tags out of the leading bytes of a JPEG or TIFF file.
+    Returns {tag: value} ({} when the file has no EXIF), or None when the
+    format is not recognised or the data is incomplete/unusual, in which
+    case the caller should ask Pillow.
+    """
+    try:
+        if header[:2] == b"\xff\xd8":
+            tiff = _find_jpeg_exif(header)
+            if tiff is None:
+                return None
+            if not tiff:
+                return {}
+            return _parse_tiff_dates(tiff)
+        if header[:4] in (b"II*\x00", b"MM\x00*"):
+            return _parse_tiff_dates(header)
+    except (struct.error, IndexError, ValueError):
+        return None
+    return None
+
+def _find_jpeg_exif(data):
+    """
+    Walks JPEG segments up to the first scan looking for the Exif APP1.
+    Returns its TIFF payload, b"" if the image has none, or None if the
+    header was cut before it could tell.
+    """
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("JPEG marker expected")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # EOI or start of scan: no EXIF
+            return b""
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        end = pos + 2 + length
+        if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+            if end > len(data):
+                return None
+            return data[pos + 10:end]
+        pos = end
+    return None
+
+def _parse_tiff_dates(tiff):
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        raise ValueError("Bad TIFF byte order")
+    ifd0 = _read_ifd(tiff, order, struct.unpack(order + "I", tiff[4:8])[0])
+
+    tags = {}
+    if TAG_DATETIME in ifd0:
+        tags[TAG_DATETIME] = _ascii_value(tiff, order, ifd0[TAG_DATETIME])
+    if TAG_DATETIME_ORIGINAL in ifd0:
+        tags[TAG_DATETIME_ORIGINAL] = _ascii_value(tiff, order, ifd0[TAG_DATETIME_ORIGINAL])
+    if not tags.get(TAG_DATETIME_ORIGINAL) and TAG_EXIF_IFD in ifd0:
+        type_, count, raw = ifd0[TAG_EXIF_IFD]
+        exif_ifd = _read_ifd(tiff, order, struct.unpack(order + "I", raw)[0])
+        if TAG_DATETIME_ORIGINAL in exif_ifd:
+            tags[TAG_DATETIME_ORIGINAL] = _ascii_value(tiff, order, exif_ifd[TAG_DATETIME_ORIGINAL])
+    return tags
+
+def _read_ifd(tiff, order, offset):
+    """
+    Returns {tag: (type, count, raw 4-byte value/offset)} for one IFD.
+    """
+    (count,) = struct.unpack(order + "H", tiff[offset:offset + 2])
+    entries = {}
+    for i in range(count):
+        start = offset + 2 + 12 * i
+        tag, type_, value_count = struct.unpack(order + "HHI", tiff[start:start + 8])
+        entries[tag] = (type_, value_count, tiff[start + 8:start + 12])
+    return entries
+
+def _ascii_value(tiff, order, entry):
+    type_, count, raw = entry
+    if type_ != 2:
+        raise ValueError("Unexpected tag type")  # leave odd files to Pillow
+    if count <= 4:
+        data = raw[:count]
+    else:
+        (offset,) = struct.unpack(order + "I", raw)
+        data = tiff[offset:offset + count]
+        if len(data) != count:
+            raise ValueError("Truncated tag value")
+    # Same normalisation as Pillow's ASCII tags
+    if data.endswith(b"\x00"):
+        data = data[:-1]
+    return data.decode("latin-1", "replace")
 
 if __name__ == "__main__":
     # Test with a dummy file if needed
@@ -1,9 +1,33 @@
 
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from PIL import Image
 
+THUMBNAIL_SIZE = (200, 200)
+
+def _make_thumbnail(job):
+    """
+    Writes the thumbnail of job = (original path, thumbnail path).
+    Returns None on success or the error message. Module-level so process
+    pools can pickle it.
+    """
+    original_path, thumb_path = job
+    try:
+        with Image.open(original_path) as img:
+            img.thumbnail(THUMBNAIL_SIZE)
+            img.save(thumb_path)
+        return None
+    except Exception as e:
+        # A half-written thumbnail would be taken as done by the next run
+        try:
+            os.remove(thumb_path)
+        except OSError:
+            pass
+        return f"{type(e).__name__}: {e}"
+
 class GalleryGenerator:
     def __init__(self, root_dir, output_dir=None):
         self.root_dir = Path(root_dir)
@@ -78,34 +102,83 @@ class GalleryGenerator:
         # Actually doing a flat scan might be easier for a simple gallery logic:
         # Just walk, find images, verify/make thumb, add to list.
         
-    def _generate_thumbnail(self, original_path):
+    def _thumbnail_path(self, original_path):
         """
-        Generates a thumbnail for the image.
-        Returns relative path to thumbnail from gallery root.
+        Returns where the thumbnail of original_path goes.
         """
         rel_path = original_path.relative_to(self.root_dir)
-        thumb_path = self.thumbnails_dir / rel_path
-        thumb_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        if not thumb_path.exists():
+        return self.thumbnails_dir / rel_path
+
+    def _generate_thumbnails(self, originals, workers=1, chunksize=None, progress=None):
+        """
+        Creates the missing thumbnails of originals.
+        With workers > 1 images are decoded and resized in a process pool,
+        chunksize images per task (default: small enough to keep every worker
+        busy and progress moving). progress(done, total) is called after
+        each image that needed a thumbnail. If a worker process dies, the
+        images not returned yet are reported as failed (their thumbnails,
+        possibly half-written, are removed) and the next run retries them.
+        Returns ({original: error message} for failed images, number created).
+        """
+        jobs = []
+        parents = set()
+        for original_path in originals:
+            thumb_path = self._thumbnail_path(original_path)
+            if not thumb_path.exists():
+                jobs.append((original_path, thumb_path))
+                parents.add(thumb_path.parent)
+        for parent in parents:
+            parent.mkdir(parents=True, exist_ok=True)
+
+        workers = max(workers or 1, 1)
+        tasks = [(str(original), str(thumb)) for original, thumb in jobs]
+        if workers > 1 and len(tasks) > 1:
+            if chunksize is None:
+                chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+            executor = ProcessPoolExecutor(max_workers=min(workers, len(tasks)))
+            results = executor.map(_make_thumbnail, tasks, chunksize=chunksize)
+        else:
+            executor = None
+            results = map(_make_thumbnail, tasks)
+
+        failures = {}
+        done = 0
+        try:
             try:
-                img = Image.open(original_path)
-                img.thumbnail((200, 200))
-                img.save(thumb_path)
-            except Exception as e:
-                print(f"Failed to create thumbnail for {original_path}: {e}")
-                return None
-                
-        return thumb_path.relative_to(self.output_dir)
+                for (original_path, _), error in zip(jobs, results):
+                    done += 1
+                    if error is not None:
+                        failures[original_path] = error
+                    if progress is not None:
+                        progress(done, len(jobs))
+            except BrokenProcessPool as e:
+                for original_path, thumb_path in jobs[done:]:
+                    failures[original_path] = f"{type(e).__name__}: {e}"
+                    try:
+                        os.remove(thumb_path)
+                    except OSError:
+                        pass
+                if progress is not None:
+                    progress(len(jobs), len(jobs))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return failures, len(jobs) - len(failures)
 
-    def generate_simple(self):
+    def generate_simple(self, workers=1, chunksize=None, progress=None):
         """
         Simpler one-page gallery generation for Phase 1.
+        Thumbnails are made in this process by default; with workers > 1 by
+        that many processes (the command line uses one per CPU); see
+        _generate_thumbnails for chunksize and progress. The page lists
+        images in walk order either way, so it is identical to a serial run.
+        Returns a report: {"images": listed, "created": new thumbnails,
+        "failed": [{"path", "error"}]}; failed images are left out of the page.
         """
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.thumbnails_dir.mkdir(parents=True, exist_ok=True)
         
-        images = []
+        originals = []
         for root, _, files in os.walk(self.root_dir):
             # Skip output dir
             if str(self.output_dir.resolve()) in str(Path(root).resolve()):
@@ -113,20 +186,27 @@ class GalleryGenerator:
                 
             for f in files:
                 if Path(f).suffix.lower() in self.supported_extensions:
-                    full_path = Path(root) / f
-                    thumb_rel = self._generate_thumbnail(full_path)
-                    if thumb_rel:
-                        # Copy original logic? No, link to it. 
-                        # To link to it, it needs to be accessible relative to html.
-                        # If output_dir is parallel to organized folders, we can use ..
-                        rel_original = os.path.relpath(full_path, self.output_dir)
-                        images.append({
-                            "thumb": thumb_rel,
-                            "full": rel_original,
-                            "name": f
-                        })
+                    originals.append(Path(root) / f)
+
+        failures, created = self._generate_thumbnails(originals, workers, chunksize, progress)
+
+        images = []
+        for full_path in originals:
+            if full_path in failures:
+                continue
+            # Copy original logic? No, link to it. 
+            # To link to it, it needs to be accessible relative to html.
+            # If output_dir is parallel to organized folders, we can use ..
+            rel_original = os.path.relpath(full_path, self.output_dir)
+            images.append({
+                "thumb": self._thumbnail_path(full_path).relative_to(self.output_dir),
+                "full": rel_original,
+                "name": full_path.name
+            })
         
         self._write_html(images)
+        return {"images": len(images), "created": created,
+                "failed": [{"path": str(path), "error": error} for path, error in failures.items()]}
 
     def _write_html(self, images):
         html_content = """
@@ -202,10 +282,24 @@ class GalleryGenerator:
             
 if __name__ == "__main__":
     import sys
+    # --workers=<n> thumbnail processes (default: one per CPU)
+    workers = os.cpu_count() or 1
+    for arg in sys.argv[1:]:
+        if arg.startswith("--workers="):
+            workers = int(arg.split("=", 1)[1])
+            sys.argv.remove(arg)
     if len(sys.argv) < 2:
-        print("Usage: python gallery_generator.py <root_dir> [output_dir]")
+        print("Usage: python gallery_generator.py <root_dir> [output_dir] [--workers=<n>]")
     else:
         root = sys.argv[1]
         out = sys.argv[2] if len(sys.argv) > 2 else None
         gen = GalleryGenerator(root, out)
-        gen.generate_simple()
+
+        def show_progress(done, total):
+            if done == total or done % 500 == 0:
+                print(f"Thumbnails: {done}/{total}", flush=True)
+
+        report = gen.generate_simple(workers=workers, progress=show_progress)
+        print(f"Gallery: {report['images']} images, {report['created']} new thumbnails")
+        for failure in report["failed"]:
+            print(f"Failed: {failure['path']}: {failure['error']}")
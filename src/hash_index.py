@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+
+class HashIndex:
+    """
+    Persistent index of known files, stored in SQLite.
+    Each row is keyed by absolute path and carries the size, mtime and inode
+    seen when the file was recorded, plus whatever hashes were computed for it
+    and the digest algorithm that produced them.
+    A row is only trusted while the file's stat still matches, so unchanged
+    files are never rehashed across restarts.
+    """
+    def __init__(self, db_path, commit_every=500):
+        self.db_path = str(db_path)
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " partial TEXT,"
+            " full TEXT,"
+            " algorithm TEXT NOT NULL DEFAULT 'md5')"
+        )
+        # Indexes created before the algorithm column existed hold MD5 hashes
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        if "algorithm" not in columns:
+            self._conn.execute("ALTER TABLE files ADD COLUMN algorithm TEXT NOT NULL DEFAULT 'md5'")
+        self._conn.commit()
+
+    @staticmethod
+    def stat_key(st):
+        """
+        Returns the (size, mtime_ns, inode) tuple used to validate rows.
+        """
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def load(self, algorithm="md5"):
+        """
+        Returns all rows as (path, size, mtime_ns, inode, partial, full) tuples.
+        Hashes produced by a different algorithm come back as None.
+        Used to warm-start a Deduplicator in a single query.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, size, mtime_ns, inode,"
+                " CASE WHEN algorithm = ?1 THEN partial END,"
+                " CASE WHEN algorithm = ?1 THEN full END"
+                " FROM files",
+                (algorithm,)
+            ).fetchall()
+
+    def lookup(self, path, st, algorithm="md5"):
+        """
+        Returns (partial, full) for path if the stored stat still matches st
+        and the hashes were made with algorithm, otherwise None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode, partial, full, algorithm FROM files WHERE path = ?",
+                (os.path.abspath(path),)
+            ).fetchone()
+        if row is None or tuple(row[:3]) != self.stat_key(st) or row[5] != algorithm:
+            return None
+        return row[3], row[4]
+
+    def record(self, path, stat_key, partial=None, full=None, algorithm="md5"):
+        """
+        Inserts or replaces the row for path.
+        """
+        self._write(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, partial, full, algorithm)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(path), *stat_key, partial, full, algorithm)
+        )
+
+    def remove(self, path):
+        self._write("DELETE FROM files WHERE path = ?", (os.path.abspath(path),))
+
+    def _write(self, sql, params):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
@@ -0,0 +1,78 @@
+import hashlib
+import os
+from src.deduplicator import DEFAULT_ALGORITHM, PARTIAL_HASH_SIZE
+from src.exif_extractor import (get_image_date_with_source, _bounded_map,
+                                HEADER_READ_SIZE, DEFAULT_FILENAME_POLICY)
+from src.hash_index import HashIndex
+
+INGEST_BLOCK_SIZE = 256 * 1024
+
+def ingest_file(file_path, algorithm=DEFAULT_ALGORITHM, cache=None,
+                filename_policy=DEFAULT_FILENAME_POLICY, block_size=INGEST_BLOCK_SIZE):
+    """
+    Reads file_path exactly once and returns everything the monitor needs:
+    {"stat": stat key, "partial": ..., "full": ..., "date": ..., "source": ...}
+    Every chunk is fed to the digest; the first HEADER_READ_SIZE bytes go to
+    the EXIF parser and the first/last PARTIAL_HASH_SIZE bytes give the
+    partial hash, so the results match get_file_hash, get_partial_hash and
+    get_image_date_with_source without reopening the file.
+    Pass the result to Deduplicator.process_file(hashes=...) and the date to
+    organize_file(date=...).
+    """
+    block_size = max(block_size, HEADER_READ_SIZE, PARTIAL_HASH_SIZE)
+    digest = hashlib.new(algorithm)
+    # Two buffers used in turn, so the previous chunk is still around when
+    # the last one is too short to hold the whole tail
+    buffers = [bytearray(block_size), bytearray(block_size)]
+    lengths = [0, 0]
+    header = None
+    current = 0
+    with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        while True:
+            n = f.readinto(buffers[current])
+            if not n:
+                break
+            lengths[current] = n
+            view = memoryview(buffers[current])[:n]
+            digest.update(view)
+            if header is None:
+                header = bytes(view[:HEADER_READ_SIZE])
+            current ^= 1
+    full = digest.hexdigest()
+
+    size = st.st_size
+    if size <= 2 * PARTIAL_HASH_SIZE:
+        # Whole file fits in the first buffer; the partial hash covers it all
+        partial = full
+    else:
+        last, previous = current ^ 1, current
+        missing = max(PARTIAL_HASH_SIZE - lengths[last], 0)
+        tail = (bytes(buffers[previous][lengths[previous] - missing:lengths[previous]])
+                + bytes(buffers[last][:lengths[last]]))
+        partial_digest = hashlib.new(algorithm)
+        partial_digest.update(header[:PARTIAL_HASH_SIZE])
+        partial_digest.update(tail[-PARTIAL_HASH_SIZE:])
+        partial = partial_digest.hexdigest()
+
+    date, source = get_image_date_with_source(file_path, cache, filename_policy,
+                                              header=header or b"", st=st)
+    return {"stat": HashIndex.stat_key(st), "partial": partial, "full": full,
+            "date": date, "source": source}
+
+def ingest_files(paths, workers=8, ordered=True, max_in_flight=None, **kwargs):
+    """
+    Batch version of ingest_file.
+    Yields (path, result) for each path with up to workers files being read
+    at a time and at most max_in_flight (default 4 * workers) pending, so
+    the input iterable is consumed lazily. With ordered=False results come
+    back as soon as they are ready. Files that cannot be read yield
+    (path, None). Extra keyword arguments are passed to ingest_file.
+    """
+    def ingest(path):
+        try:
+            return path, ingest_file(path, **kwargs)
+        except OSError:
+            return path, None
+
+    return _bounded_map(ingest, paths, workers, ordered, max_in_flight)
@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import threading
+import time
+
+class Journal:
+    """
+    Write-ahead journal for long organize/dedup runs, stored as JSON lines.
+    Every move is recorded as an "intent" before it happens and as "done"
+    (or "abort") after; other finished work can be recorded with mark().
+    Records are flushed to the OS immediately, so they survive a crash of
+    the process, and fsynced in groups (every sync_every records or
+    sync_interval seconds), so they survive power loss at a small cost.
+    After a crash, recover() rolls half-finished moves forward or back.
+    """
+    def __init__(self, path, sync_every=256, sync_interval=1.0):
+        self.path = str(path)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        # id -> intent record still waiting for its outcome
+        self._open_intents = {}
+        self._marks = {}
+        self._next_id = 1
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # Drop a torn last record so new appends start on a fresh line
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        for line in data[:end].decode("utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn write from a crash
+            op = record.get("op")
+            if op == "intent":
+                self._open_intents[record["id"]] = record
+                self._next_id = max(self._next_id, record["id"] + 1)
+            elif op in ("done", "abort"):
+                self._open_intents.pop(record["id"], None)
+            elif op == "mark":
+                self._marks[record["key"]] = record
+
+    def intend(self, src, dst, **info):
+        """
+        Records that src is about to be moved to dst, with the size of src
+        (so recover() can tell a cut-short copy from a complete file).
+        Returns the intent id.
+        """
+        try:
+            info.setdefault("size", os.stat(src).st_size)
+        except OSError:
+            pass
+        with self._lock:
+            intent_id = self._next_id
+            self._next_id += 1
+            record = {"op": "intent", "id": intent_id,
+                      "src": os.path.abspath(src), "dst": os.path.abspath(dst), **info}
+            self._open_intents[intent_id] = record
+            self._write(record)
+            return intent_id
+
+    def complete(self, intent_id):
+        with self._lock:
+            self._open_intents.pop(intent_id, None)
+            self._write({"op": "done", "id": intent_id})
+
+    def abort(self, intent_id):
+        with self._lock:
+            self._open_intents.pop(intent_id, None)
+            self._write({"op": "abort", "id": intent_id})
+
+    def mark(self, key, **info):
+        """
+        Records that the work item key (e.g. a path) is finished, with any
+        results needed to skip it on resume.
+        """
+        with self._lock:
+            record = {"op": "mark", "key": key, **info}
+            self._marks[key] = record
+            self._write(record)
+
+    def marks(self):
+        """
+        Returns {key: record} for everything recorded with mark().
+        """
+        with self._lock:
+            return dict(self._marks)
+
+    def recover(self):
+        """
+        Resolves the moves that were in flight when the previous run died:
+        - only the target exists: the move finished, roll forward
+        - only the source exists: it never happened, roll back
+        - both are the same file: a hardlink move stopped before unlinking
+          the source; it is unlinked (roll forward)
+        - the target is smaller than the recorded source size: a
+          cross-device copy was cut short; the partial target is deleted
+          and the source kept (roll back)
+        - otherwise the target may be a complete copy or an unrelated file
+          that took the name: both are left alone and logged ("conflicts")
+        Returns {"rolled_forward": n, "rolled_back": n, "conflicts": n}.
+        """
+        summary = {"rolled_forward": 0, "rolled_back": 0, "conflicts": 0}
+        with self._lock:
+            intents = list(self._open_intents.values())
+        for intent in intents:
+            src_exists = os.path.exists(intent["src"])
+            dst_exists = os.path.exists(intent["dst"])
+            if dst_exists and not src_exists:
+                self.complete(intent["id"])
+                summary["rolled_forward"] += 1
+                continue
+            if src_exists and dst_exists:
+                if os.path.samefile(intent["src"], intent["dst"]):
+                    os.remove(intent["src"])
+                    self.complete(intent["id"])
+                    summary["rolled_forward"] += 1
+                    continue
+                size = intent.get("size")
+                if size is None or os.path.getsize(intent["dst"]) >= size:
+                    logging.warning(f"Journal: both {intent['src']} and {intent['dst']} exist and the "
+                                    f"target is not a partial copy; leaving both")
+                    self.abort(intent["id"])
+                    summary["conflicts"] += 1
+                    continue
+                os.remove(intent["dst"])
+            elif not src_exists:
+                logging.warning(f"Journal: neither {intent['src']} nor {intent['dst']} exists")
+            self.abort(intent["id"])
+            summary["rolled_back"] += 1
+        self.sync()
+        return summary
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        now = time.monotonic()
+        if self._unsynced >= self.sync_every or now - self._last_sync >= self.sync_interval:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = now
+
+    def sync(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def reset(self):
+        """
+        Truncates the journal after a run finished cleanly.
+        """
+        with self._lock:
+            self._file.close()
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._open_intents.clear()
+            self._marks.clear()
+            self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
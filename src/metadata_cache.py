@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+class MetadataCache:
+    """
+    Cache of EXIF date lookups keyed by file identity.
+    A result is stored under (device, inode) together with the size and
+    mtime_ns it was computed for, and only served while both still match,
+    so edited files are re-read and renamed/moved files keep their entry.
+    A bounded in-memory LRU sits in front of an optional SQLite store, so
+    results also survive restarts.
+    """
+    def __init__(self, db_path=None, max_entries=100000, commit_every=500):
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        # (dev, ino) -> (size, mtime_ns, value)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = None
+        if db_path is not None:
+            self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dates ("
+                " dev INTEGER NOT NULL,"
+                " ino INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " date TEXT,"
+                " source TEXT,"
+                " PRIMARY KEY (dev, ino))"
+            )
+            self._conn.commit()
+
+    def get(self, st):
+        """
+        Returns the cached (datetime or None, source or None) for the file
+        described by the stat result st, or None on a miss.
+        """
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            cached = self._lru.get(key)
+            if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return cached[2]
+
+            value = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT size, mtime_ns, date, source FROM dates WHERE dev = ? AND ino = ?", key
+                ).fetchone()
+                if row is not None and tuple(row[:2]) == (st.st_size, st.st_mtime_ns):
+                    date = datetime.fromisoformat(row[2]) if row[2] else None
+                    value = (date, row[3])
+                    self._remember(key, st, value)
+
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, st, value):
+        """
+        Stores value, a (datetime or None, source or None) pair, for st.
+        """
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            self._remember(key, st, value)
+            if self._conn is not None:
+                date, source = value
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO dates (dev, ino, size, mtime_ns, date, source)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, st.st_size, st.st_mtime_ns, date.isoformat() if date else None, source)
+                )
+                self._pending += 1
+                if self._pending >= self.commit_every:
+                    self._conn.commit()
+                    self._pending = 0
+
+    def invalidate(self, path):
+        """
+        Drops any cached result for the file at path.
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            self._lru.pop(key, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM dates WHERE dev = ? AND ino = ?", key)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM dates")
+                self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_ratio": self.hits / total if total else 0.0,
+                    "entries": len(self._lru)}
+
+    def commit(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self):
+        self.commit()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _remember(self, key, st, value):
+        self._lru[key] = (st.st_size, st.st_mtime_ns, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
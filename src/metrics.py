@@ -0,0 +1,196 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+class Metrics:
+    """
+    In-process counters, latency histograms and gauges, rendered as
+    Prometheus text or summarised for a JSON health document.
+    The hot path (inc/observe) is a dict lookup, a bisect and a few adds
+    under one lock, about a microsecond per call. Gauges are callables
+    evaluated only when somebody scrapes.
+    """
+    def __init__(self, prefix="photo_organizer", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (name, labels) -> value; labels is a tuple of (key, value) pairs
+        self._counters = {}
+        # stage -> [bucket counts (last one is +Inf), sum, count]
+        self._histograms = {}
+        # name -> (help, callable returning a number)
+        self._gauges = {}
+        self._help = {}
+        self.started = time.monotonic()
+
+    def inc(self, name, amount=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, stage, seconds):
+        """
+        Records one latency sample (in seconds) for stage.
+        """
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def gauge(self, name, func, help=""):
+        """
+        Registers a gauge whose value is func() at scrape time.
+        """
+        self._gauges[name] = (help, func)
+
+    def describe(self, name, help):
+        """
+        Sets the HELP text of counter name.
+        """
+        self._help[name] = help
+
+    def counter(self, name, labels=()):
+        with self._lock:
+            return self._counters.get((name, labels), 0)
+
+    def counters(self, name):
+        """
+        Returns {labels: value} for every label set of counter name.
+        """
+        with self._lock:
+            return {labels: value for (n, labels), value in self._counters.items() if n == name}
+
+    def stage_summary(self):
+        """
+        Returns {stage: {"count", "per_s", "mean", "p50", "p95", "p99"}}.
+        Rates are over the uptime; percentiles are bucket upper bounds
+        (None beyond the last bucket).
+        """
+        uptime = max(time.monotonic() - self.started, 1e-9)
+        with self._lock:
+            histograms = {stage: (list(h[0]), h[1], h[2]) for stage, h in self._histograms.items()}
+        summary = {}
+        for stage, (counts, total, count) in histograms.items():
+            summary[stage] = {"count": count, "per_s": count / uptime,
+                              "mean": total / count if count else None}
+            for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                summary[stage][name] = self._quantile(counts, count, q)
+        return summary
+
+    def render_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {stage: (list(h[0]), h[1], h[2]) for stage, h in self._histograms.items()}
+        lines = []
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            full = f"{self.prefix}_{name}"
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+            lines.append(f"{full}{self._labels(labels)} {value}")
+
+        if histograms:
+            full = f"{self.prefix}_stage_seconds"
+            lines.append(f"# HELP {full} Latency of each processing stage")
+            lines.append(f"# TYPE {full} histogram")
+            for stage, (counts, total, count) in sorted(histograms.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{full}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{full}_sum{{stage="{stage}"}} {total}')
+                lines.append(f'{full}_count{{stage="{stage}"}} {count}')
+
+        for name, (help, func) in sorted(self._gauges.items()):
+            try:
+                value = func()
+            except Exception as e:
+                logging.error(f"Metrics: gauge {name} failed: {e}")
+                continue
+            if value is None:
+                continue
+            full = f"{self.prefix}_{name}"
+            if help:
+                lines.append(f"# HELP {full} {help}")
+            lines.append(f"# TYPE {full} gauge")
+            lines.append(f"{full} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _quantile(self, counts, count, q):
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            if cumulative >= rank:
+                return bound
+        return None
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class MetricsServer:
+    """
+    Opt-in local HTTP endpoint (stdlib only) serving GET /metrics as
+    Prometheus text and GET /health as JSON from health(). Requests are
+    served on their own threads and never touch the processing path.
+    """
+    def __init__(self, metrics, health, host="127.0.0.1", port=9108):
+        self.metrics = metrics
+        self.health = health
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body = server.metrics.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path.split("?")[0] == "/health":
+                    body = json.dumps(server.health()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the service log
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.address = self._httpd.server_address
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -1,4 +1,7 @@
 
+import os
+import json
+import threading
 import time
 import sys
 import logging
@@ -6,37 +9,163 @@ from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from src.deduplicator import Deduplicator
+from src.hash_index import HashIndex
 from src.organizer import organize_file
+from src.exif_extractor import get_image_dates, DEFAULT_FILENAME_POLICY, FILENAME_POLICIES
+from src.name_registry import NameRegistry
+from src.metadata_cache import MetadataCache
+from src.ingest import ingest_file, ingest_files
+from src.debounce import DebounceScheduler
+from src.metrics import Metrics, MetricsServer
+from src.polling import ScandirPollingObserver
 
 class ImageHandler(FileSystemEventHandler):
-    def __init__(self, destination_root, quarantine_dir):
+    """
+    Watches one inbox. The deduplicator, name registry, metadata cache and
+    scheduler can be passed in to share them with other inboxes (see
+    MultiInboxMonitor); whoever created shared ones also closes them.
+    """
+    def __init__(self, destination_root, quarantine_dir, index_path=None, cache_path=None,
+                 filename_policy=DEFAULT_FILENAME_POLICY, workers=4, settle_interval=1.0,
+                 spool_path=None, max_queued=10000, metrics=None, deduplicator=None,
+                 name_registry=None, metadata_cache=None, scheduler=None):
         self.destination_root = destination_root
-        self.deduplicator = Deduplicator(quarantine_dir=quarantine_dir)
+        self.quarantine_dir = quarantine_dir
+        # Optional persistent hash index, so dedup state survives restarts
+        self.index = HashIndex(index_path) if index_path and deduplicator is None else None
+        self.deduplicator = deduplicator or Deduplicator(quarantine_dir=quarantine_dir, index=self.index)
+        # Free names in the destination tree, shared by every organize_file call
+        self.name_registry = name_registry or NameRegistry()
+        # EXIF date lookups, persisted when cache_path is given
+        self._owns_cache = metadata_cache is None
+        self.metadata_cache = metadata_cache or MetadataCache(cache_path)
+        self.filename_policy = filename_policy
         self.supported_extensions = {'.jpg', '.jpeg', '.png', '.webp'}
+        self._excluded_roots = [os.path.abspath(destination_root), os.path.abspath(quarantine_dir)]
+        # Optional Metrics fed with per-stage latencies and outcomes
+        self.metrics = metrics
+        # Events only register the path; files are processed on a worker
+        # pool once their size and mtime stayed the same for settle_interval.
+        # Bursts beyond max_queued settled files spill to spool_path.
+        self._owns_scheduler = scheduler is None
+        self.scheduler = scheduler or DebounceScheduler(lambda path: self.process_new_file(Path(path)),
+                                                        workers=workers, settle_interval=settle_interval,
+                                                        spool_path=spool_path, max_queued=max_queued,
+                                                        on_done=self._on_done, metrics=metrics)
+        # Catch-up scan of files that were there before the observer started
+        self.backlog = None
+        if metrics is not None and self._owns_scheduler:
+            self._register_metrics(metrics)
 
     def on_created(self, event):
         if event.is_directory:
-            return
-            
-        file_path = Path(event.src_path)
-        
+            # A folder dropped in with files already inside it
+            self._submit_tree(event.src_path)
+        else:
+            self._submit(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._submit(event.src_path)
+
+    def on_moved(self, event):
+        # Sync tools write to a temporary name and rename it when done
+        self.scheduler.discard(event.src_path)
+        if event.is_directory:
+            self._submit_tree(event.dest_path)
+        else:
+            self._submit(event.dest_path)
+
+    def catch_up(self, source_dir, recursive=False):
+        """
+        Starts feeding the files already in source_dir to the scheduler in
+        the background and returns the BacklogScan (for progress()).
+        Backlog files and event files share the scheduler's pending map, so
+        a file seen by both is processed once.
+        """
+        # Assigned before starting, so no on_done callback can miss it
+        self.backlog = BacklogScan(self, source_dir, recursive)
+        return self.backlog.start()
+
+    def _on_done(self, path):
+        backlog = self.backlog
+        if backlog is not None:
+            backlog.finished(path)
+
+    def _submit(self, path):
+        file_path = Path(path)
+
         # Simple extension check
         if file_path.suffix.lower() not in self.supported_extensions:
             return
+        if self._is_excluded(file_path):
+            return
 
-        # Wait a brief moment for file write to complete (debounce)
-        # In production this might need robust retries or check if file is locked
-        time.sleep(1) 
-        
-        self.process_new_file(file_path)
+        # Never blocks the dispatch thread: the scheduler waits for the write
+        # to finish and hands the file to a worker. Repeated events for the
+        # same path are coalesced there.
+        self.scheduler.submit(file_path)
 
-    def process_new_file(self, file_path):
+    def _submit_tree(self, directory):
+        if self._is_excluded(directory):
+            return
+        for path in self._walk(directory, recursive=True):
+            self.scheduler.submit(path)
+
+    def _is_excluded(self, path):
+        """
+        True for paths inside the destination or quarantine folders, which
+        may live under a recursively watched source.
+        """
+        path = os.path.abspath(path)
+        return any(path == root or path.startswith(root + os.sep) for root in self._excluded_roots)
+
+    def _walk(self, directory, recursive):
+        """
+        Yields the supported files in directory (and its subfolders when
+        recursive), skipping the destination and quarantine folders.
+        """
+        for root, dirs, files in os.walk(directory):
+            if recursive:
+                dirs[:] = [d for d in dirs if not self._is_excluded(os.path.join(root, d))]
+            else:
+                dirs[:] = []
+            for name in files:
+                if os.path.splitext(name)[1].lower() in self.supported_extensions:
+                    yield Path(root) / name
+
+    def ingest(self, file_path):
+        """
+        Hashes file_path and reads its date in a single pass (see
+        ingest_file). Returns None in content-dedup mode, where the byte
+        hashes are of no use.
+        """
+        if self.deduplicator.key != "bytes":
+            return None
+        return ingest_file(file_path, algorithm=self.deduplicator.algorithm,
+                           cache=self.metadata_cache, filename_policy=self.filename_policy)
+
+    def process_new_file(self, file_path, date=None, ingested=None):
         logging.info(f"Processing new file: {file_path}")
+        metrics = self.metrics
+        mark = time.perf_counter() if metrics is not None else None
         
         try:
+            # 0. One read for hashes and date, unless the caller already did it
+            if ingested is None and date is None:
+                ingested = self.ingest(file_path)
+                if metrics is not None:
+                    mark = self._lap("ingest", mark)
+            if ingested is not None:
+                date = ingested["date"]
+
             # 1. Deduplication
             # Deduplicator moves file if duplicate, so check existence after
-            status = self.deduplicator.process_file(file_path)
+            status = self.deduplicator.process_file(file_path, hashes=ingested,
+                                                    quarantine_dir=self.quarantine_dir)
+            if metrics is not None:
+                mark = self._lap("dedup", mark)
+                metrics.inc("dedup_total", labels=(("result", status),))
             
             if status == "duplicate":
                 logging.info(f"Detected duplicate: {file_path} -> Quarantine")
@@ -44,14 +173,98 @@ class ImageHandler(FileSystemEventHandler):
             
             # 2. Organization (if unique and still exists)
             if file_path.exists():
-                new_path = organize_file(file_path, self.destination_root, move=True)
+                # Workers checking same-size files wait for the move
+                # instead of finding this file gone and forgetting it
+                with self.deduplicator.moving(file_path):
+                    new_path = organize_file(file_path, self.destination_root, move=True,
+                                             registry=self.name_registry,
+                                             cache=self.metadata_cache,
+                                             date=date,
+                                             filename_policy=self.filename_policy,
+                                             digest=ingested["full"] if ingested is not None else None,
+                                             algorithm=self.deduplicator.algorithm)
+                    if new_path:
+                        self.deduplicator.relocate(file_path, new_path)
                 if new_path:
                     logging.info(f"Organized: {file_path} -> {new_path}")
+                if metrics is not None:
+                    self._lap("move", mark)
+                    metrics.inc("moves_total", labels=(("result", "organized" if new_path else "failed"),))
+                    if not new_path:
+                        metrics.inc("errors_total")
                     
         except Exception as e:
             logging.error(f"Error processing {file_path}: {e}")
+            if metrics is not None:
+                metrics.inc("errors_total")
 
-    def process_existing_files(self, source_dir):
+    def _lap(self, stage, mark):
+        now = time.perf_counter()
+        self.metrics.observe(stage, now - mark)
+        return now
+
+    def _register_metrics(self, metrics):
+        metrics.describe("dedup_total", "Files checked for duplicates, by result (unique/duplicate/skipped)")
+        metrics.describe("moves_total", "Unique files moved into the library, by result (organized/failed)")
+        metrics.describe("errors_total", "Files whose processing raised an error or whose move failed")
+        metrics.describe("worker_busy_seconds_total", "Time workers spent processing files")
+        metrics.gauge("workers", lambda: self.scheduler.workers, "Size of the worker pool")
+        metrics.gauge("workers_busy", lambda: self.scheduler.stats()["running"], "Workers processing a file")
+        metrics.gauge("queue_depth", lambda: self.scheduler.stats()["queued"], "Settled files waiting for a worker")
+        metrics.gauge("files_settling", lambda: self.scheduler.stats()["settling"],
+                      "Files waiting for their writes to finish")
+        metrics.gauge("queue_oldest_age_seconds", lambda: self.scheduler.stats()["oldest_queued_age"],
+                      "Time since the oldest queued file was first seen")
+        metrics.gauge("backlog_remaining", self._backlog_remaining, "Catch-up files not processed yet")
+
+    def _backlog_remaining(self):
+        if self.backlog is None:
+            return None
+        progress = self.backlog.progress()
+        return progress["found"] - progress["done"]
+
+    def health(self):
+        """
+        Returns the JSON health document served at /health: dedup and move
+        outcome counts, duplicate ratio, errors, per-stage rates and latency percentiles,
+        queue state, worker utilization and backlog progress.
+        """
+        metrics = self.metrics
+        dedup = {labels[0][1]: count for labels, count in metrics.counters("dedup_total").items()}
+        moves = {labels[0][1]: count for labels, count in metrics.counters("moves_total").items()}
+        checked = dedup.get("unique", 0) + dedup.get("duplicate", 0)
+        uptime = time.monotonic() - metrics.started
+        busy = metrics.counter("worker_busy_seconds_total")
+        queue = self.scheduler.stats()
+        return {
+            "status": "ok",
+            "uptime_s": uptime,
+            "dedup": dedup,
+            "moves": moves,
+            "duplicate_ratio": dedup.get("duplicate", 0) / checked if checked else None,
+            "errors": metrics.counter("errors_total"),
+            "stages": metrics.stage_summary(),
+            "queue": queue,
+            "workers": {"count": self.scheduler.workers, "busy": queue["running"],
+                        "utilization": busy / (self.scheduler.workers * uptime) if uptime > 0 else None},
+            "backlog": self.backlog.progress() if self.backlog is not None else None,
+        }
+
+    def close(self):
+        """
+        Finishes the files already being processed and releases the index
+        and cache.
+        """
+        if self.backlog is not None:
+            self.backlog.stop()
+        if self._owns_scheduler:
+            self.scheduler.close()
+        if self.index is not None:
+            self.index.close()
+        if self._owns_cache:
+            self.metadata_cache.close()
+
+    def process_existing_files(self, source_dir, recursive=False):
         logging.info(f"Processing existing files in {source_dir}...")
         source_path = Path(source_dir)
         if not source_path.exists():
@@ -59,47 +272,413 @@ class ImageHandler(FileSystemEventHandler):
             return
 
         count = 0
-        for item in source_path.iterdir():
-            if item.is_file() and item.suffix.lower() in self.supported_extensions:
-                self.process_new_file(item)
+        items = self._walk(source_path, recursive)
+        # Files are read ahead concurrently; they are still handled in order
+        if self.deduplicator.key == "bytes":
+            ingested = ingest_files(items, algorithm=self.deduplicator.algorithm,
+                                    cache=self.metadata_cache, filename_policy=self.filename_policy)
+            for item, result in ingested:
+                self.process_new_file(item, ingested=result)
+                count += 1
+        else:
+            dates = get_image_dates(items, cache=self.metadata_cache, filename_policy=self.filename_policy)
+            for item, date, _ in dates:
+                self.process_new_file(item, date)
                 count += 1
         logging.info(f"Finished processing {count} existing files.")
 
-def start_monitoring(source_dir, destination_root, quarantine_dir):
-    event_handler = ImageHandler(destination_root, quarantine_dir)
-    
-    # Process existing files first
-    event_handler.process_existing_files(source_dir)
+class BacklogScan:
+    """
+    Walks source_dir in a background thread and submits every supported
+    file to the handler's scheduler, so the backlog is drained by the same
+    worker pool as new events. At most max_outstanding backlog files are
+    in the scheduler at a time, which keeps its pending map small on huge
+    backlogs and leaves room for live events.
+    """
+    def __init__(self, handler, source_dir, recursive=False, max_outstanding=1000):
+        self.handler = handler
+        self.source_dir = source_dir
+        self.recursive = recursive
+        self.max_outstanding = max_outstanding
+        self._cond = threading.Condition()
+        # absolute paths submitted and not reported done by the scheduler yet
+        self._outstanding = set()
+        self.found = 0
+        self.done = 0
+        self.walking = True
+        self._stopped = False
+        self._started = None
+        self._thread = threading.Thread(target=self._run, name="backlog", daemon=True)
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def finished(self, path):
+        """
+        Scheduler callback: path left the scheduler (processed, or gone).
+        """
+        with self._cond:
+            if path in self._outstanding:
+                self._outstanding.remove(path)
+                self.done += 1
+                self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the whole backlog was processed. Returns False on timeout.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while (self.walking or self._outstanding) and not self._stopped:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return not self._stopped
+
+    def progress(self):
+        """
+        Returns {"found", "done", "walking", "elapsed", "files_per_s", "eta"}.
+        eta (seconds) only covers the files found so far while still walking,
+        and is None until the first file is done.
+        """
+        with self._cond:
+            found, done, walking = self.found, self.done, self.walking
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (found - done) / rate if rate else None
+        return {"found": found, "done": done, "walking": walking,
+                "elapsed": elapsed, "files_per_s": rate, "eta": eta}
+
+    def _run(self):
+        try:
+            for path in self.handler._walk(self.source_dir, self.recursive):
+                key = os.path.abspath(path)
+                with self._cond:
+                    while len(self._outstanding) >= self.max_outstanding and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    self._outstanding.add(key)
+                    self.found += 1
+                if not self.handler.scheduler.submit(key):
+                    self.finished(key)  # Gone already, e.g. handled via an event
+        finally:
+            with self._cond:
+                self.walking = False
+                self._cond.notify_all()
+
+def load_config(config_path):
+    """
+    Reads a JSON monitor config with many inboxes:
+    {"inboxes": [{"source": ..., "destination": ..., "quarantine": ...,
+                  "name": ..., "recursive": ..., "polling": ...,
+                  "max_concurrent": ...}, ...],
+     "quarantine": ..., "index": ..., "cache": ..., "spool": ..., "workers": ...,
+     "recursive": ..., "polling": ..., "metrics_port": ..., "filename_policy": ...}
+    Only "source" and "destination" are required. Inbox settings default to
+    the top-level ones, names to the source folder name, and max_concurrent
+    (files of that inbox processed at once) to no limit. filename_policy
+    (see exif_extractor) is None unless the file sets it.
+    Returns the config with every default filled in; raises ValueError if
+    it is malformed.
+    """
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+    inboxes = config.get("inboxes") if isinstance(config, dict) else None
+    if not inboxes or not isinstance(inboxes, list):
+        raise ValueError(f"{config_path}: expected a non-empty \"inboxes\" list")
+
+    result = {"index": config.get("index"), "cache": config.get("cache"),
+              "spool": config.get("spool"), "workers": config.get("workers", 4),
+              "metrics_port": config.get("metrics_port"),
+              "filename_policy": config.get("filename_policy"), "inboxes": []}
+    if result["filename_policy"] not in (None,) + FILENAME_POLICIES:
+        raise ValueError(f"{config_path}: unknown filename_policy {result['filename_policy']!r}")
+    names = set()
+    for i, inbox in enumerate(inboxes):
+        if not isinstance(inbox, dict) or not inbox.get("source") or not inbox.get("destination"):
+            raise ValueError(f"{config_path}: inbox {i} needs a source and a destination")
+        name = str(inbox.get("name") or os.path.basename(os.path.normpath(inbox["source"])))
+        if name in names:
+            raise ValueError(f"{config_path}: duplicate inbox name {name!r}")
+        names.add(name)
+        max_concurrent = inbox.get("max_concurrent")
+        if max_concurrent is not None and max_concurrent < 1:
+            raise ValueError(f"{config_path}: max_concurrent of {name!r} must be at least 1")
+        result["inboxes"].append({
+            "name": name,
+            "source": inbox["source"],
+            "destination": inbox["destination"],
+            "quarantine": inbox.get("quarantine", config.get("quarantine", "Quarantine")),
+            "recursive": inbox.get("recursive", config.get("recursive", False)),
+            "polling": inbox.get("polling", config.get("polling", False)),
+            "max_concurrent": max_concurrent,
+        })
+    return result
+
+class MultiInboxMonitor:
+    """
+    Serves several inboxes (source -> destination mappings, as returned by
+    load_config) from one process: one ImageHandler per inbox, all sharing
+    one worker pool, one hash index and deduplicator, one name registry and
+    one metadata cache, so a photo already organized from one inbox is a
+    duplicate in every other.
+    The scheduler keeps a queue per inbox and serves them in turn, and
+    max_concurrent caps the workers one inbox can hold, so a busy inbox
+    cannot starve the others.
+    """
+    def __init__(self, inboxes, index_path=None, cache_path=None, workers=4, settle_interval=1.0,
+                 spool_path=None, max_queued=10000, metrics=None, filename_policy=DEFAULT_FILENAME_POLICY):
+        self.inboxes = list(inboxes)
+        self.metrics = metrics
+        self.index = HashIndex(index_path) if index_path else None
+        self.deduplicator = Deduplicator(quarantine_dir=self.inboxes[0]["quarantine"], index=self.index)
+        self.name_registry = NameRegistry()
+        self.metadata_cache = MetadataCache(cache_path)
+        # Longest source first, so a nested inbox wins over its parent
+        self._sources = sorted(((os.path.abspath(inbox["source"]), inbox["name"]) for inbox in self.inboxes),
+                               key=lambda item: len(item[0]), reverse=True)
+        # A single inbox keeps the plain (unkeyed) queue and spool file
+        keyed = len(self.inboxes) > 1
+        quotas = {(inbox["name"] if keyed else None): inbox.get("max_concurrent") for inbox in self.inboxes}
+        self.scheduler = DebounceScheduler(self._process, workers=workers, settle_interval=settle_interval,
+                                           spool_path=spool_path, max_queued=max_queued,
+                                           on_done=self._on_done, metrics=metrics,
+                                           key=self.inbox_of if keyed else None, quotas=quotas)
+        # No inbox may pick up files organized (or quarantined) by another
+        excluded = [os.path.abspath(inbox[folder]) for inbox in self.inboxes
+                    for folder in ("destination", "quarantine")]
+        self.handlers = {}
+        for inbox in self.inboxes:
+            # Inboxes nested in this one own their files: events and the
+            # catch-up walk leave them to that inbox's handler and backlog
+            source = os.path.abspath(inbox["source"])
+            nested = [other for other, _ in self._sources if other.startswith(source + os.sep)]
+            handler = ImageHandler(inbox["destination"], inbox["quarantine"], filename_policy=filename_policy,
+                                   metrics=metrics, deduplicator=self.deduplicator,
+                                   name_registry=self.name_registry, metadata_cache=self.metadata_cache,
+                                   scheduler=self.scheduler)
+            handler._excluded_roots = excluded + nested
+            self.handlers[inbox["name"]] = handler
+        if metrics is not None:
+            self.handlers[self.inboxes[0]["name"]]._register_metrics(metrics)
+            metrics.gauge("backlog_remaining", self._backlog_remaining, "Catch-up files not processed yet")
+
+    def inbox_of(self, path):
+        """
+        Returns the name of the inbox path belongs to, or None.
+        """
+        path = os.path.abspath(path)
+        for source, name in self._sources:
+            if path == source or path.startswith(source + os.sep):
+                return name
+        return None
+
+    def _handler_for(self, path):
+        name = self.inbox_of(path)
+        return self.handlers.get(name) if name is not None else None
+
+    def _process(self, path):
+        handler = self._handler_for(path)
+        if handler is None:
+            logging.warning(f"No inbox for {path}, skipping")
+            return
+        handler.process_new_file(Path(path))
+
+    def _on_done(self, path):
+        handler = self._handler_for(path)
+        if handler is not None:
+            handler._on_done(path)
+
+    def catch_up(self):
+        """
+        Starts the catch-up scan of every inbox. Returns {name: BacklogScan}.
+        """
+        return {inbox["name"]: self.handlers[inbox["name"]].catch_up(inbox["source"], inbox["recursive"])
+                for inbox in self.inboxes}
+
+    def _backlog_remaining(self):
+        remaining = [handler._backlog_remaining() for handler in self.handlers.values()]
+        remaining = [n for n in remaining if n is not None]
+        return sum(remaining) if remaining else None
+
+    def health(self):
+        """
+        Same document as ImageHandler.health, with the backlog and queue of
+        each inbox under "inboxes".
+        """
+        document = self.handlers[self.inboxes[0]["name"]].health()
+        queues = self.scheduler.key_stats()
+        keyed = len(self.inboxes) > 1
+        if keyed:
+            del document["backlog"]  # The first inbox's only
+        document["inboxes"] = {}
+        for name, handler in self.handlers.items():
+            state = dict(queues.get(name if keyed else None, {"queued": 0, "running": 0, "quota": None}))
+            state["backlog"] = handler.backlog.progress() if handler.backlog is not None else None
+            document["inboxes"][name] = state
+        return document
+
+    def close(self):
+        """
+        Stops the catch-up scans, finishes the files being processed and
+        releases the shared index and cache.
+        """
+        for handler in self.handlers.values():
+            if handler.backlog is not None:
+                handler.backlog.stop()
+        self.scheduler.close()
+        if self.index is not None:
+            self.index.close()
+        self.metadata_cache.close()
+
+def start_monitoring(source_dir=None, destination_root=None, quarantine_dir="Quarantine", index_path=None,
+                     cache_path=None, recursive=False, spool_path=None, stats_interval=60, metrics_port=None,
+                     metrics_host="127.0.0.1", polling=False, config_path=None,
+                     filename_policy=DEFAULT_FILENAME_POLICY):
+    """
+    Watches source_dir, or every inbox of the config file at config_path
+    (see load_config); settings in the file take precedence over arguments.
+    """
+    if config_path:
+        config = load_config(config_path)
+        inboxes = config["inboxes"]
+        index_path = config["index"] or index_path
+        cache_path = config["cache"] or cache_path
+        spool_path = config["spool"] or spool_path
+        metrics_port = config["metrics_port"] if config["metrics_port"] is not None else metrics_port
+        workers = config["workers"]
+        filename_policy = config["filename_policy"] or filename_policy
+    else:
+        inboxes = [{"name": os.path.basename(os.path.normpath(source_dir)), "source": source_dir,
+                    "destination": destination_root, "quarantine": quarantine_dir,
+                    "recursive": recursive, "polling": polling, "max_concurrent": None}]
+        workers = 4
+
+    # Metrics are opt-in: without a port nothing is measured at all
+    metrics = Metrics() if metrics_port is not None else None
+    monitor = MultiInboxMonitor(inboxes, index_path, cache_path, workers=workers,
+                                spool_path=spool_path, metrics=metrics, filename_policy=filename_policy)
+    metrics_server = None
+    if metrics is not None:
+        metrics_server = MetricsServer(metrics, monitor.health, metrics_host, metrics_port).start()
+        logging.info(f"Metrics: http://{metrics_host}:{metrics_server.address[1]}/metrics (and /health)")
     
-    observer = Observer()
-    observer.schedule(event_handler, source_dir, recursive=False)
-    observer.start()
-    logging.info(f"Started monitoring {source_dir}")
-    logging.info(f"Destination: {destination_root}")
-    logging.info(f"Quarantine: {quarantine_dir}")
+    # Watch first, so nothing created during the catch-up is missed; the
+    # backlog then drains through the same worker pool
+    # Network shares (SMB/NFS) deliver no inotify events: poll them instead
+    observers = {}
+    for inbox in inboxes:
+        if inbox["polling"] not in observers:
+            observers[inbox["polling"]] = ScandirPollingObserver() if inbox["polling"] else Observer()
+        observers[inbox["polling"]].schedule(monitor.handlers[inbox["name"]], inbox["source"],
+                                             recursive=inbox["recursive"])
+    for observer in observers.values():
+        observer.start()
+    backlogs = monitor.catch_up()
+    for inbox in inboxes:
+        quota = inbox["max_concurrent"] or "no limit"
+        logging.info(f"Started monitoring {inbox['source']} -> {inbox['destination']} "
+                     f"(quarantine: {inbox['quarantine']}, max concurrent: {quota})")
+    if index_path:
+        logging.info(f"Hash index: {index_path}")
     
     try:
+        last_report = time.monotonic()
         while True:
             time.sleep(1)
+            for name, backlog in list(backlogs.items()):
+                if backlog.wait(timeout=0):
+                    progress = backlog.progress()
+                    logging.info(f"Backlog of {name} done: {progress['done']} files in {progress['elapsed']:.0f}s")
+                    del backlogs[name]
+            if time.monotonic() - last_report >= stats_interval:
+                last_report = time.monotonic()
+                for name, backlog in backlogs.items():
+                    progress = backlog.progress()
+                    eta = f"{progress['eta']:.0f}s" if progress["eta"] is not None else "?"
+                    logging.info(f"Backlog of {name}: {progress['done']}/{progress['found']}"
+                                 f"{'+' if progress['walking'] else ''} files, "
+                                 f"{progress['files_per_s']:.1f} files/s, ETA {eta}")
+                stats = monitor.scheduler.stats()
+                if stats["queued"] or stats["settling"]:
+                    age = stats["oldest_queued_age"] or 0
+                    logging.info(f"Queue: {stats['queued']} queued (oldest {age:.0f}s), "
+                                 f"{stats['settling']} settling, {stats['running']} running")
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        for observer in observers.values():
+            observer.stop()
+    for observer in observers.values():
+        observer.join()
+    if metrics_server is not None:
+        metrics_server.close()
+    monitor.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python monitor.py <source_dir> [destination_dir] [quarantine_dir]")
+    # --recursive also watches (and catches up on) subfolders of source_dir
+    recursive = "--recursive" in sys.argv
+    if recursive:
+        sys.argv.remove("--recursive")
+    # --spool=<file> keeps bursts beyond the in-memory queue on disk, across restarts
+    spool = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--spool="):
+            spool = arg.split("=", 1)[1]
+            sys.argv.remove(arg)
+    # --poll watches with scandir snapshots, for network shares
+    polling = "--poll" in sys.argv
+    if polling:
+        sys.argv.remove("--poll")
+    # --metrics-port=<port> serves /metrics (Prometheus) and /health (JSON) on localhost
+    metrics_port = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--metrics-port="):
+            metrics_port = int(arg.split("=", 1)[1])
+            sys.argv.remove(arg)
+    # --filename-policy=<ignore|fallback|trust> dates photos from names like IMG_20230514_101233.jpg
+    filename_policy = DEFAULT_FILENAME_POLICY
+    for arg in sys.argv[1:]:
+        if arg.startswith("--filename-policy="):
+            filename_policy = arg.split("=", 1)[1]
+            sys.argv.remove(arg)
+    if filename_policy not in FILENAME_POLICIES:
+        print(f"Unknown filename policy {filename_policy!r}: use one of {', '.join(FILENAME_POLICIES)}")
+        sys.exit(1)
+    # --config=<file.json> watches every inbox listed in the file (see load_config)
+    config_file = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--config="):
+            config_file = arg.split("=", 1)[1]
+            sys.argv.remove(arg)
+    if len(sys.argv) < 2 and config_file is None:
+        print("Usage: python monitor.py <source_dir> [destination_dir] [quarantine_dir] [index_db] "
+              "[--recursive] [--poll] [--spool=<file>] [--metrics-port=<port>] [--filename-policy=<policy>]\n"
+              "       python monitor.py --config=<inboxes.json> [--spool=<file>] [--metrics-port=<port>] "
+              "[--filename-policy=<policy>]")
         sys.exit(1)
         
-    source = sys.argv[1]
+    source = sys.argv[1] if len(sys.argv) > 1 else None
     dest = sys.argv[2] if len(sys.argv) > 2 else "OrganizedPhotos"
     quar = sys.argv[3] if len(sys.argv) > 3 else "Quarantine"
+    index_db = sys.argv[4] if len(sys.argv) > 4 else None
     
     logging.basicConfig(level=logging.INFO,
                         format='%(asctime)s - %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
                         
     try:
-        start_monitoring(source, dest, quar)
+        start_monitoring(source, dest, quar, index_db, recursive=recursive, spool_path=spool,
+                         metrics_port=metrics_port, polling=polling, config_path=config_file,
+                         filename_policy=filename_policy)
     except Exception as e:
         logging.critical(f"Critical error: {e}", exc_info=True)
         sys.exit(1)
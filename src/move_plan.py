@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from pathlib import Path
+from src.exif_extractor import get_image_dates, DEFAULT_FILENAME_POLICY
+from src.name_registry import NameRegistry
+from src.organizer import get_target_dir, transfer_file
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+class MovePlan:
+    """
+    The full reorganization of a tree, computed before touching the disk.
+    Holds the ordered (source, target) moves with collisions already
+    resolved, so it can be saved (JSON, or msgpack for *.msgpack files),
+    reviewed, diffed against another plan and applied in bulk.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, destination_root, moves=None, move=True):
+        self.destination_root = str(destination_root)
+        self.moves = [(str(source), str(target)) for source, target in (moves or [])]
+        self.move = move
+
+    def __len__(self):
+        return len(self.moves)
+
+    @property
+    def directories(self):
+        """
+        Target directories the plan needs, each listed once.
+        """
+        return sorted({os.path.dirname(target) for _, target in self.moves})
+
+    def to_dict(self):
+        return {"version": self.FORMAT_VERSION,
+                "destination_root": self.destination_root,
+                "move": self.move,
+                "moves": [list(pair) for pair in self.moves]}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported move plan version: {data.get('version')}")
+        return cls(data["destination_root"], data["moves"], data.get("move", True))
+
+    def save(self, path):
+        path = Path(path)
+        if path.suffix == ".msgpack":
+            if msgpack is None:
+                raise ImportError("msgpack is required to save .msgpack plans (pip install msgpack)")
+            path.write_bytes(msgpack.packb(self.to_dict()))
+        else:
+            path.write_text(json.dumps(self.to_dict(), indent=1), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        if path.suffix == ".msgpack":
+            if msgpack is None:
+                raise ImportError("msgpack is required to load .msgpack plans (pip install msgpack)")
+            return cls.from_dict(msgpack.unpackb(path.read_bytes()))
+        return cls.from_dict(json.loads(path.read_text(encoding="utf-8")))
+
+    def diff(self, other):
+        """
+        Compares this plan with other, by source path.
+        Returns {"added": [(source, target)], "removed": [(source, target)],
+        "changed": [(source, old_target, new_target)]}, where "added" are
+        moves only present in other.
+        """
+        mine = dict(self.moves)
+        theirs = dict(other.moves)
+        return {
+            "added": [(s, t) for s, t in other.moves if s not in mine],
+            "removed": [(s, t) for s, t in self.moves if s not in theirs],
+            "changed": [(s, t, theirs[s]) for s, t in self.moves
+                        if s in theirs and theirs[s] != t],
+        }
+
+    def apply(self):
+        """
+        Executes the plan, one target directory at a time: each directory is
+        created once, then its files are moved (or copied) in plan order with
+        no existence probes, since names were resolved when planning.
+        Targets are created exclusively: a file that appeared at a planned
+        target since planning is left alone and its move is skipped and
+        reported under "conflicts" as (source, target) pairs, e.g. to plan
+        those files again.
+        Returns a summary dict with counts and elapsed seconds.
+        """
+        start = time.perf_counter()
+        summary = {"moved": 0, "failed": 0, "directories": 0, "conflicts": []}
+        by_directory = {}
+        for source, target in self.moves:
+            by_directory.setdefault(os.path.dirname(target), []).append((source, target))
+
+        for directory, moves in by_directory.items():
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                print(f"Error creating directory {directory}: {e}")
+                summary["failed"] += len(moves)
+                continue
+            summary["directories"] += 1
+            for source, target in moves:
+                try:
+                    moved = transfer_file(source, target, self.move)
+                except FileExistsError:
+                    summary["conflicts"].append((source, target))
+                    continue
+                if moved:
+                    summary["moved"] += 1
+                else:
+                    summary["failed"] += 1
+        summary["seconds"] = time.perf_counter() - start
+        return summary
+
+def plan_directory(source_dir, destination_root, move=True, cache=None, workers=8,
+                   filename_policy=DEFAULT_FILENAME_POLICY):
+    """
+    Builds the MovePlan that process_directory would execute for source_dir,
+    without moving anything. Each target directory is listed once to resolve
+    name collisions against what is already on disk.
+    """
+    supported_extensions = {'.jpg', '.jpeg', '.png', '.webp'}
+    registry = NameRegistry()
+    plan = MovePlan(destination_root, move=move)
+    items = sorted(item for item in Path(source_dir).iterdir()
+                   if item.is_file() and item.suffix.lower() in supported_extensions)
+    dates = get_image_dates(items, workers=workers, cache=cache, filename_policy=filename_policy)
+    for item, date, _ in dates:
+        if date is None:
+            continue
+        target_path = registry.reserve(get_target_dir(destination_root, date), item.name)
+        plan.moves.append((str(item), str(target_path)))
+    return plan
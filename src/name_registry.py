@@ -0,0 +1,102 @@
+import os
+import threading
+from pathlib import Path
+
+class NameRegistry:
+    """
+    Per-directory cache of taken file names, used to pick collision-free
+    targets (name, name_1, name_2...) without probing the disk each time.
+    A directory is listed once with os.scandir the first time it is used;
+    afterwards reservations are set lookups plus a cached next counter per
+    name, so a burst of IMG_0001.JPG files costs O(1) each instead of
+    O(n) exists() calls.
+    A reserved name is only a candidate: other programs may create it in
+    the meantime, so callers create the target exclusively (see
+    transfer.move_file) and report a clash with taken(), which relists the
+    directory. forget() drops a listing known to be stale.
+    Names are compared the way os.path.normcase compares them (ignoring
+    case on Windows only), like the exists() checks done without a
+    registry; clashes on other case-insensitive filesystems also surface
+    as taken() names.
+    """
+    def __init__(self):
+        # normalized directory -> {"names": set, "next": {(stem, suffix): counter}}
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, directory, filename):
+        """
+        Returns a free path for filename inside directory and marks it taken.
+        """
+        directory = Path(directory)
+        with self._lock:
+            state = self._state(directory)
+            names = state["names"]
+            if _name_key(filename) not in names:
+                names.add(_name_key(filename))
+                return directory / filename
+
+            name = Path(filename)
+            stem, suffix = name.stem, name.suffix
+            key = (_name_key(stem), _name_key(suffix))
+            counter = state["next"].get(key, 1)
+            candidate = f"{stem}_{counter}{suffix}"
+            while _name_key(candidate) in names:
+                counter += 1
+                candidate = f"{stem}_{counter}{suffix}"
+            names.add(_name_key(candidate))
+            state["next"][key] = counter + 1
+            return directory / candidate
+
+    def release(self, path):
+        """
+        Marks a name as free again, e.g. when the move into it failed or the
+        file left the directory.
+        """
+        path = Path(path)
+        with self._lock:
+            state = self._dirs.get(self._key(path.parent))
+            if state is not None:
+                state["names"].discard(_name_key(path.name))
+
+    def taken(self, path):
+        """
+        Records that path turned out to exist already (created behind the
+        registry's back): its directory is listed again and path stays
+        taken, so the next reserve() returns another name. Names reserved
+        but not written yet stay reserved.
+        """
+        path = Path(path)
+        with self._lock:
+            state = self._dirs.pop(self._key(path.parent), None)
+            fresh = self._state(path.parent)
+            if state is not None:
+                fresh["names"] |= state["names"]
+            fresh["names"].add(_name_key(path.name))
+
+    def forget(self, directory):
+        """
+        Drops the cached listing of directory; it is rescanned on next use.
+        """
+        with self._lock:
+            self._dirs.pop(self._key(directory), None)
+
+    def _state(self, directory):
+        key = self._key(directory)
+        state = self._dirs.get(key)
+        if state is None:
+            try:
+                with os.scandir(directory) as it:
+                    names = {_name_key(entry.name) for entry in it}
+            except FileNotFoundError:
+                names = set()
+            state = {"names": names, "next": {}}
+            self._dirs[key] = state
+        return state
+
+    @staticmethod
+    def _key(directory):
+        return os.path.normcase(os.path.abspath(directory))
+
+def _name_key(name):
+    return os.path.normcase(name)
@@ -1,13 +1,26 @@
 
 import os
-import shutil
+import queue
+import threading
+import time
+import zlib
 from pathlib import Path
-from src.exif_extractor import get_image_date
+from src.exif_extractor import get_image_date, get_image_dates, DEFAULT_FILENAME_POLICY
+from src.name_registry import NameRegistry
+from src.transfer import move_file, copy_file
+from src.deduplicator import DEFAULT_ALGORITHM
 
-def organize_file(file_path, destination_root, move=True):
+def organize_file(file_path, destination_root, move=True, registry=None, cache=None, date=None,
+                  filename_policy=DEFAULT_FILENAME_POLICY, digest=None, algorithm=DEFAULT_ALGORITHM):
     """
     Organizes a single file into destination_root/YYYY/MM/DD/.
     Handles collisions by appending a counter.
+    With a NameRegistry, the free name is resolved from its cached listing
+    instead of probing target paths one by one; with a MetadataCache, files
+    already inspected are not re-read for their date. A date already known
+    (e.g. from get_image_dates) skips the lookup altogether. A digest of the
+    file (with algorithm) from an earlier read, e.g. the dedup hash, is
+    checked against the data of a cross-device move or copy.
     Returns the new path of the file.
     """
     file_path = Path(file_path)
@@ -15,13 +28,11 @@ def organize_file(file_path, destination_root, move=True):
         raise FileNotFoundError(f"{file_path} does not exist")
 
     # Get date
-    date = get_image_date(str(file_path))
+    if date is None:
+        date = get_image_date(str(file_path), cache, filename_policy)
     
     # Construct target directory
-    year = date.strftime("%Y")
-    month = date.strftime("%m")
-    day = date.strftime("%d")
-    target_dir = Path(destination_root) / year / month / day
+    target_dir = get_target_dir(destination_root, date)
     
     # Create directory if it doesn't exist
     target_dir.mkdir(parents=True, exist_ok=True)
@@ -30,36 +41,202 @@ def organize_file(file_path, destination_root, move=True):
     original_name = file_path.name
     stem = file_path.stem
     suffix = file_path.suffix
-    target_path = target_dir / original_name
-    
-    counter = 1
-    while target_path.exists():
-        # Check if it's the exact same file (optional optimization for future, 
-        # but for now we assume we want to keep both if names collide but content might differ
-        # logic for deduplication is in US-003)
-        target_path = target_dir / f"{stem}_{counter}{suffix}"
-        counter += 1
+    counter = 0
+    while True:
+        if registry is not None:
+            target_path = registry.reserve(target_dir, original_name)
+        else:
+            target_path = target_dir / (f"{stem}_{counter}{suffix}" if counter else original_name)
+            while target_path.exists():
+                # Check if it's the exact same file (optional optimization for future, 
+                # but for now we assume we want to keep both if names collide but content might differ
+                # logic for deduplication is in US-003)
+                counter += 1
+                target_path = target_dir / f"{stem}_{counter}{suffix}"
+
+        # Move or Copy logic; the target is created exclusively, so a file
+        # that appeared there since the name was picked is never replaced
+        try:
+            transferred = transfer_file(file_path, target_path, move, digest, algorithm)
+        except FileExistsError:
+            if registry is not None:
+                registry.taken(target_path)
+            else:
+                counter += 1
+            continue
+        break
+
+    if not transferred:
+        if registry is not None:
+            registry.release(target_path)
+        return None
         
-    # Move or Copy logic
+    return str(target_path)
+
+def get_target_dir(destination_root, date):
+    """
+    Returns destination_root/YYYY/MM/DD for date.
+    """
+    year = date.strftime("%Y")
+    month = date.strftime("%m")
+    day = date.strftime("%d")
+    return Path(destination_root) / year / month / day
+
+def transfer_file(file_path, target_path, move=True, digest=None, algorithm=DEFAULT_ALGORITHM):
+    """
+    Moves or copies file_path to target_path through the transfer engine:
+    a link/rename on the same filesystem, otherwise a kernel-side copy.
+    Moves across filesystems are hashed in flight and fsynced before the
+    source is unlinked, and checked against digest when it is given.
+    Returns False (after reporting the error) when the transfer failed.
+    Never replaces an existing target_path: raises FileExistsError, so the
+    caller can pick another name.
+    """
     try:
         if move:
-            shutil.move(str(file_path), str(target_path))
+            move_file(file_path, target_path, algorithm=algorithm, expected=digest)
         else:
-            shutil.copy2(str(file_path), str(target_path))
+            copy_file(file_path, target_path, verify=digest is not None, algorithm=algorithm,
+                      expected=digest)
+    except FileExistsError:
+        raise
     except OSError as e:
         print(f"Error moving file {file_path}: {e}")
-        return None
-        
-    return str(target_path)
+        return False
+    return True
 
-def process_directory(source_dir, destination_root):
+def process_directory(source_dir, destination_root, cache=None, workers=8,
+                      filename_policy=DEFAULT_FILENAME_POLICY, move_workers=1, queue_size=256,
+                      journal=None):
     """
     Scans source_dir and organizes all supported files.
+    Runs as a three-stage pipeline:
+    1. Metadata: get_image_dates reads dates with up to workers files in flight
+    2. Plan: target folders and collision-free names are resolved here, in
+       input order, so the resulting names are deterministic
+    3. Move: files are moved one by one right after planning. With
+       move_workers > 1, that many threads create folders and move files
+       instead; each target folder is always served by the same worker, so
+       moves into one folder happen in input order. This only pays off when
+       moves have latency to overlap (network shares): on a local disk the
+       thread hand-off makes it slower than the default serial moves.
+    Movers are fed by bounded queues (queue_size per mover), keeping memory
+    flat on huge trees. A file that fails to move, for whatever reason, is
+    counted as failed and the run goes on.
+    Pass a persistent MetadataCache to make re-runs over a half-processed
+    tree skip the EXIF reads already done, and filename_policy="trust" for
+    trees whose file names are known to carry the right date.
+    With a Journal, every move is logged before and after it happens; a run
+    that died halfway is resumed by calling again with the same journal,
+    which first rolls interrupted moves forward or back. The journal is
+    reset once a run completes.
+    Returns a summary dict with counts and per-stage timings (seconds).
     """
     supported_extensions = {'.jpg', '.jpeg', '.png', '.webp'}
     source_path = Path(source_dir)
-    
-    for item in source_path.iterdir():
-        if item.is_file() and item.suffix.lower() in supported_extensions:
-            organize_file(item, destination_root)
+    registry = NameRegistry()
+    start = time.perf_counter()
+    summary = {"organized": 0, "failed": 0, "skipped": 0,
+               "timings": {"metadata": 0.0, "plan": 0.0, "move": 0.0, "total": 0.0}}
+    lock = threading.Lock()
+    if journal is not None:
+        summary["recovered"] = journal.recover()
+    move_workers = max(move_workers, 1)
+    serial = move_workers == 1
+    queues = [] if serial else [queue.Queue(maxsize=queue_size) for _ in range(move_workers)]
+    created = set()
+
+    def move(file_path, target_path, created):
+        # Returns True once file_path is at target_path or the next free name
+        while True:
+            intent_id = journal.intend(file_path, target_path) if journal is not None else None
+            try:
+                if target_path.parent not in created:
+                    target_path.parent.mkdir(parents=True, exist_ok=True)
+                    created.add(target_path.parent)
+                ok = transfer_file(file_path, target_path, move=True)
+            except FileExistsError:
+                # Created by someone else since it was planned: next name
+                if journal is not None:
+                    journal.abort(intent_id)
+                registry.taken(target_path)
+                target_path = registry.reserve(target_path.parent, file_path.name)
+                continue
+            except Exception as e:
+                print(f"Error moving file {file_path}: {e}")
+                ok = False
+            break
+        if journal is not None:
+            if ok:
+                journal.complete(intent_id)
+            else:
+                journal.abort(intent_id)
+        if not ok:
+            registry.release(target_path)
+        return ok
+
+    def run_job(file_path, target_path, created):
+        busy_start = time.perf_counter()
+        try:
+            ok = move(file_path, target_path, created)
+        except Exception as e:
+            # e.g. the journal could not be written: fail this file only
+            print(f"Error moving file {file_path}: {e}")
+            ok = False
+        with lock:
+            summary["organized" if ok else "failed"] += 1
+            summary["timings"]["move"] += time.perf_counter() - busy_start
+
+    def mover(jobs):
+        created = set()
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            run_job(*job, created)
+
+    threads = [threading.Thread(target=mover, args=(jobs,), daemon=True) for jobs in queues]
+    for thread in threads:
+        thread.start()
+
+    items = (item for item in source_path.iterdir()
+             if item.is_file() and item.suffix.lower() in supported_extensions)
+    dates = get_image_dates(items, workers=workers, cache=cache, filename_policy=filename_policy)
+    try:
+        while True:
+            wait_start = time.perf_counter()
+            result = next(dates, None)
+            plan_start = time.perf_counter()
+            summary["timings"]["metadata"] += plan_start - wait_start
+            if result is None:
+                break
+            item, date, _ = result
+            if date is None:
+                summary["skipped"] += 1
+                continue
+            target_dir = get_target_dir(destination_root, date)
+            try:
+                target_path = registry.reserve(target_dir, item.name)
+            except Exception as e:
+                # e.g. a file where the day folder should be, or a folder that can't be listed
+                print(f"Error moving file {item}: {e}")
+                with lock:
+                    summary["failed"] += 1
+                continue
+            if serial:
+                summary["timings"]["plan"] += time.perf_counter() - plan_start
+                run_job(item, target_path, created)
+                continue
+            jobs = queues[zlib.crc32(str(target_dir).encode()) % move_workers]
+            jobs.put((item, target_path))  # Blocks when movers fall behind
+            summary["timings"]["plan"] += time.perf_counter() - plan_start
+    finally:
+        for jobs in queues:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
 
+    if journal is not None:
+        journal.reset()
+    summary["timings"]["total"] = time.perf_counter() - start
+    return summary
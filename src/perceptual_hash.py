@@ -0,0 +1,103 @@
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for perceptual hashing (pip install numpy)")
+
+def _load_gray(image_path, width, height):
+    """
+    Decodes an image straight to a small grayscale float array.
+    draft() lets the JPEG decoder downscale while decoding, so large photos
+    never get fully decompressed.
+    """
+    with Image.open(image_path) as img:
+        img.draft("L", (width * 4, height * 4))
+        img = img.convert("L").resize((width, height), Image.Resampling.LANCZOS)
+        return np.asarray(img, dtype=np.float32)
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def dhash(image_path, hash_size=8):
+    """
+    Difference hash: one bit per horizontally adjacent pixel pair of a
+    (hash_size + 1) x hash_size thumbnail. Returns an int of hash_size**2 bits.
+    """
+    _require_numpy()
+    pixels = _load_gray(image_path, hash_size + 1, hash_size)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+def phash(image_path, hash_size=8, highfreq_factor=4):
+    """
+    Perceptual hash: 2D DCT of a (hash_size * highfreq_factor)^2 thumbnail,
+    keeping the low-frequency hash_size x hash_size block thresholded at its
+    median. Returns an int of hash_size**2 bits.
+    """
+    _require_numpy()
+    size = hash_size * highfreq_factor
+    pixels = _load_gray(image_path, size, size)
+    dct = _dct_matrix(size)
+    low = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low > np.median(low))
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+    A radius query only descends into children whose edge distance lies
+    within [d - radius, d + radius], which prunes most of the tree for the
+    small radii used for near-duplicates.
+    """
+    def __init__(self):
+        # Node: [hash, item, {distance: child_node}]
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [hash_value, item, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, item, {}]
+                return
+            node = child
+
+    def search(self, hash_value, max_distance):
+        """
+        Returns (distance, item) pairs within max_distance, nearest first.
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= max_distance:
+                found.append((distance, node[1]))
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def __len__(self):
+        return self.size
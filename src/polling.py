@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import time
+from array import array
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent
+
+# Directory mtimes closer than this to the scan time are not trusted: on
+# coarse-grained filesystems (SMB, FAT: up to 2 s) an entry added in the
+# same tick would not change them
+RACY_WINDOW_NS = 2 * 10**9
+
+class _DirSnapshot:
+    """
+    One directory of a snapshot: its mtime, the sorted file names and the
+    inode/size/mtime of each in parallel arrays, plus the subdirectory names.
+    """
+    __slots__ = ("mtime_ns", "scanned_ns", "names", "inos", "sizes", "mtimes", "subdirs")
+
+    def __init__(self, mtime_ns, scanned_ns):
+        self.mtime_ns = mtime_ns
+        self.scanned_ns = scanned_ns
+        self.names = []
+        self.inos = array("Q")
+        self.sizes = array("q")
+        self.mtimes = array("q")
+        self.subdirs = []
+
+class ScandirPollingObserver:
+    """
+    Polling replacement for watchdog's Observer, for network shares
+    (SMB/NFS) where inotify events never arrive.
+    Each poll compares an os.scandir snapshot with the previous one and
+    dispatches created/modified/deleted/moved events (a file that vanished
+    and reappeared with the same inode is reported as moved). Directories
+    whose mtime did not change since they were last listed are not listed
+    again, so a quiet tree costs one stat per directory; in-place writes to
+    a file are therefore only seen while its directory is being relisted,
+    which is enough for the monitor since its scheduler re-stats pending
+    files itself.
+    The interval drops to min_interval when something changed and grows by
+    backoff after each quiet poll, up to max_interval.
+    Supports the subset of the Observer API the monitor uses.
+    """
+    def __init__(self, min_interval=0.5, max_interval=10.0, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        # (handler, root, recursive, {directory: _DirSnapshot})
+        self._watches = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="scandir-poller", daemon=True)
+
+    def schedule(self, event_handler, path, recursive=False):
+        self._watches.append((event_handler, os.path.abspath(path), recursive, {}))
+
+    def start(self):
+        # The first snapshot is a baseline: files already there are the
+        # backlog's job, not events
+        for _, root, recursive, snapshot in self._watches:
+            self._scan(root, recursive, snapshot, [])
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def poll(self):
+        """
+        Runs one poll over every watch and dispatches the events found.
+        Returns the number of events.
+        """
+        count = 0
+        for handler, root, recursive, snapshot in self._watches:
+            events = []
+            self._scan(root, recursive, snapshot, events)
+            for event in self._pair_moves(events):
+                try:
+                    handler.dispatch(event)
+                except Exception as e:
+                    logging.error(f"Error dispatching {event}: {e}")
+                count += 1
+        return count
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                changed = self.poll()
+            except Exception as e:
+                logging.error(f"Polling failed: {e}")
+                changed = 0
+            self._adapt(changed)
+
+    def _adapt(self, changed):
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def _scan(self, root, recursive, snapshot, events):
+        """
+        Refreshes snapshot from disk, appending (kind, path, ino) tuples for
+        every difference to events.
+        """
+        seen = set()
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            old = snapshot.get(directory)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue  # Removed: reported below with everything under it
+            now_ns = time.time_ns()
+            if old is not None and old.mtime_ns == mtime_ns and old.scanned_ns - mtime_ns > RACY_WINDOW_NS:
+                current = old  # Unchanged: no entries added, removed or renamed
+                seen.add(directory)
+            else:
+                current = self._list(directory, mtime_ns, now_ns)
+                if current is None:
+                    continue
+                seen.add(directory)
+                if old is not None:
+                    self._diff(directory, old, current, events)
+                elif snapshot:
+                    # New directory in a known tree: everything in it is new
+                    for name, ino in zip(current.names, current.inos):
+                        events.append(("created", os.path.join(directory, name), ino))
+                snapshot[directory] = current
+            if recursive:
+                stack.extend(os.path.join(directory, name) for name in current.subdirs)
+
+        for directory in [d for d in snapshot if d not in seen]:
+            gone = snapshot.pop(directory)
+            for name, ino in zip(gone.names, gone.inos):
+                events.append(("deleted", os.path.join(directory, name), ino))
+
+    @staticmethod
+    def _list(directory, mtime_ns, now_ns):
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            entries.append((entry.name, st.st_ino, st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue  # Vanished between listing and stat
+        except OSError:
+            return None
+        entries.sort()
+        current = _DirSnapshot(mtime_ns, now_ns)
+        for name, ino, size, mtime in entries:
+            current.names.append(name)
+            current.inos.append(ino)
+            current.sizes.append(size)
+            current.mtimes.append(mtime)
+        current.subdirs = sorted(subdirs)
+        return current
+
+    @staticmethod
+    def _diff(directory, old, new, events):
+        """
+        Merges the two sorted name lists.
+        """
+        i = j = 0
+        while i < len(old.names) or j < len(new.names):
+            if j == len(new.names) or (i < len(old.names) and old.names[i] < new.names[j]):
+                events.append(("deleted", os.path.join(directory, old.names[i]), old.inos[i]))
+                i += 1
+            elif i == len(old.names) or new.names[j] < old.names[i]:
+                events.append(("created", os.path.join(directory, new.names[j]), new.inos[j]))
+                j += 1
+            else:
+                path = os.path.join(directory, new.names[j])
+                if old.inos[i] != new.inos[j]:
+                    # Replaced by another file under the same name
+                    events.append(("deleted", path, old.inos[i]))
+                    events.append(("created", path, new.inos[j]))
+                elif old.sizes[i] != new.sizes[j] or old.mtimes[i] != new.mtimes[j]:
+                    events.append(("modified", path, new.inos[j]))
+                i += 1
+                j += 1
+
+    @staticmethod
+    def _pair_moves(events):
+        """
+        Turns (deleted, created) pairs with the same inode into moved events
+        and builds the watchdog event objects.
+        """
+        # Some network filesystems report no inode numbers (0): never pair those
+        deleted = {ino: path for kind, path, ino in events if kind == "deleted" and ino}
+        moved_from = set()
+        result = []
+        for kind, path, ino in events:
+            if kind == "created" and ino in deleted and deleted[ino] != path:
+                result.append(FileMovedEvent(deleted[ino], path))
+                moved_from.add(deleted[ino])
+            elif kind == "created":
+                result.append(FileCreatedEvent(path))
+            elif kind == "modified":
+                result.append(FileModifiedEvent(path))
+        for kind, path, ino in events:
+            if kind == "deleted" and path not in moved_from:
+                result.append(FileDeletedEvent(path))
+        return result
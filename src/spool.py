@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+class SpoolQueue:
+    """
+    FIFO queue of paths holding at most max_memory items in memory.
+    With a spool_path, items beyond that are appended to an on-disk spool
+    (JSON lines) and read back in order as the memory part drains, so a
+    burst of any size costs a bounded amount of RAM; without one, put()
+    blocks until there is room (backpressure).
+    The spool survives restarts: close() writes whatever is still queued to
+    it and the next SpoolQueue on the same path starts with those items.
+    After a crash, spilled items are replayed from the start of the spool;
+    consumers must treat already-processed paths as no-ops.
+    """
+    def __init__(self, spool_path=None, max_memory=10000):
+        self.spool_path = str(spool_path) if spool_path else None
+        self.max_memory = max(max_memory, 1)
+        self._cond = threading.Condition()
+        # (path, enqueue wall time) in FIFO order; always older than the spool
+        self._memory = deque()
+        self._spooled = 0
+        self._read_offset = 0
+        self._closed = False
+        self._spool = None
+        if self.spool_path:
+            self._spool = open(self.spool_path, "a+b")
+            self._spool.seek(0)
+            end = size = 0
+            for chunk in iter(lambda: self._spool.read(1024 * 1024), b""):
+                self._spooled += chunk.count(b"\n")
+                last = chunk.rfind(b"\n")
+                if last >= 0:
+                    end = size + last + 1
+                size += len(chunk)
+            if end < size:
+                self._spool.truncate(end)  # Torn last line from a crash
+            self._refill()
+
+    def put(self, path, enqueued=None):
+        """
+        Queues path. enqueued is the wall time its wait is counted from
+        (default: now), e.g. when the file was first seen. Returns False if
+        the queue was closed meanwhile.
+        """
+        record = (os.fspath(path), enqueued if enqueued is not None else time.time())
+        with self._cond:
+            if self._spool is None:
+                while len(self._memory) >= self.max_memory and not self._closed:
+                    self._cond.wait()
+            if self._closed:
+                return False
+            if self._spool is not None and (self._spooled or len(self._memory) >= self.max_memory):
+                self._spool.write(self._encode(record))
+                self._spool.flush()
+                self._spooled += 1
+            else:
+                self._memory.append(record)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Returns the oldest path, waiting up to timeout seconds for one.
+        Returns None on timeout or once the queue is closed.
+        """
+        item = self.get_item(timeout)
+        return item[0] if item is not None else None
+
+    def get_item(self, timeout=None):
+        """
+        Same as get, but returns (path, enqueued wall time).
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._memory and not self._closed:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._closed:
+                return None
+            item = self._memory.popleft()
+            if not self._memory:
+                self._refill()
+            self._cond.notify_all()
+            return item
+
+    def depth(self):
+        """
+        Returns the number of queued items, in memory and spooled.
+        """
+        with self._cond:
+            return len(self._memory) + self._spooled
+
+    def oldest_age(self):
+        """
+        Returns how many seconds the oldest queued item has been waiting,
+        or None when the queue is empty.
+        """
+        with self._cond:
+            if not self._memory:
+                return None
+            return max(time.time() - self._memory[0][1], 0.0)
+
+    def close(self):
+        """
+        Stops the queue, waking blocked callers. Items still queued are
+        written to the spool, replacing what was already read from it.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            if self._spool is None:
+                return
+            self._spool.seek(self._read_offset)
+            remaining = self._spool.read()
+            self._spool.close()
+            tmp_path = self.spool_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for record in self._memory:
+                    f.write(self._encode(record))
+                f.write(remaining)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.spool_path)
+            self._memory.clear()
+            self._spooled = 0
+
+    def _refill(self):
+        """
+        Moves up to max_memory items from the spool into memory. Once the
+        spool has been read to the end it is truncated.
+        """
+        if not self._spooled:
+            return
+        self._spool.seek(self._read_offset)
+        while self._spooled and len(self._memory) < self.max_memory:
+            line = self._spool.readline()
+            self._spooled -= 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self._memory.append((record["path"], record["t"]))
+        self._read_offset = self._spool.tell()
+        if not self._spooled:
+            self._spool.seek(0)
+            self._spool.truncate()
+            self._read_offset = 0
+        self._spool.seek(0, os.SEEK_END)
+
+    @staticmethod
+    def _encode(record):
+        return (json.dumps({"path": record[0], "t": record[1]}) + "\n").encode("utf-8")
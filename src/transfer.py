@@ -0,0 +1,160 @@
+import errno
+import hashlib
+import os
+import shutil
+from src.deduplicator import DEFAULT_ALGORITHM
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# errnos meaning "this kernel copy call is not available here", not a real I/O error
+_KERNEL_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                            errno.ENOTSUP, errno.EBADF, errno.ETXTBSY}
+
+# errnos of os.link meaning "no hardlinks here" (FAT, some network shares...)
+_LINK_UNSUPPORTED = {errno.EPERM, errno.EACCES, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                     errno.ENOTSUP, errno.EMLINK}
+
+def move_file(src, dst, verify=True, algorithm=DEFAULT_ALGORITHM, expected=None):
+    """
+    Moves src to dst, never replacing a file that already exists at dst
+    (FileExistsError is raised instead, with src untouched): names picked
+    ahead of time can be taken by other programs meanwhile.
+    On the same filesystem dst is created as a hardlink and src unlinked,
+    since a rename would silently replace an existing dst; where hardlinks
+    are not supported, dst is claimed with an exclusive create and src
+    renamed over that placeholder.
+    Across filesystems the data is copied (see copy_file; with verify the
+    copy is fsynced, and checked against expected when it is given) and src
+    is only unlinked once the copy is complete; if src cannot be unlinked,
+    the copy is removed again and the error raised, so there is never a
+    second full copy under a name the caller considers free. Returns the
+    digest of the data when it was hashed, else None.
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno in _LINK_UNSUPPORTED:
+            _claim_and_rename(src, dst)
+            return None
+        if e.errno != errno.EXDEV:
+            raise
+    else:
+        try:
+            os.unlink(src)
+        except OSError:
+            _remove_quietly(dst)
+            raise
+        return None
+    digest = copy_file(src, dst, verify=verify, algorithm=algorithm, expected=expected)
+    try:
+        os.unlink(src)
+    except OSError:
+        _remove_quietly(dst)
+        raise
+    return digest
+
+def _claim_and_rename(src, dst):
+    fd = os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    os.close(fd)
+    try:
+        os.replace(src, dst)
+    except BaseException:
+        _remove_quietly(dst)
+        raise
+
+def _remove_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def copy_file(src, dst, verify=False, algorithm=DEFAULT_ALGORITHM, expected=None):
+    """
+    Copies src to dst with its metadata (like shutil.copy2). dst is created
+    exclusively: an existing file raises FileExistsError and is left alone.
+    The kernel does the copy where it can (copy_file_range, then sendfile),
+    so the data never passes through Python.
+    With verify=True dst is fsynced, and when expected (the digest of src
+    from an earlier read, e.g. the dedup hash) is given, the data is hashed
+    as it is copied, in a single read pass, and must match it, which
+    catches a source that changed or was misread since; otherwise dst is
+    deleted and OSError raised. Without a digest to compare against there
+    is nothing to hash for, unless the kernel copy is unavailable and the
+    data goes through Python anyway. dst is not read back: right after
+    writing, that read would come from the page cache and prove little.
+    Returns the digest when the data was hashed, else None.
+    """
+    digest = None
+    with open(src, "rb") as fsrc:
+        fdst = open(dst, "xb")
+        try:
+            with fdst:
+                if verify and expected is not None:
+                    digest = _hashing_copy(fsrc, fdst, algorithm)
+                elif not _kernel_copy(fsrc, fdst):
+                    if verify:
+                        digest = _hashing_copy(fsrc, fdst, algorithm)
+                    else:
+                        shutil.copyfileobj(fsrc, fdst, COPY_BLOCK_SIZE)
+                if verify:
+                    fdst.flush()
+                    os.fsync(fdst.fileno())
+            if verify and expected is not None and digest != expected:
+                raise OSError(errno.EIO, f"Checksum mismatch copying {src} to {dst}")
+            shutil.copystat(src, dst)
+        except BaseException:
+            _remove_quietly(dst)
+            raise
+    return digest
+
+def _hashing_copy(fsrc, fdst, algorithm):
+    """
+    Copies fsrc to fdst through one reusable buffer, hashing every block on
+    its way through. Returns the hex digest.
+    """
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(COPY_BLOCK_SIZE)
+    view = memoryview(buffer)
+    while True:
+        n = fsrc.readinto(buffer)
+        if not n:
+            break
+        digest.update(view[:n])
+        fdst.write(view[:n])
+    return digest.hexdigest()
+
+def _kernel_copy(fsrc, fdst):
+    """
+    Copies fsrc to fdst inside the kernel. Returns False (with nothing
+    written) when neither copy_file_range nor sendfile works for this pair
+    of files, so the caller can fall back to a Python-level copy.
+    """
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    size = os.fstat(infd).st_size
+    for method in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if method is None:
+            continue
+        offset = 0
+        try:
+            while offset < size:
+                if method is os.sendfile:
+                    sent = method(outfd, infd, offset, min(size - offset, 2 ** 30))
+                else:
+                    sent = method(infd, outfd, min(size - offset, 2 ** 30), offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError as e:
+            if offset == 0 and e.errno in _KERNEL_COPY_UNSUPPORTED:
+                continue
+            raise
+        if offset < size and offset == 0:
+            continue  # e.g. special files reporting size but yielding nothing
+        # Files growing during the copy get their tail copied the slow way
+        fsrc.seek(offset)
+        fdst.seek(offset)
+        shutil.copyfileobj(fsrc, fdst, COPY_BLOCK_SIZE)
+        return True
+    return False
@@ -0,0 +1,165 @@
+import unittest
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from src.debounce import DebounceScheduler
+
+class TestDebounceScheduler(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_debounce_data")
+        self.test_dir.mkdir(exist_ok=True)
+        self.processed = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def record(self, path):
+        with self.lock:
+            self.processed.append((path, os.path.getsize(path), time.monotonic()))
+
+    def test_waits_until_file_is_stable(self):
+        scheduler = DebounceScheduler(self.record, settle_interval=0.2)
+        path = self.test_dir / "growing.jpg"
+        with open(path, "wb") as f:
+            scheduler.submit(path)
+            for _ in range(5):
+                f.write(b"x" * 1000)
+                f.flush()
+                time.sleep(0.1)
+        last_write = time.monotonic()
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.close()
+
+        self.assertEqual(len(self.processed), 1)
+        _, size, when = self.processed[0]
+        self.assertEqual(size, 5000)
+        self.assertGreaterEqual(when, last_write)
+
+    def test_vanished_files_are_dropped(self):
+        scheduler = DebounceScheduler(self.record, settle_interval=0.1)
+        path = self.test_dir / "temp.jpg"
+        path.write_bytes(b"x")
+        scheduler.submit(path)
+        path.unlink()
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.close()
+        self.assertEqual(self.processed, [])
+
+    def test_files_are_processed_concurrently(self):
+        started = threading.Barrier(4, timeout=5)
+
+        def slow(path):
+            started.wait()  # Only passes if 4 callbacks run at the same time
+            self.record(path)
+
+        scheduler = DebounceScheduler(slow, workers=4, settle_interval=0.05)
+        for i in range(4):
+            path = self.test_dir / f"f{i}.jpg"
+            path.write_bytes(b"x")
+            scheduler.submit(path)
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.close()
+        self.assertEqual(len(self.processed), 4)
+
+    def test_repeated_events_coalesce(self):
+        scheduler = DebounceScheduler(self.record, settle_interval=0.1)
+        path = self.test_dir / "noisy.jpg"
+        path.write_bytes(b"x")
+        for _ in range(100):
+            scheduler.submit(path)
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.close()
+        self.assertEqual(len(self.processed), 1)
+
+    def test_event_while_processing_gets_one_more_look(self):
+        moved = self.test_dir / "moved.jpg"
+
+        def process(path):
+            scheduler.submit(path)  # e.g. a late modify event
+            scheduler.submit(path)
+            self.record(path)
+            if len(self.processed) == 2:
+                os.rename(path, moved)
+
+        scheduler = DebounceScheduler(process, settle_interval=0.05)
+        path = self.test_dir / "busy.jpg"
+        path.write_bytes(b"x")
+        scheduler.submit(path)
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.close()
+        # Still there after the first run, so looked at once more; then gone
+        self.assertEqual(len(self.processed), 2)
+
+    def test_queued_files_survive_restart_through_spool(self):
+        spool = self.test_dir / "queue.spool"
+        gate = threading.Event()
+
+        def blocked(path):
+            gate.wait(5)
+            self.record(path)
+
+        scheduler = DebounceScheduler(blocked, workers=1, settle_interval=0.01,
+                                      spool_path=spool, max_queued=2)
+        for i in range(10):
+            path = self.test_dir / f"f{i}.jpg"
+            path.write_bytes(b"x")
+            scheduler.submit(path)
+        deadline = time.monotonic() + 5
+        while scheduler.stats()["queued"] != 9 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = scheduler.stats()
+        self.assertEqual((stats["queued"], stats["running"]), (9, 1))
+        self.assertIsNotNone(stats["oldest_queued_age"])
+        gate.set()
+        scheduler.close()
+        first_run = len(self.processed)
+
+        scheduler = DebounceScheduler(self.record, spool_path=spool)
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.close()
+        names = sorted(os.path.basename(p) for p, _, _ in self.processed)
+        self.assertEqual(names, sorted(f"f{i}.jpg" for i in range(10)))
+        self.assertGreaterEqual(first_run, 1)
+
+    def test_per_key_quota_keeps_other_keys_moving(self):
+        active = {}
+        peak = {}
+        order = []
+
+        def work(path):
+            name = os.path.basename(path)[0]
+            with self.lock:
+                active[name] = active.get(name, 0) + 1
+                peak[name] = max(peak.get(name, 0), active[name])
+            time.sleep(0.05)
+            with self.lock:
+                active[name] -= 1
+                order.append(os.path.basename(path))
+
+        scheduler = DebounceScheduler(work, workers=3, settle_interval=0.01,
+                                      key=lambda path: os.path.basename(path)[0], quotas={"a": 1})
+        for i in range(6):
+            path = self.test_dir / f"a{i}.jpg"
+            path.write_bytes(b"x")
+            scheduler.submit(path)
+        time.sleep(0.1)
+        late = self.test_dir / "b0.jpg"
+        late.write_bytes(b"x")
+        scheduler.submit(late)
+        self.assertTrue(scheduler.drain(timeout=5))
+        stats = scheduler.key_stats()
+        scheduler.close()
+
+        self.assertEqual(len(order), 7)
+        self.assertEqual(peak["a"], 1)
+        # The busy key's backlog did not hold the other one up
+        self.assertLess(order.index("b0.jpg"), 6)
+        self.assertEqual(stats["a"], {"queued": 0, "running": 0, "quota": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,13 @@ import os
 import shutil
 import hashlib
 from pathlib import Path
-from src.deduplicator import Deduplicator, get_file_hash
+from unittest import mock
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.deduplicator import (Deduplicator, get_file_hash, get_content_hash, restore_from_manifest,
+                              PARTIAL_HASH_SIZE)
+from src.hash_index import HashIndex
+from PIL import Image, PngImagePlugin
 
 class TestDeduplicator(unittest.TestCase):
     def setUp(self):
@@ -34,6 +40,20 @@ class TestDeduplicator(unittest.TestCase):
         expected_hash = hashlib.md5(content).hexdigest()
         self.assertEqual(get_file_hash(p), expected_hash)
 
+    def test_hash_algorithms_and_mmap(self):
+        content = os.urandom(200000)
+        p = self.create_file("big.bin", content)
+        for algorithm in ("md5", "sha256", "blake2b"):
+            expected = hashlib.new(algorithm, content).hexdigest()
+            self.assertEqual(get_file_hash(p, algorithm=algorithm), expected)
+            self.assertEqual(get_file_hash(p, block_size=4096, algorithm=algorithm, use_mmap=True), expected)
+        empty = self.create_file("empty.bin", b"")
+        self.assertEqual(get_file_hash(empty, use_mmap=True), hashlib.md5(b"").hexdigest())
+
+    def test_unknown_algorithm_rejected(self):
+        with self.assertRaises(ValueError):
+            Deduplicator(quarantine_dir=str(self.quarantine_dir), algorithm="nope")
+
     def test_duplicate_detection(self):
         content = b"duplicate content"
         
@@ -54,6 +74,18 @@ class TestDeduplicator(unittest.TestCase):
         self.assertEqual(len(quarantined_files), 1)
         self.assertEqual(quarantined_files[0].name, "file2.txt")
 
+    def test_shared_quarantine_is_never_overwritten(self):
+        f1 = self.create_file("file1.txt", b"same")
+        self.assertEqual(self.deduplicator.process_file(f1), "unique")
+        self.quarantine_dir.mkdir()  # Listed by the registry on first use
+        self.deduplicator.process_file(self.create_file("file2.txt", b"same"))
+        # Another deduplicator sharing the quarantine takes the next name
+        (self.quarantine_dir / "file2_1.txt").write_bytes(b"OTHER")
+
+        self.deduplicator.process_file(self.create_file("file2.txt", b"same"))
+        self.assertEqual((self.quarantine_dir / "file2_1.txt").read_bytes(), b"OTHER")
+        self.assertEqual((self.quarantine_dir / "file2_2.txt").read_bytes(), b"same")
+
     def test_unique_files(self):
         f1 = self.create_file("a.txt", b"content A")
         f2 = self.create_file("b.txt", b"content B")
@@ -63,5 +95,264 @@ class TestDeduplicator(unittest.TestCase):
         
         self.assertEqual(len(list(self.quarantine_dir.glob("*"))), 0)
 
+    def test_scan_directory_stage_counts(self):
+        block = PARTIAL_HASH_SIZE
+        self.create_file("small.bin", b"x" * 10)                   # unique size
+        self.create_file("a.bin", b"a" * block * 3)                # same size as b, c, d
+        self.create_file("b.bin", b"b" * block * 3)                # differs at the head
+        self.create_file("c.bin", b"a" * block + b"c" * block + b"a" * block)  # differs in the middle only
+        self.create_file("d.bin", b"a" * block * 3)                # true duplicate of a
+
+        results = self.deduplicator.scan_directory(self.test_dir)
+
+        self.assertEqual(results["unique"], 4)
+        self.assertEqual(results["duplicate"], 1)
+        self.assertEqual(results["eliminated"], {"index": 0, "size": 2, "partial": 1, "full": 1})
+
+    def test_unique_size_is_not_read(self):
+        f1 = self.create_file("a.txt", b"content A")
+        self.assertEqual(self.deduplicator.process_file(f1), "unique")
+        # No hash computed while the size bucket has a single member
+        self.assertEqual(self.deduplicator._entries[os.path.abspath(f1)]["partial"], None)
+
+    def test_relocated_file_still_detects_duplicates(self):
+        f1 = self.create_file("a.txt", b"same content")
+        self.assertEqual(self.deduplicator.process_file(f1), "unique")
+
+        moved = self.test_dir / "moved.txt"
+        f1.rename(moved)
+        self.deduplicator.relocate(f1, moved)
+
+        f2 = self.create_file("b.txt", b"same content")
+        self.assertEqual(self.deduplicator.process_file(f2), "duplicate")
+
+    def test_concurrent_process_file(self):
+        block = PARTIAL_HASH_SIZE
+        paths = [self.create_file(f"{kind}_{i}.bin", kind.encode() * block * 3)
+                 for i in range(8) for kind in ("a", "b", "c")]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(executor.map(self.deduplicator.process_file, paths))
+        # Exactly one survivor per content, whatever the interleaving
+        self.assertEqual(statuses.count("unique"), 3)
+        self.assertEqual(statuses.count("duplicate"), 21)
+        survivors = sorted(p.name[0] for p in self.test_dir.iterdir())
+        self.assertEqual(survivors, ["a", "b", "c"])
+
+    def test_canonical_being_moved_is_not_forgotten(self):
+        index = HashIndex(self.test_dir / "index.db")
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), index=index)
+        content = b"x" * PARTIAL_HASH_SIZE * 3
+        canonical = self.create_file("canonical.bin", content)
+        self.assertEqual(dedup.process_file(canonical), "unique")
+        organized = self.test_dir / "organized"
+        organized.mkdir()
+        moved_to = organized / "canonical.bin"
+
+        # Worker 1 moves the canonical (like the monitor's organize step)
+        # while worker 2 checks a duplicate of it
+        statuses = []
+        with dedup.moving(canonical):
+            os.rename(canonical, moved_to)
+            checker = threading.Thread(
+                target=lambda: statuses.append(dedup.process_file(self.create_file("copy.bin", content))))
+            checker.start()
+            checker.join(0.3)
+            self.assertTrue(checker.is_alive())  # Waiting for the move, not forgetting
+            dedup.relocate(canonical, moved_to)
+        checker.join(5)
+
+        self.assertEqual(statuses, ["duplicate"])
+        self.assertEqual([row[0] for row in index.load(dedup._index_tag)], [os.path.abspath(moved_to)])
+        index.close()
+
+    def create_mixed_tree(self):
+        block = PARTIAL_HASH_SIZE
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        self.create_file("a.bin", b"a" * block * 3)
+        self.create_file("b.bin", b"b" * block * 3)
+        self.create_file("sub/a_copy.bin", b"a" * block * 3)
+        self.create_file("c.bin", b"a" * block + b"c" * block + b"a" * block)
+        self.create_file("small.txt", b"tiny")
+        self.create_file("sub/small_copy.txt", b"tiny")
+
+    def test_parallel_scan_matches_serial(self):
+        self.create_mixed_tree()
+        walk_order = self.deduplicator._collect_files(self.test_dir)
+        serial = Deduplicator(quarantine_dir=str(self.quarantine_dir)).scan_directory(self.test_dir)
+
+        # Restore the tree and scan again with a thread pool
+        shutil.rmtree(self.quarantine_dir)
+        shutil.rmtree(self.test_dir)
+        self.test_dir.mkdir()
+        self.create_mixed_tree()
+        parallel = self.deduplicator.scan_directory(self.test_dir, workers=4)
+
+        for key in ("unique", "duplicate", "eliminated"):
+            self.assertEqual(serial[key], parallel[key])
+        self.assertEqual(parallel["duplicate"], 2)
+
+        # The first file in walk order of each duplicate pair is kept
+        names = [p.name for p in walk_order]
+        kept_big = min(("a.bin", "a_copy.bin"), key=names.index)
+        kept_small = min(("small.txt", "small_copy.txt"), key=names.index)
+        remaining = {p.name for p in self.test_dir.rglob("*") if p.is_file()}
+        self.assertIn(kept_big, remaining)
+        self.assertIn(kept_small, remaining)
+        self.assertIn("files_per_s", parallel["throughput"])
+        self.assertGreater(parallel["throughput"]["mb_per_s"], 0)
+
+    def test_quarantine_move_is_checked_against_full_hash(self):
+        content = b"x" * PARTIAL_HASH_SIZE * 3
+        self.deduplicator.process_file(self.create_file("a.bin", content))
+        copy = self.create_file("b.bin", content)
+        with mock.patch("src.transfer.move_file") as move:
+            self.assertEqual(self.deduplicator.process_file(copy), "duplicate")
+        self.assertEqual(move.call_args.kwargs["expected"], hashlib.md5(content).hexdigest())
+
+    def test_parallel_rescan_reuses_indexed_hashes(self):
+        self.quarantine_dir.mkdir()
+        index = HashIndex(self.quarantine_dir / "index.db")
+        # Same size and same head/tail, so the cascade needs their full hashes
+        head = b"h" * PARTIAL_HASH_SIZE
+        for name, middle in (("a.bin", b"a"), ("b.bin", b"b")):
+            self.create_file(name, head + middle * PARTIAL_HASH_SIZE + head)
+        Deduplicator(quarantine_dir=str(self.quarantine_dir), index=index).scan_directory(
+            self.test_dir, workers=2)
+
+        self.create_file("c.bin", head + b"c" * PARTIAL_HASH_SIZE + head)
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), index=index)
+        hashed = []
+        run_jobs = dedup._run_hash_jobs
+        def recording(executor, kind, jobs, use_processes):
+            hashed.extend((kind, Path(path).name) for path, _ in jobs)
+            return run_jobs(executor, kind, jobs, use_processes)
+        with mock.patch.object(dedup, "_run_hash_jobs", side_effect=recording):
+            results = dedup.scan_directory(self.test_dir, workers=2)
+        self.assertEqual(results["unique"], 3)
+        self.assertEqual(sorted(hashed), [("full", "c.bin"), ("partial", "c.bin")])
+        index.close()
+
+    def test_scan_skips_nested_quarantine(self):
+        dedup = Deduplicator(quarantine_dir=str(self.test_dir / "Quarantine"))
+        self.create_file("a.txt", b"same")
+        self.create_file("b.txt", b"same")
+        self.assertEqual(dedup.scan_directory(self.test_dir)["duplicate"], 1)
+        # A second scan must not look inside the quarantine it just filled
+        results = dedup.scan_directory(self.test_dir)
+        self.assertEqual(results["duplicate"], 0)
+        self.assertEqual(results["unique"], 1)
+
+    def test_parallel_scan_with_processes(self):
+        self.create_mixed_tree()
+        results = self.deduplicator.scan_directory(self.test_dir, workers=2, use_processes=True)
+        self.assertEqual(results["unique"], 4)
+        self.assertEqual(results["duplicate"], 2)
+
+    def create_tagged_jpegs(self):
+        img = Image.new('RGB', (64, 48), color=(10, 120, 200))
+        plain = self.test_dir / "plain.jpg"
+        img.save(plain)
+        exif = Image.Exif()
+        exif[306] = "2023:05:14 10:12:33"
+        tagged = self.test_dir / "tagged.jpg"
+        img.save(tagged, exif=exif)
+        # A tagging tool adding a COM segment right after SOI
+        data = plain.read_bytes()
+        comment = b"edited by a tagging tool"
+        commented = self.create_file("commented.jpg",
+            data[:2] + b"\xff\xfe" + (len(comment) + 2).to_bytes(2, "big") + comment + data[2:])
+        return plain, tagged, commented
+
+    def test_content_hash_ignores_jpeg_metadata(self):
+        plain, tagged, commented = self.create_tagged_jpegs()
+        self.assertNotEqual(get_file_hash(plain), get_file_hash(tagged))
+        self.assertEqual(get_content_hash(plain), get_content_hash(tagged))
+        self.assertEqual(get_content_hash(plain), get_content_hash(commented))
+
+    def test_content_hash_ignores_png_text_chunks(self):
+        img = Image.new('RGB', (32, 32), color=(200, 10, 10))
+        plain = self.test_dir / "plain.png"
+        img.save(plain)
+        info = PngImagePlugin.PngInfo()
+        info.add_text("Comment", "tagged")
+        tagged = self.test_dir / "tagged.png"
+        img.save(tagged, pnginfo=info)
+        self.assertNotEqual(get_file_hash(plain), get_file_hash(tagged))
+        self.assertEqual(get_content_hash(plain), get_content_hash(tagged))
+        other = self.test_dir / "other.png"
+        Image.new('RGB', (32, 32), color=(0, 0, 0)).save(other)
+        self.assertNotEqual(get_content_hash(plain), get_content_hash(other))
+
+    def test_content_key_deduplicates_retagged_images(self):
+        self.create_tagged_jpegs()
+        self.create_file("notes.txt", b"not an image")
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), key="content")
+        results = dedup.scan_directory(self.test_dir, workers=2)
+        self.assertEqual(results["unique"], 2)
+        self.assertEqual(results["duplicate"], 2)
+        self.assertEqual(set(results["eliminated"]), {"index", "content"})
+
+    def test_hardlink_action_and_restore(self):
+        manifest = self.test_dir / "manifest.jsonl"
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), action="hardlink",
+                             manifest_path=manifest)
+        content = b"x" * PARTIAL_HASH_SIZE * 3
+        f1 = self.create_file("a.bin", content)
+        self.assertEqual(dedup.process_file(f1), "unique")
+        f2 = self.create_file("b.bin", content)
+        self.assertEqual(dedup.process_file(f2), "duplicate")
+
+        # Duplicate stays in place, sharing the canonical inode
+        self.assertTrue(f2.exists())
+        self.assertEqual(f1.stat().st_ino, f2.stat().st_ino)
+        self.assertFalse(self.quarantine_dir.exists())
+        self.assertEqual(dedup._reclaimed_bytes, len(content))
+        # The link is known from now on: processing it again reads nothing
+        with mock.patch("src.deduplicator.get_partial_hash") as partial, \
+             mock.patch("src.deduplicator.get_file_hash") as full:
+            results = dedup.scan_directory(self.test_dir)
+        self.assertEqual(results["duplicate"], 0)
+        self.assertEqual(results["eliminated"]["index"], 2)
+        partial.assert_not_called()
+        full.assert_not_called()
+        self.assertEqual(len(manifest.read_text().splitlines()), 1)
+
+        self.assertEqual(restore_from_manifest(manifest), 1)
+        self.assertNotEqual(f1.stat().st_ino, f2.stat().st_ino)
+        self.assertEqual(f2.read_bytes(), content)
+
+    def test_restore_refuses_a_changed_canonical(self):
+        manifest = self.quarantine_dir / "manifest.jsonl"
+        self.quarantine_dir.mkdir()
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), action="reflink",
+                             manifest_path=manifest)
+        f1 = self.create_file("a.bin", b"same")
+        f2 = self.create_file("b.bin", b"same")
+        dedup.process_file(f1)
+        # A plain copy stands in for a reflink, which shares nothing visible
+        with mock.patch("src.deduplicator.reflink_file", side_effect=shutil.copyfile):
+            self.assertEqual(dedup.process_file(f2), "duplicate")
+        # The kept file is then edited in place
+        self.create_file("a.bin", b"diff")
+
+        with self.assertRaises(ValueError):
+            restore_from_manifest(manifest)
+        self.assertEqual(f2.read_bytes(), b"same")
+        self.assertEqual(sorted(p.name for p in self.test_dir.iterdir()), ["a.bin", "b.bin"])
+
+    def test_reflink_falls_back_to_quarantine(self):
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), action="reflink")
+        f1 = self.create_file("a.bin", b"same")
+        f2 = self.create_file("b.bin", b"same")
+        dedup.process_file(f1)
+        with mock.patch("src.deduplicator.reflink_file", side_effect=OSError("unsupported")):
+            self.assertEqual(dedup.process_file(f2), "duplicate")
+        self.assertFalse(f2.exists())
+        self.assertEqual([p.name for p in self.quarantine_dir.glob("*")], ["b.bin"])
+
+    def test_link_actions_require_byte_key(self):
+        with self.assertRaises(ValueError):
+            Deduplicator(quarantine_dir=str(self.quarantine_dir), key="content", action="hardlink")
+
 if __name__ == '__main__':
     unittest.main()
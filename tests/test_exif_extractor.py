@@ -3,7 +3,9 @@ import unittest
 import os
 from datetime import datetime
 from PIL import Image
-from src.exif_extractor import get_image_date
+from src.exif_extractor import get_image_date, get_image_dates, get_image_date_with_source, date_from_filename, parse_exif_dates, _read_exif_dates_pillow, HEADER_READ_SIZE
+from unittest import mock
+import struct
 import time
 
 class TestExifExtractor(unittest.TestCase):
@@ -31,5 +33,128 @@ class TestExifExtractor(unittest.TestCase):
         # Allow small difference due to processing execution time (e.g. 1 second)
         self.assertAlmostEqual(extracted_date.timestamp(), file_time.timestamp(), delta=1.0)
 
+    def save_with_exif(self, name, ifd0=None, exif_ifd=None, fmt=None):
+        path = os.path.join(self.test_dir, name)
+        exif = Image.Exif()
+        for tag, value in (ifd0 or {}).items():
+            exif[tag] = value
+        if exif_ifd:
+            sub = exif.get_ifd(0x8769)
+            for tag, value in exif_ifd.items():
+                sub[tag] = value
+        Image.new('RGB', (50, 50)).save(path, format=fmt, exif=exif)
+        return path
+
+    def test_date_time_original_in_exif_ifd(self):
+        path = self.save_with_exif("camera.jpg", ifd0={306: "2021:01:01 00:00:00"},
+                                   exif_ifd={36867: "2020:05:14 10:12:33"})
+        self.assertEqual(get_image_date(path), datetime(2020, 5, 14, 10, 12, 33))
+
+    def test_date_time_fallback(self):
+        path = self.save_with_exif("edited.jpg", ifd0={306: "2019:12:31 23:59:59"})
+        self.assertEqual(get_image_date(path), datetime(2019, 12, 31, 23, 59, 59))
+
+    def test_fast_path_matches_pillow(self):
+        cases = [
+            self.save_with_exif("both.jpg", ifd0={306: "2021:01:01 00:00:00"},
+                                exif_ifd={36867: "2020:05:14 10:12:33"}),
+            self.save_with_exif("ifd0_original.jpg", ifd0={36867: "2018:02:03 04:05:06"}),
+            self.save_with_exif("datetime_only.jpg", ifd0={306: "2019:12:31 23:59:59"}),
+            self.save_with_exif("bad_value.jpg", ifd0={306: "not a date"}),
+            self.save_with_exif("empty.jpg"),
+            self.save_with_exif("tiff.tif", ifd0={306: "2017:07:07 07:07:07"}, fmt="TIFF"),
+        ]
+        for path in cases:
+            with open(path, 'rb') as f:
+                fast = parse_exif_dates(f.read(HEADER_READ_SIZE))
+            self.assertIsNotNone(fast, path)
+            slow = _read_exif_dates_pillow(path)
+            for tag in (36867, 306):
+                self.assertEqual(fast.get(tag) or None, slow.get(tag) or None, path)
+
+    def test_big_endian_tiff_header(self):
+        value = b"2016:06:06 06:06:06\x00"
+        ifd = struct.pack(">H", 1) + struct.pack(">HHII", 306, 2, len(value), 26) + b"\x00" * 4
+        tiff = b"MM\x00*" + struct.pack(">I", 8) + ifd + value
+        self.assertEqual(parse_exif_dates(tiff), {306: "2016:06:06 06:06:06"})
+
+    def test_unknown_format_uses_pillow(self):
+        path = os.path.join(self.test_dir, "image.png")
+        exif = Image.Exif()
+        exif[306] = "2015:05:05 05:05:05"
+        Image.new('RGB', (50, 50)).save(path, exif=exif)
+        with mock.patch("src.exif_extractor._read_exif_dates_pillow",
+                        wraps=_read_exif_dates_pillow) as pillow:
+            self.assertEqual(get_image_date(path), datetime(2015, 5, 5, 5, 5, 5))
+        pillow.assert_called_once()
+
+    def test_batch_dates_keep_order_and_sources(self):
+        paths = []
+        for i in range(10):
+            if i % 2:
+                paths.append(self.save_with_exif(f"{i}.jpg", exif_ifd={36867: f"2020:01:{i + 1:02d} 00:00:00"}))
+            else:
+                paths.append(self.save_with_exif(f"{i}.jpg"))
+        paths.append(os.path.join(self.test_dir, "missing.jpg"))
+
+        results = list(get_image_dates(paths, workers=4))
+        self.assertEqual([r[0] for r in results], paths)
+        for i, (path, date, source) in enumerate(results[:-1]):
+            if i % 2:
+                self.assertEqual((date, source), (datetime(2020, 1, i + 1), "DateTimeOriginal"))
+            else:
+                self.assertEqual(source, "mtime")
+        self.assertEqual(results[-1][1:], (None, None))
+
+        unordered = list(get_image_dates(paths, workers=4, ordered=False))
+        self.assertEqual(sorted(r[0] for r in unordered), sorted(paths))
+
+    def test_batch_dates_bound_in_flight_reads(self):
+        path = self.save_with_exif("a.jpg")
+        consumed = []
+
+        def source():
+            for i in range(100):
+                consumed.append(i)
+                yield path
+
+        results = get_image_dates(source(), workers=2, max_in_flight=3)
+        next(results)
+        self.assertLessEqual(len(consumed), 4)
+        self.assertEqual(len(list(results)), 99)
+
+    def test_date_from_filename_patterns(self):
+        cases = {
+            "IMG_20230514_101233.jpg": datetime(2023, 5, 14, 10, 12, 33),
+            "PXL_20230514_101233456.jpg": datetime(2023, 5, 14, 10, 12, 33),
+            "WhatsApp Image 2023-05-14 at 10.12.33.jpeg": datetime(2023, 5, 14, 10, 12, 33),
+            "WhatsApp Image 2023-05-14 at 1.02.03 PM.jpeg": datetime(2023, 5, 14, 13, 2, 3),
+            "IMG-20230514-WA0001.jpg": datetime(2023, 5, 14),
+            "2023-05-14 10.12.33.jpg": datetime(2023, 5, 14, 10, 12, 33),
+            "IMG_20231345_101233.jpg": None,  # not a valid date
+            "holiday.jpg": None,
+        }
+        for name, expected in cases.items():
+            self.assertEqual(date_from_filename(os.path.join("any", "dir", name)), expected, name)
+
+    def test_filename_policies(self):
+        # EXIF date disagrees with the name on purpose
+        path = self.save_with_exif("IMG_20230514_101233.jpg", ifd0={306: "2020:01:01 00:00:00"})
+        no_exif = self.save_with_exif("IMG_20220202_020202.jpg")
+
+        self.assertEqual(get_image_date_with_source(path), (datetime(2020, 1, 1), "DateTime"))
+        self.assertEqual(get_image_date_with_source(no_exif, filename_policy="fallback"),
+                         (datetime(2022, 2, 2, 2, 2, 2), "filename"))
+        # Names are only used when asked to
+        self.assertEqual(get_image_date_with_source(no_exif)[1], "mtime")
+        self.assertEqual(get_image_date_with_source(no_exif, filename_policy="ignore")[1], "mtime")
+
+        with mock.patch("src.exif_extractor.os.stat") as stat, \
+             mock.patch("src.exif_extractor.read_exif_dates") as read:
+            result = get_image_date_with_source(path, filename_policy="trust")
+        stat.assert_not_called()
+        read.assert_not_called()
+        self.assertEqual(result, (datetime(2023, 5, 14, 10, 12, 33), "filename"))
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,8 +3,15 @@ import unittest
 import os
 import shutil
 from pathlib import Path
+from unittest import mock
 from PIL import Image
-from src.gallery_generator import GalleryGenerator
+from src.gallery_generator import GalleryGenerator, _make_thumbnail
+
+def _crashing_thumbnail(job):
+    # Module-level so the process pool can pickle it
+    if job[0].endswith("crash.jpg"):
+        os._exit(1)  # Like a decoder crashing the worker
+    return _make_thumbnail(job)
 
 class TestGalleryGenerator(unittest.TestCase):
     def setUp(self):
@@ -56,5 +63,65 @@ class TestGalleryGenerator(unittest.TestCase):
             self.assertTrue(thumb.width <= 200)
             self.assertTrue(thumb.height <= 200)
 
+    def test_parallel_output_matches_serial(self):
+        for day, color in (("02", "green"), ("03", "blue")):
+            day_dir = self.test_root / "2024" / "01" / day
+            day_dir.mkdir(parents=True)
+            for i in range(3):
+                Image.new('RGB', (300, 200), color=color).save(day_dir / f"img{i}.jpg")
+        (self.sub_dir / "broken.jpg").write_bytes(b"not an image")
+
+        gen = GalleryGenerator(self.test_root, self.output_dir)
+        serial = gen.generate_simple(workers=1)
+        with open(self.output_dir / "index.html", encoding="utf-8") as f:
+            serial_html = f.read()
+        shutil.rmtree(self.output_dir)
+
+        calls = []
+        parallel = gen.generate_simple(workers=2, chunksize=2,
+                                       progress=lambda done, total: calls.append((done, total)))
+        with open(self.output_dir / "index.html", encoding="utf-8") as f:
+            self.assertEqual(f.read(), serial_html)
+
+        self.assertEqual(parallel, serial)
+        self.assertEqual((parallel["images"], parallel["created"]), (7, 7))
+        self.assertEqual([failure["path"] for failure in parallel["failed"]],
+                         [str(self.sub_dir / "broken.jpg")])
+        self.assertNotIn("broken.jpg", serial_html)
+        self.assertEqual(calls, [(i, 8) for i in range(1, 9)])
+        self.assertFalse((self.output_dir / "thumbnails" / "2024" / "01" / "01" / "broken.jpg").exists())
+
+        # Existing thumbnails are kept; only the broken image is retried
+        again = gen.generate_simple(workers=2)
+        self.assertEqual((again["images"], again["created"], len(again["failed"])), (7, 0, 1))
+
+    def test_default_is_serial(self):
+        gen = GalleryGenerator(self.test_root, self.output_dir)
+        with mock.patch("src.gallery_generator.ProcessPoolExecutor") as pool:
+            report = gen.generate_simple()
+        pool.assert_not_called()
+        self.assertEqual(report["created"], 1)
+
+    def test_crashed_worker_is_reported(self):
+        for i in range(4):
+            Image.new('RGB', (300, 200), color='green').save(self.sub_dir / f"img{i}.jpg")
+        Image.new('RGB', (300, 200), color='blue').save(self.sub_dir / "crash.jpg")
+
+        gen = GalleryGenerator(self.test_root, self.output_dir)
+        with mock.patch("src.gallery_generator._make_thumbnail", _crashing_thumbnail):
+            report = gen.generate_simple(workers=2, chunksize=1)
+
+        failed = [failure["path"] for failure in report["failed"]]
+        self.assertIn(str(self.sub_dir / "crash.jpg"), failed)
+        self.assertTrue(all("BrokenProcessPool" in failure["error"] for failure in report["failed"]))
+        self.assertEqual(report["images"] + len(failed), 6)
+        thumbs = self.output_dir / "thumbnails" / "2024" / "01" / "01"
+        for path in failed:
+            self.assertFalse((thumbs / Path(path).name).exists())
+
+        # The next run retries everything that was not done
+        again = gen.generate_simple()
+        self.assertEqual((again["images"], len(again["failed"])), (6, 0))
+
 if __name__ == '__main__':
     unittest.main()
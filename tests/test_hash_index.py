@@ -0,0 +1,87 @@
+import unittest
+import shutil
+from pathlib import Path
+from unittest import mock
+from src.deduplicator import Deduplicator, PARTIAL_HASH_SIZE
+from src.hash_index import HashIndex
+
+class TestHashIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_index_data")
+        self.quarantine_dir = Path("test_index_quarantine")
+        self.db_path = Path("test_index.db")
+        self.test_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        for d in (self.test_dir, self.quarantine_dir):
+            if d.exists():
+                shutil.rmtree(d)
+        for suffix in ("", "-wal", "-shm"):
+            p = Path(str(self.db_path) + suffix)
+            if p.exists():
+                p.unlink()
+
+    def create_file(self, name, content):
+        p = self.test_dir / name
+        with open(p, "wb") as f:
+            f.write(content)
+        return p
+
+    def test_lookup_requires_matching_stat(self):
+        p = self.create_file("a.bin", b"abc")
+        index = HashIndex(self.db_path)
+        index.record(p, HashIndex.stat_key(p.stat()), "partial", "full")
+        self.assertEqual(index.lookup(p, p.stat()), ("partial", "full"))
+
+        # Rewriting the file changes size/mtime, so the row is no longer trusted
+        self.create_file("a.bin", b"abcdef")
+        self.assertIsNone(index.lookup(p, p.stat()))
+        index.close()
+
+    def test_state_survives_restart(self):
+        original = self.create_file("original.bin", b"same bytes")
+        index = HashIndex(self.db_path)
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), index=index)
+        self.assertEqual(dedup.process_file(original), "unique")
+        index.close()
+
+        # New process: fresh index connection and deduplicator
+        index = HashIndex(self.db_path)
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), index=index)
+        copy = self.create_file("copy.bin", b"same bytes")
+        self.assertEqual(dedup.process_file(copy), "duplicate")
+        self.assertFalse(copy.exists())
+        index.close()
+
+    def test_unchanged_files_are_not_rehashed(self):
+        self.create_file("a.bin", b"a" * PARTIAL_HASH_SIZE * 3)
+        self.create_file("b.bin", b"a" * PARTIAL_HASH_SIZE * 2 + b"b" * PARTIAL_HASH_SIZE)
+        index = HashIndex(self.db_path)
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), index=index)
+        first = dedup.scan_directory(self.test_dir)
+        self.assertEqual(first["unique"], 2)
+        index.close()
+
+        index = HashIndex(self.db_path)
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir), index=index)
+        with mock.patch("src.deduplicator.get_partial_hash") as partial, \
+             mock.patch("src.deduplicator.get_file_hash") as full:
+            second = dedup.scan_directory(self.test_dir)
+        partial.assert_not_called()
+        full.assert_not_called()
+        self.assertEqual(second["eliminated"]["index"], 2)
+        self.assertEqual(second["duplicate"], 0)
+        index.close()
+
+    def test_hashes_are_tagged_with_algorithm(self):
+        p = self.create_file("a.bin", b"abc")
+        index = HashIndex(self.db_path)
+        index.record(p, HashIndex.stat_key(p.stat()), "p", "f", algorithm="blake2b")
+        self.assertEqual(index.lookup(p, p.stat(), algorithm="blake2b"), ("p", "f"))
+        self.assertIsNone(index.lookup(p, p.stat(), algorithm="md5"))
+        # Rows from another algorithm still load, but without usable hashes
+        self.assertEqual(index.load("md5")[0][4:], (None, None))
+        index.close()
+
+if __name__ == '__main__':
+    unittest.main()
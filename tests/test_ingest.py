@@ -0,0 +1,54 @@
+import unittest
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from PIL import Image
+from src.ingest import ingest_file, ingest_files, INGEST_BLOCK_SIZE
+from src.deduplicator import get_file_hash, get_partial_hash
+from src.exif_extractor import get_image_date_with_source
+from src.hash_index import HashIndex
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_ingest_data")
+        self.test_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_matches_separate_reads(self):
+        photo = self.test_dir / "photo.jpg"
+        exif = Image.Exif()
+        exif[306] = "2021:03:04 05:06:07"
+        Image.new('RGB', (64, 64), color='red').save(photo, exif=exif)
+        paths = [photo]
+        for size in (0, 100, INGEST_BLOCK_SIZE, 2 * INGEST_BLOCK_SIZE + 10):
+            path = self.test_dir / f"blob_{size}.bin"
+            path.write_bytes(os.urandom(size))
+            paths.append(path)
+
+        for path in paths:
+            result = ingest_file(path, algorithm="sha256")
+            self.assertEqual(result["full"], get_file_hash(path, algorithm="sha256"))
+            self.assertEqual(result["partial"], get_partial_hash(path, algorithm="sha256"))
+            self.assertEqual((result["date"], result["source"]), get_image_date_with_source(path))
+            self.assertEqual(result["stat"], HashIndex.stat_key(os.stat(path)))
+        self.assertEqual(ingest_file(photo)["date"], datetime(2021, 3, 4, 5, 6, 7))
+
+    def test_batch_keeps_order_and_reports_failures(self):
+        paths = []
+        for i in range(10):
+            path = self.test_dir / f"f{i}.bin"
+            path.write_bytes(bytes([i]) * 1000)
+            paths.append(path)
+        paths.insert(3, self.test_dir / "missing.bin")
+
+        results = list(ingest_files(paths, workers=4, max_in_flight=2))
+        self.assertEqual([p for p, _ in results], paths)
+        self.assertIsNone(results[3][1])
+        self.assertEqual(results[0][1]["full"], get_file_hash(paths[0]))
+
+if __name__ == '__main__':
+    unittest.main()
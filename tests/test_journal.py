@@ -0,0 +1,133 @@
+import unittest
+import os
+import json
+import shutil
+from pathlib import Path
+from unittest import mock
+from PIL import Image
+from src.journal import Journal
+from src.deduplicator import Deduplicator, PARTIAL_HASH_SIZE
+from src.organizer import process_directory
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_journal_data")
+        self.dest_dir = Path("test_journal_dest")
+        self.quarantine_dir = Path("test_journal_quarantine")
+        self.journal_path = Path("test_journal.jsonl")
+        self.test_dir.mkdir(exist_ok=True)
+        self.dest_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        for d in (self.test_dir, self.dest_dir, self.quarantine_dir):
+            if d.exists():
+                shutil.rmtree(d)
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+    def create_file(self, name, content):
+        p = self.test_dir / name
+        p.write_bytes(content)
+        return p
+
+    def test_recover_rolls_forward_and_back(self):
+        journal = Journal(self.journal_path)
+        finished_src = self.test_dir / "finished.jpg"
+        finished_dst = self.create_file("finished_target.jpg", b"moved")
+        untouched = self.create_file("untouched.jpg", b"still here")
+        partial_src = self.create_file("partial.jpg", b"whole file")
+        partial_dst = self.create_file("partial_target.jpg", b"whole")
+        journal.intend(finished_src, finished_dst)
+        journal.intend(untouched, self.test_dir / "never_written.jpg")
+        journal.intend(partial_src, partial_dst)
+        # A complete copy whose source could not be unlinked, a name taken
+        # by an unrelated file, and a hardlink move cut short
+        kept_src = self.create_file("kept.jpg", b"whole file")
+        kept_dst = self.create_file("kept_target.jpg", b"whole file")
+        journal.intend(kept_src, kept_dst)
+        user_src = self.create_file("mine.jpg", b"photo")
+        user_dst = self.create_file("user_file.jpg", b"USER FILE")
+        journal.intend(user_src, user_dst)
+        linked_src = self.create_file("linked.jpg", b"linked")
+        linked_dst = self.test_dir / "linked_target.jpg"
+        journal.intend(linked_src, linked_dst)
+        os.link(linked_src, linked_dst)
+        journal.close()
+
+        # Simulate a torn final record from the crash
+        with open(self.journal_path, "a") as f:
+            f.write('{"op": "do')
+
+        journal = Journal(self.journal_path)
+        self.assertEqual(journal.recover(), {"rolled_forward": 2, "rolled_back": 2, "conflicts": 2})
+        self.assertEqual(finished_dst.read_bytes(), b"moved")
+        self.assertFalse(partial_dst.exists())
+        self.assertTrue(partial_src.exists())
+        for path in (kept_src, kept_dst, user_src, user_dst):
+            self.assertTrue(path.exists())
+        self.assertEqual(user_dst.read_bytes(), b"USER FILE")
+        self.assertFalse(linked_src.exists())
+        self.assertEqual(linked_dst.read_bytes(), b"linked")
+        journal.close()
+
+        # Nothing left to recover on the next start
+        journal = Journal(self.journal_path)
+        self.assertEqual(journal.recover(), {"rolled_forward": 0, "rolled_back": 0, "conflicts": 0})
+        journal.close()
+
+    def test_process_directory_resumes_and_resets(self):
+        exif = Image.Exif()
+        exif[306] = "2023:05:14 10:00:00"
+        Image.new('RGB', (20, 20)).save(self.test_dir / "a.jpg", exif=exif)
+        # A previous run moved b.jpg but died before logging completion
+        target = self.dest_dir / "2023" / "05" / "14"
+        target.mkdir(parents=True)
+        (target / "b.jpg").write_bytes(b"moved before the crash")
+        journal = Journal(self.journal_path)
+        journal.intend(self.test_dir / "b.jpg", target / "b.jpg")
+
+        summary = process_directory(self.test_dir, self.dest_dir, journal=journal)
+        self.assertEqual(summary["recovered"], {"rolled_forward": 1, "rolled_back": 0, "conflicts": 0})
+        self.assertEqual(summary["organized"], 1)
+        self.assertEqual(self.journal_path.read_text(), "")
+        journal.close()
+
+    def test_interrupted_scan_resumes_without_rehashing(self):
+        block = PARTIAL_HASH_SIZE
+        for i in range(4):
+            self.create_file(f"f{i}.bin", bytes([i]) * block * 3)
+        self.create_file("dup.bin", bytes([0]) * block * 3)
+
+        journal = Journal(self.journal_path)
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir))
+        original = dedup._classify
+        calls = []
+
+        def crash_on_third(path, *args):
+            calls.append(path)
+            if len(calls) == 3:
+                raise RuntimeError("power cut")
+            return original(path, *args)
+
+        with mock.patch.object(dedup, "_classify", side_effect=crash_on_third):
+            with self.assertRaises(RuntimeError):
+                dedup.scan_directory(self.test_dir, journal=journal)
+        journal.close()
+        settled = {json.loads(line)["key"] for line in self.journal_path.read_text().splitlines()}
+        self.assertEqual(len(settled), 2)
+
+        # Fresh process: no index, only the journal
+        journal = Journal(self.journal_path)
+        dedup = Deduplicator(quarantine_dir=str(self.quarantine_dir))
+        from src import deduplicator
+        with mock.patch("src.deduplicator.get_partial_hash", wraps=deduplicator.get_partial_hash) as partial:
+            results = dedup.scan_directory(self.test_dir, journal=journal)
+        hashed = {Path(c.args[0]).resolve() for c in partial.call_args_list}
+        self.assertEqual(results["eliminated"]["index"], 2)
+        self.assertEqual(results["unique"] + results["duplicate"], 5)
+        for key in settled:
+            self.assertNotIn(Path(key).resolve(), hashed)
+        journal.close()
+
+if __name__ == '__main__':
+    unittest.main()
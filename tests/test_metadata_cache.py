@@ -0,0 +1,78 @@
+import unittest
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+from PIL import Image
+from src.exif_extractor import get_image_date, get_image_date_with_source
+from src.metadata_cache import MetadataCache
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_cache_data")
+        self.db_path = Path("test_cache.db")
+        self.test_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+        for suffix in ("", "-wal", "-shm"):
+            p = Path(str(self.db_path) + suffix)
+            if p.exists():
+                p.unlink()
+
+    def create_image(self, name, date="2020:05:14 10:12:33"):
+        path = self.test_dir / name
+        exif = Image.Exif()
+        exif[306] = date
+        Image.new('RGB', (20, 20)).save(path, exif=exif)
+        return path
+
+    def test_hit_after_first_read_and_after_rename(self):
+        path = self.create_image("a.jpg")
+        cache = MetadataCache()
+        self.assertEqual(get_image_date_with_source(path, cache),
+                         (datetime(2020, 5, 14, 10, 12, 33), "DateTime"))
+
+        renamed = self.test_dir / "b.jpg"
+        path.rename(renamed)
+        with mock.patch("src.exif_extractor._read_exif_date") as read:
+            self.assertEqual(get_image_date(renamed, cache), datetime(2020, 5, 14, 10, 12, 33))
+        read.assert_not_called()
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_modified_file_is_reread(self):
+        path = self.create_image("a.jpg")
+        cache = MetadataCache()
+        get_image_date(path, cache)
+        self.create_image("a.jpg", date="2011:11:11 11:11:11")
+        os.utime(path, ns=(0, 10**18))  # make sure mtime_ns changed
+        self.assertEqual(get_image_date(path, cache), datetime(2011, 11, 11, 11, 11, 11))
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_persistent_store_and_invalidation(self):
+        path = self.create_image("a.jpg")
+        cache = MetadataCache(self.db_path)
+        get_image_date(path, cache)
+        cache.close()
+
+        cache = MetadataCache(self.db_path)
+        with mock.patch("src.exif_extractor._read_exif_date") as read:
+            self.assertEqual(get_image_date(path, cache), datetime(2020, 5, 14, 10, 12, 33))
+        read.assert_not_called()
+
+        cache.invalidate(path)
+        self.assertIsNone(cache.get(path.stat()))
+        cache.close()
+
+    def test_lru_is_bounded(self):
+        cache = MetadataCache(max_entries=2)
+        for name in ("a.jpg", "b.jpg", "c.jpg"):
+            get_image_date(self.create_image(name), cache)
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertIsNone(cache.get((self.test_dir / "a.jpg").stat()))
+
+if __name__ == '__main__':
+    unittest.main()
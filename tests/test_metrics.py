@@ -0,0 +1,56 @@
+import unittest
+import json
+import urllib.error
+import urllib.request
+from src.metrics import Metrics, MetricsServer
+
+class TestMetrics(unittest.TestCase):
+    def test_prometheus_text(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.describe("files_total", "Files handled")
+        metrics.inc("files_total", labels=(("result", "unique"),))
+        metrics.inc("files_total", 2, labels=(("result", "duplicate"),))
+        for seconds in (0.05, 0.5, 5.0):
+            metrics.observe("move", seconds)
+        metrics.gauge("queue_depth", lambda: 7, "Queued files")
+        metrics.gauge("unknown", lambda: None)
+
+        text = metrics.render_prometheus()
+        self.assertIn("# HELP photo_organizer_files_total Files handled", text)
+        self.assertIn('photo_organizer_files_total{result="duplicate"} 2', text)
+        self.assertIn('photo_organizer_stage_seconds_bucket{stage="move",le="0.1"} 1', text)
+        self.assertIn('photo_organizer_stage_seconds_bucket{stage="move",le="1.0"} 2', text)
+        self.assertIn('photo_organizer_stage_seconds_bucket{stage="move",le="+Inf"} 3', text)
+        self.assertIn('photo_organizer_stage_seconds_count{stage="move"} 3', text)
+        self.assertIn("photo_organizer_queue_depth 7", text)
+        self.assertNotIn("unknown", text)
+
+    def test_stage_summary(self):
+        metrics = Metrics(buckets=(0.01, 0.1, 1.0))
+        for _ in range(90):
+            metrics.observe("ingest", 0.005)
+        for _ in range(10):
+            metrics.observe("ingest", 0.5)
+        summary = metrics.stage_summary()["ingest"]
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["p50"], 0.01)
+        self.assertEqual(summary["p95"], 1.0)
+        self.assertAlmostEqual(summary["mean"], 0.0545)
+
+    def test_server(self):
+        metrics = Metrics()
+        metrics.inc("errors_total")
+        server = MetricsServer(metrics, lambda: {"status": "ok"}, port=0).start()
+        base = f"http://127.0.0.1:{server.address[1]}"
+        try:
+            with urllib.request.urlopen(base + "/metrics") as response:
+                self.assertIn("photo_organizer_errors_total 1", response.read().decode())
+            with urllib.request.urlopen(base + "/health") as response:
+                self.assertEqual(json.loads(response.read()), {"status": "ok"})
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(base + "/other")
+        finally:
+            server.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,13 @@ import shutil
 import time
 import threading
 from pathlib import Path
-from src.monitor import ImageHandler
-from watchdog.events import FileCreatedEvent
+from unittest import mock
+import json
+from src.monitor import ImageHandler, MultiInboxMonitor, load_config
+from src.metrics import Metrics
+from src.polling import ScandirPollingObserver
+from watchdog.events import FileCreatedEvent, FileModifiedEvent, FileMovedEvent, DirMovedEvent
+from watchdog.observers import Observer
 from PIL import Image
 
 class TestMonitor(unittest.TestCase):
@@ -19,9 +24,10 @@ class TestMonitor(unittest.TestCase):
         self.dest_dir.mkdir(exist_ok=True)
         self.quar_dir.mkdir(exist_ok=True)
         
-        self.handler = ImageHandler(str(self.dest_dir), str(self.quar_dir))
+        self.handler = ImageHandler(str(self.dest_dir), str(self.quar_dir), settle_interval=0.05)
 
     def tearDown(self):
+        self.handler.close()
         if self.src_dir.exists():
             shutil.rmtree(self.src_dir)
         if self.dest_dir.exists():
@@ -73,5 +79,266 @@ class TestMonitor(unittest.TestCase):
         self.assertEqual(len(quarantined), 1)
         self.assertEqual(quarantined[0].name, "dupe.jpg")
 
+    def test_process_new_file_reads_each_file_once(self):
+        img_path1 = self.create_dummy_image("original.jpg")
+        img_path2 = self.create_dummy_image("dupe.jpg")
+        no_reread = AssertionError("file read a second time")
+        with mock.patch("src.deduplicator.get_partial_hash", side_effect=no_reread), \
+             mock.patch("src.deduplicator.get_file_hash", side_effect=no_reread), \
+             mock.patch("src.exif_extractor.Image.open", side_effect=no_reread):
+            self.handler.process_existing_files(self.src_dir)
+
+        self.assertEqual(len(list(self.dest_dir.glob("**/*.jpg"))), 1)
+        self.assertEqual(len(list(self.quar_dir.glob("*"))), 1)
+
+    def test_on_created_does_not_block(self):
+        paths = [self.create_dummy_image(f"burst_{i}.jpg") for i in range(20)]
+        start = time.perf_counter()
+        for path in paths:
+            self.handler.on_created(FileCreatedEvent(str(path)))
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        self.assertTrue(self.handler.scheduler.drain(timeout=10))
+        # All 20 are the same black image: one organized, the rest quarantined
+        self.assertEqual(len(list(self.dest_dir.glob("**/*.jpg"))), 1)
+        self.assertEqual(len(list(self.quar_dir.glob("*"))), 19)
+
+    def test_noisy_events_coalesce(self):
+        temp = self.src_dir / "photo.jpg.part"
+        Image.new('RGB', (100, 100)).save(temp, format="JPEG")
+        final = self.src_dir / "photo.jpg"
+        with mock.patch.object(self.handler, "process_new_file") as process:
+            self.handler.on_created(FileCreatedEvent(str(temp)))
+            for _ in range(10):
+                self.handler.on_modified(FileModifiedEvent(str(temp)))
+            temp.rename(final)
+            self.handler.on_moved(FileMovedEvent(str(temp), str(final)))
+            for _ in range(10):
+                self.handler.on_modified(FileModifiedEvent(str(final)))
+                self.handler.on_created(FileCreatedEvent(str(final)))
+            self.assertTrue(self.handler.scheduler.drain(timeout=5))
+        process.assert_called_once_with(final.absolute())
+
+    def test_folder_moved_in_is_picked_up(self):
+        outside = Path("test_monitor_outside")
+        (outside / "trip").mkdir(parents=True)
+        self.addCleanup(shutil.rmtree, outside)
+        Image.new('RGB', (10, 10)).save(outside / "trip" / "a.jpg")
+        (outside / "trip").rename(self.src_dir / "trip")
+        with mock.patch.object(self.handler, "process_new_file") as process:
+            self.handler.on_moved(DirMovedEvent(str(outside / "trip"), str(self.src_dir / "trip")))
+            self.assertTrue(self.handler.scheduler.drain(timeout=5))
+        process.assert_called_once_with((self.src_dir / "trip" / "a.jpg").absolute())
+
+    def test_recursive_watch_skips_destination(self):
+        self.handler.close()
+        inner_dest = self.src_dir / "organized"
+        self.handler = ImageHandler(str(inner_dest), str(self.quar_dir), settle_interval=0.05)
+        observer = Observer()
+        observer.schedule(self.handler, str(self.src_dir), recursive=True)
+        observer.start()
+        try:
+            (self.src_dir / "sub").mkdir()
+            self.create_dummy_image("sub/nested.jpg")
+            deadline = time.monotonic() + 10
+            while not list(inner_dest.glob("**/nested.jpg")) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.3)  # Let any events from the move itself arrive
+            self.assertTrue(self.handler.scheduler.drain(timeout=5))
+        finally:
+            observer.stop()
+            observer.join()
+        self.assertEqual(len(list(inner_dest.glob("**/nested.jpg"))), 1)
+        self.assertFalse((self.src_dir / "sub" / "nested.jpg").exists())
+
+    def test_catch_up_shares_pool_with_events(self):
+        paths = [self.create_dummy_image(f"old_{i}.jpg") for i in range(30)]
+        with mock.patch.object(self.handler, "process_new_file") as process:
+            # The first files also get an event while the backlog is fed
+            for path in paths[:10]:
+                self.handler.on_created(FileCreatedEvent(str(path)))
+            backlog = self.handler.catch_up(self.src_dir)
+            for path in paths[:10]:
+                self.handler.on_modified(FileModifiedEvent(str(path)))
+            self.assertTrue(backlog.wait(timeout=10))
+            self.assertTrue(self.handler.scheduler.drain(timeout=10))
+
+        handled = sorted(call.args[0].name for call in process.call_args_list)
+        self.assertEqual(handled, sorted(p.name for p in paths))
+        progress = backlog.progress()
+        self.assertEqual((progress["found"], progress["done"]), (30, 30))
+        self.assertFalse(progress["walking"])
+        self.assertEqual(progress["eta"], 0)
+
+    def test_metrics_and_health(self):
+        self.handler.close()
+        self.handler = ImageHandler(str(self.dest_dir), str(self.quar_dir), settle_interval=0.05,
+                                    metrics=Metrics())
+        for name in ("a.jpg", "b.jpg"):
+            self.handler.on_created(FileCreatedEvent(str(self.create_dummy_image(name))))
+        self.assertTrue(self.handler.scheduler.drain(timeout=10))
+
+        health = self.handler.health()
+        self.assertEqual(health["dedup"], {"unique": 1, "duplicate": 1})
+        self.assertEqual(health["moves"], {"organized": 1})
+        self.assertEqual(health["duplicate_ratio"], 0.5)
+        self.assertEqual(health["errors"], 0)
+        self.assertEqual(health["stages"]["ingest"]["count"], 2)
+        self.assertEqual(health["stages"]["move"]["count"], 1)
+        self.assertEqual(health["stages"]["total"]["count"], 2)
+        self.assertGreaterEqual(health["stages"]["total"]["mean"], 0.05)
+        self.assertGreater(health["workers"]["utilization"], 0)
+        self.assertIn("photo_organizer_queue_depth 0", self.handler.metrics.render_prometheus())
+
+    def test_failed_move_is_counted_once_as_error(self):
+        self.handler.close()
+        self.handler = ImageHandler(str(self.dest_dir), str(self.quar_dir), settle_interval=0.05,
+                                    metrics=Metrics())
+        with mock.patch("src.monitor.organize_file", return_value=None):
+            self.handler.on_created(FileCreatedEvent(str(self.create_dummy_image("a.jpg"))))
+            self.assertTrue(self.handler.scheduler.drain(timeout=10))
+
+        health = self.handler.health()
+        self.assertEqual(health["dedup"], {"unique": 1})
+        self.assertEqual(health["moves"], {"failed": 1})
+        self.assertEqual(health["errors"], 1)
+        text = self.handler.metrics.render_prometheus()
+        self.assertIn('photo_organizer_moves_total{result="failed"} 1', text)
+        self.assertNotIn("files_total", text)
+
+    def test_polling_observer_feeds_handler(self):
+        observer = ScandirPollingObserver(min_interval=0.05, max_interval=0.2)
+        observer.schedule(self.handler, str(self.src_dir), recursive=True)
+        observer.start()
+        try:
+            (self.src_dir / "card").mkdir()
+            self.create_dummy_image("card/polled.jpg")
+            deadline = time.monotonic() + 10
+            while not list(self.dest_dir.glob("**/polled.jpg")) and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            observer.stop()
+            observer.join()
+        self.assertEqual(len(list(self.dest_dir.glob("**/polled.jpg"))), 1)
+
+class TestMultiInbox(unittest.TestCase):
+    def setUp(self):
+        self.root = Path("test_multi_inbox")
+        self.inboxes = []
+        for name in ("phone", "camera"):
+            (self.root / name / "in").mkdir(parents=True)
+            self.inboxes.append({"name": name, "source": str(self.root / name / "in"),
+                                 "destination": str(self.root / name / "out"),
+                                 "quarantine": str(self.root / name / "quar"),
+                                 "recursive": False, "polling": False, "max_concurrent": 1})
+        self.monitor = MultiInboxMonitor(self.inboxes, settle_interval=0.05)
+
+    def tearDown(self):
+        self.monitor.close()
+        if self.root.exists():
+            shutil.rmtree(self.root)
+
+    def create_dummy_image(self, inbox, name, color=(0, 0, 0)):
+        p = self.root / inbox / "in" / name
+        Image.new('RGB', (100, 100), color).save(p)
+        return p
+
+    def test_routes_each_inbox_to_its_destination(self):
+        self.assertEqual(self.monitor.inbox_of(self.root / "camera" / "in" / "x.jpg"), "camera")
+        self.assertIsNone(self.monitor.inbox_of(self.root / "elsewhere.jpg"))
+        for inbox, color in (("phone", (255, 0, 0)), ("camera", (0, 255, 0))):
+            path = self.create_dummy_image(inbox, f"{inbox}.jpg", color)
+            self.monitor.handlers[inbox].on_created(FileCreatedEvent(str(path)))
+        self.assertTrue(self.monitor.scheduler.drain(timeout=10))
+
+        self.assertEqual([p.name for p in (self.root / "phone" / "out").glob("**/*.jpg")], ["phone.jpg"])
+        self.assertEqual([p.name for p in (self.root / "camera" / "out").glob("**/*.jpg")], ["camera.jpg"])
+        self.assertEqual(set(self.monitor.scheduler.key_stats()), {None, "phone", "camera"})
+
+    def test_duplicates_are_detected_across_inboxes(self):
+        first = self.create_dummy_image("phone", "a.jpg")
+        self.monitor.handlers["phone"].on_created(FileCreatedEvent(str(first)))
+        self.assertTrue(self.monitor.scheduler.drain(timeout=10))
+        second = self.create_dummy_image("camera", "b.jpg")
+        self.monitor.handlers["camera"].on_created(FileCreatedEvent(str(second)))
+        self.assertTrue(self.monitor.scheduler.drain(timeout=10))
+
+        # One deduplicator for both, but each inbox keeps its own quarantine
+        self.assertEqual(len(list((self.root / "phone" / "out").glob("**/*.jpg"))), 1)
+        self.assertEqual([p.name for p in (self.root / "camera" / "quar").iterdir()], ["b.jpg"])
+        self.assertFalse((self.root / "camera" / "out").exists())
+
+    def test_catch_up_and_health_per_inbox(self):
+        self.monitor.close()
+        self.monitor = MultiInboxMonitor(self.inboxes, settle_interval=0.05, metrics=Metrics())
+        self.create_dummy_image("phone", "old1.jpg", (1, 2, 3))
+        self.create_dummy_image("camera", "old2.jpg", (4, 5, 6))
+        backlogs = self.monitor.catch_up()
+        for backlog in backlogs.values():
+            self.assertTrue(backlog.wait(timeout=10))
+
+        health = self.monitor.health()
+        self.assertEqual(health["dedup"], {"unique": 2})
+        self.assertEqual(health["moves"], {"organized": 2})
+        self.assertEqual(health["inboxes"]["phone"]["backlog"]["done"], 1)
+        self.assertEqual(health["inboxes"]["camera"]["quota"], 1)
+        self.assertNotIn("backlog", health)
+
+    def test_nested_inbox_files_belong_to_the_inner_backlog(self):
+        self.monitor.close()
+        outer = self.root / "phone" / "in"
+        inner = outer / "camera"
+        inner.mkdir()
+        inboxes = [dict(self.inboxes[0], recursive=True),
+                   dict(self.inboxes[1], source=str(inner), max_concurrent=None)]
+        self.monitor = MultiInboxMonitor(inboxes, settle_interval=0.05)
+        Image.new('RGB', (100, 100), (9, 9, 9)).save(outer / "outer.jpg")
+        for i in range(5):
+            Image.new('RGB', (100, 100), (40 * i, 200, 0)).save(inner / f"inner{i}.jpg")
+
+        backlogs = self.monitor.catch_up()
+        for backlog in backlogs.values():
+            self.assertTrue(backlog.wait(timeout=10))
+        self.assertEqual(backlogs["phone"].progress()["found"], 1)
+        self.assertEqual(backlogs["camera"].progress()["done"], 5)
+        self.assertEqual(len(list((self.root / "camera" / "out").glob("**/*.jpg"))), 5)
+        # Events under the inner inbox are ignored by the outer handler
+        self.assertTrue(self.monitor.handlers["phone"]._is_excluded(inner / "x.jpg"))
+
+class TestLoadConfig(unittest.TestCase):
+    def setUp(self):
+        self.config_path = Path("test_monitor_config.json")
+
+    def tearDown(self):
+        if self.config_path.exists():
+            self.config_path.unlink()
+
+    def write(self, config):
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        return load_config(self.config_path)
+
+    def test_defaults(self):
+        config = self.write({"index": "hashes.db", "recursive": True, "inboxes": [
+            {"source": "inbox/phone/", "destination": "Photos"},
+            {"source": "inbox/scans", "destination": "Scans", "quarantine": "Q2",
+             "recursive": False, "max_concurrent": 2}]})
+        self.assertEqual(config["index"], "hashes.db")
+        self.assertEqual(config["workers"], 4)
+        self.assertIsNone(config["filename_policy"])
+        phone, scans = config["inboxes"]
+        self.assertEqual((phone["name"], phone["quarantine"], phone["recursive"], phone["max_concurrent"]),
+                         ("phone", "Quarantine", True, None))
+        self.assertEqual((scans["name"], scans["quarantine"], scans["recursive"], scans["max_concurrent"]),
+                         ("scans", "Q2", False, 2))
+
+    def test_invalid_configs(self):
+        for config in ({}, {"inboxes": []}, {"inboxes": [{"source": "a"}]},
+                       {"inboxes": [{"source": "x/a", "destination": "d"},
+                                    {"source": "y/a", "destination": "e"}]},
+                       {"inboxes": [{"source": "a", "destination": "d", "max_concurrent": 0}]},
+                       {"filename_policy": "guess", "inboxes": [{"source": "a", "destination": "d"}]}):
+            with self.assertRaises(ValueError):
+                self.write(config)
+
 if __name__ == '__main__':
     unittest.main()
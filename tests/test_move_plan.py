@@ -0,0 +1,88 @@
+import unittest
+import shutil
+from pathlib import Path
+from unittest import mock
+from PIL import Image
+from src.move_plan import MovePlan, plan_directory
+
+class TestMovePlan(unittest.TestCase):
+    def setUp(self):
+        self.test_src = Path("test_plan_src")
+        self.test_dest = Path("test_plan_dest")
+        self.plan_file = Path("test_plan.json")
+        self.test_src.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        for d in (self.test_src, self.test_dest):
+            if d.exists():
+                shutil.rmtree(d)
+        if self.plan_file.exists():
+            self.plan_file.unlink()
+
+    def create_image(self, name, date):
+        exif = Image.Exif()
+        exif[306] = date
+        path = self.test_src / name
+        Image.new('RGB', (20, 20)).save(path, exif=exif)
+        return path
+
+    def test_plan_save_load_and_apply(self):
+        self.create_image("a.jpg", "2023:05:14 10:00:00")
+        self.create_image("b.jpg", "2023:05:14 11:00:00")
+        self.create_image("c.jpg", "2022:01:02 10:00:00")
+        existing = self.test_dest / "2023" / "05" / "14"
+        existing.mkdir(parents=True)
+        (existing / "a.jpg").write_bytes(b"older photo")
+
+        plan = plan_directory(self.test_src, self.test_dest)
+        self.assertEqual(len(plan), 3)
+        self.assertEqual(len(plan.directories), 2)
+        targets = {Path(s).name: Path(t) for s, t in plan.moves}
+        self.assertEqual(targets["a.jpg"].name, "a_1.jpg")
+        # Nothing moved while planning
+        self.assertEqual(len(list(self.test_src.iterdir())), 3)
+
+        plan.save(self.plan_file)
+        loaded = MovePlan.load(self.plan_file)
+        self.assertEqual(loaded.moves, plan.moves)
+
+        with mock.patch("pathlib.Path.exists") as exists:
+            summary = loaded.apply()
+        exists.assert_not_called()
+        self.assertEqual(summary["moved"], 3)
+        self.assertEqual(summary["directories"], 2)
+        self.assertTrue(all(t.exists() for t in targets.values()))
+        self.assertEqual(list(self.test_src.iterdir()), [])
+
+    def test_apply_reports_conflicts_instead_of_overwriting(self):
+        self.create_image("a.jpg", "2023:05:14 10:00:00")
+        self.create_image("b.jpg", "2023:05:14 11:00:00")
+        plan = plan_directory(self.test_src, self.test_dest)
+        targets = dict(plan.moves)
+        # Created after the plan was saved for review
+        intruder = Path(targets[str(self.test_src / "a.jpg")])
+        intruder.parent.mkdir(parents=True)
+        intruder.write_bytes(b"USER FILE")
+
+        summary = plan.apply()
+        self.assertEqual(summary["moved"], 1)
+        self.assertEqual(summary["failed"], 0)
+        self.assertEqual(summary["conflicts"], [(str(self.test_src / "a.jpg"), str(intruder))])
+        self.assertEqual(intruder.read_bytes(), b"USER FILE")
+        self.assertTrue((self.test_src / "a.jpg").exists())
+
+    def test_diff(self):
+        old = MovePlan("dest", [("a.jpg", "dest/1/a.jpg"), ("b.jpg", "dest/1/b.jpg")])
+        new = MovePlan("dest", [("a.jpg", "dest/2/a.jpg"), ("c.jpg", "dest/1/c.jpg")])
+        self.assertEqual(old.diff(new), {
+            "added": [("c.jpg", "dest/1/c.jpg")],
+            "removed": [("b.jpg", "dest/1/b.jpg")],
+            "changed": [("a.jpg", "dest/1/a.jpg", "dest/2/a.jpg")],
+        })
+
+    def test_rejects_unknown_version(self):
+        with self.assertRaises(ValueError):
+            MovePlan.from_dict({"version": 99, "destination_root": "d", "moves": []})
+
+if __name__ == '__main__':
+    unittest.main()
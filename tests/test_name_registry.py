@@ -0,0 +1,57 @@
+import unittest
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+from src.name_registry import NameRegistry
+
+class TestNameRegistry(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_registry_data")
+        self.test_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_counters_follow_existing_names(self):
+        (self.test_dir / "IMG_0001.JPG").touch()
+        (self.test_dir / "IMG_0001_1.JPG").touch()
+        registry = NameRegistry()
+        names = [registry.reserve(self.test_dir, "IMG_0001.JPG").name for _ in range(3)]
+        self.assertEqual(names, ["IMG_0001_2.JPG", "IMG_0001_3.JPG", "IMG_0001_4.JPG"])
+        self.assertEqual(registry.reserve(self.test_dir, "other.jpg").name, "other.jpg")
+
+    def test_directory_is_listed_once(self):
+        registry = NameRegistry()
+        with mock.patch("src.name_registry.os.scandir", wraps=os.scandir) as scandir:
+            for _ in range(50):
+                registry.reserve(self.test_dir, "burst.jpg")
+        self.assertEqual(scandir.call_count, 1)
+
+    def test_missing_directory_and_release(self):
+        registry = NameRegistry()
+        target = registry.reserve(self.test_dir / "2024" / "01", "a.jpg")
+        self.assertEqual(target.name, "a.jpg")
+        registry.release(target)
+        self.assertEqual(registry.reserve(self.test_dir / "2024" / "01", "a.jpg").name, "a.jpg")
+
+    def test_names_compare_like_normcase(self):
+        (self.test_dir / "photo.jpg").touch()
+        registry = NameRegistry()
+        expected = "PHOTO_1.JPG" if os.path.normcase("A") == "a" else "PHOTO.JPG"
+        self.assertEqual(registry.reserve(self.test_dir, "PHOTO.JPG").name, expected)
+
+    def test_taken_relists_and_keeps_reservations(self):
+        registry = NameRegistry()
+        first = registry.reserve(self.test_dir, "a.jpg")
+        (self.test_dir / "a_1.jpg").write_text("USER FILE")  # Written behind its back
+        second = registry.reserve(self.test_dir, "a.jpg")
+        self.assertEqual(second.name, "a_1.jpg")
+        registry.taken(second)
+        names = [registry.reserve(self.test_dir, "a.jpg").name for _ in range(2)]
+        self.assertEqual(names, ["a_2.jpg", "a_3.jpg"])
+        self.assertNotEqual(registry.reserve(self.test_dir, first.name).name, first.name)
+
+if __name__ == '__main__':
+    unittest.main()
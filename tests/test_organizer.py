@@ -3,10 +3,13 @@ import unittest
 import os
 import shutil
 from pathlib import Path
-from src.organizer import organize_file
+from src.organizer import organize_file, process_directory
+from src.name_registry import NameRegistry
 from src.exif_extractor import get_image_date
 import time
+from unittest import mock
 from PIL import Image
+from src import organizer
 
 class TestOrganizer(unittest.TestCase):
     def setUp(self):
@@ -73,5 +76,83 @@ class TestOrganizer(unittest.TestCase):
         # Start ends with duplicate_1.jpg
         self.assertTrue(new_path2.endswith("duplicate_1.jpg"))
 
+    def test_collision_handling_with_registry(self):
+        registry = NameRegistry()
+        paths = []
+        for _ in range(4):
+            img_path = self.create_dummy_image("IMG_0001.JPG")
+            paths.append(organize_file(img_path, self.test_dest, registry=registry))
+
+        self.assertEqual([Path(p).name for p in paths],
+                         ["IMG_0001.JPG", "IMG_0001_1.JPG", "IMG_0001_2.JPG", "IMG_0001_3.JPG"])
+        self.assertTrue(all(os.path.exists(p) for p in paths))
+
+    def test_file_created_after_reservation_is_not_overwritten(self):
+        registry = NameRegistry()
+        first = organize_file(self.create_dummy_image("a.jpg"), self.test_dest, registry=registry)
+        intruder = Path(first).parent / "a_1.jpg"
+        intruder.write_text("USER FILE")
+
+        second = organize_file(self.create_dummy_image("a.jpg"), self.test_dest, registry=registry)
+        self.assertEqual(intruder.read_text(), "USER FILE")
+        self.assertEqual(Path(second).name, "a_2.jpg")
+        self.assertTrue(os.path.exists(first))
+
+    def test_process_directory_pipeline(self):
+        for i in range(20):
+            self.create_dummy_image(f"IMG_{i:04d}.jpg")
+        (self.test_src / "notes.txt").write_text("ignored")
+
+        # An existing file in the target folder forces a rename
+        date = get_image_date(str(self.test_src / "IMG_0000.jpg"))
+        day_dir = self.test_dest / date.strftime("%Y") / date.strftime("%m") / date.strftime("%d")
+        day_dir.mkdir(parents=True)
+        (day_dir / "IMG_0000.jpg").write_bytes(b"already here")
+
+        summary = process_directory(self.test_src, self.test_dest, workers=4, move_workers=3, queue_size=2)
+
+        self.assertEqual(summary["organized"], 20)
+        self.assertEqual(summary["failed"], 0)
+        self.assertEqual(set(summary["timings"]), {"metadata", "plan", "move", "total"})
+        organized = sorted(p.name for p in self.test_dest.glob("**/*.jpg"))
+        self.assertEqual(len(organized), 21)
+        self.assertIn("IMG_0000_1.jpg", organized)
+        self.assertEqual(sorted(p.name for p in self.test_src.iterdir()), ["notes.txt"])
+
+    def test_process_directory_survives_unexpected_move_errors(self):
+        real_transfer = organizer.transfer_file
+        def flaky(file_path, *args, **kwargs):
+            if file_path.name == "IMG_0003.jpg":
+                raise RuntimeError("unexpected")
+            return real_transfer(file_path, *args, **kwargs)
+
+        for move_workers in (1, 2):
+            with self.subTest(move_workers=move_workers):
+                for i in range(6):
+                    self.create_dummy_image(f"IMG_{i:04d}.jpg")
+                with mock.patch("src.organizer.transfer_file", side_effect=flaky):
+                    summary = process_directory(self.test_src, self.test_dest,
+                                                move_workers=move_workers, queue_size=1)
+                self.assertEqual(summary["organized"], 5)
+                self.assertEqual(summary["failed"], 1)
+                self.assertEqual([p.name for p in self.test_src.iterdir()], ["IMG_0003.jpg"])
+                shutil.rmtree(self.test_dest)
+                (self.test_src / "IMG_0003.jpg").unlink()
+
+    def test_process_directory_survives_unusable_target_folder(self):
+        good = self.create_dummy_image("good.jpg")
+        date = get_image_date(str(good))
+        os.utime(self.create_dummy_image("blocked.jpg"), (1_600_000_000, 1_600_000_000))
+        blocked_date = get_image_date(str(self.test_src / "blocked.jpg"))
+        # A file sits where the blocked image's day folder should go
+        month_dir = self.test_dest / blocked_date.strftime("%Y") / blocked_date.strftime("%m")
+        month_dir.mkdir(parents=True)
+        (month_dir / blocked_date.strftime("%d")).write_text("not a folder")
+
+        summary = process_directory(self.test_src, self.test_dest)
+        self.assertEqual((summary["organized"], summary["failed"]), (1, 1))
+        self.assertEqual([p.name for p in self.test_src.iterdir()], ["blocked.jpg"])
+        self.assertTrue((self.test_dest / date.strftime("%Y/%m/%d") / "good.jpg").exists())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import random
+import shutil
+from pathlib import Path
+from PIL import Image, ImageDraw
+from src.deduplicator import Deduplicator
+from src.perceptual_hash import BKTree, dhash, phash, hamming_distance
+
+class TestPerceptualHash(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_phash_data")
+        self.test_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def create_image(self, name, seed, quality=95):
+        rng = random.Random(seed)
+        img = Image.new("RGB", (320, 240), color=(rng.randrange(256), 80, 80))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(280), rng.randrange(200)
+            draw.ellipse((x, y, x + 40, y + 40),
+                         fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        p = self.test_dir / name
+        img.save(p, quality=quality)
+        return p
+
+    def test_reexport_is_close_and_different_photo_is_far(self):
+        original = self.create_image("original.jpg", seed=1, quality=95)
+        reexport = self.create_image("reexport.jpg", seed=1, quality=40)
+        other = self.create_image("other.jpg", seed=2)
+        for hash_function in (dhash, phash):
+            near = hamming_distance(hash_function(original), hash_function(reexport))
+            far = hamming_distance(hash_function(original), hash_function(other))
+            self.assertLessEqual(near, 4)
+            self.assertGreater(far, 10)
+
+    def test_bktree_search_matches_linear_scan(self):
+        rng = random.Random(0)
+        values = [rng.getrandbits(64) for _ in range(500)]
+        tree = BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, i)
+        query = values[42] ^ 0b1011  # 3 bits away from an indexed value
+        expected = sorted(i for i, v in enumerate(values) if hamming_distance(query, v) <= 5)
+        found = sorted(item for _, item in tree.search(query, 5))
+        self.assertEqual(found, expected)
+        self.assertIn(42, found)
+
+    def test_find_near_duplicates_clusters(self):
+        self.create_image("a.jpg", seed=1, quality=95)
+        self.create_image("a_small.jpg", seed=1, quality=30)
+        self.create_image("b.jpg", seed=2)
+        (self.test_dir / "notes.txt").write_text("not an image")
+
+        dedup = Deduplicator(quarantine_dir="test_phash_quarantine")
+        clusters = dedup.find_near_duplicates(self.test_dir, workers=2)
+
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual({p.name for p in clusters[0]}, {"a.jpg", "a_small.jpg"})
+        # Nothing is moved in near-duplicate mode
+        self.assertTrue(all(p.exists() for p in clusters[0]))
+
+if __name__ == '__main__':
+    unittest.main()
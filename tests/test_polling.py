@@ -0,0 +1,89 @@
+import unittest
+import os
+import shutil
+import time
+from pathlib import Path
+from unittest import mock
+from watchdog.events import FileSystemEventHandler
+from src.polling import ScandirPollingObserver, RACY_WINDOW_NS
+
+class Recorder(FileSystemEventHandler):
+    def __init__(self):
+        self.events = []
+
+    def on_any_event(self, event):
+        self.events.append((event.event_type, os.path.relpath(event.src_path),
+                            os.path.relpath(event.dest_path) if event.dest_path else None))
+
+class TestScandirPollingObserver(unittest.TestCase):
+    def setUp(self):
+        self.root = Path("test_polling_data")
+        (self.root / "sub").mkdir(parents=True, exist_ok=True)
+        (self.root / "old.jpg").write_bytes(b"old")
+        self.recorder = Recorder()
+        self.observer = ScandirPollingObserver()
+        self.observer.schedule(self.recorder, str(self.root), recursive=True)
+        # Baseline only; polls are driven by the tests
+        for _, root, recursive, snapshot in self.observer._watches:
+            self.observer._scan(root, recursive, snapshot, [])
+
+    def tearDown(self):
+        if self.root.exists():
+            shutil.rmtree(self.root)
+
+    def poll(self):
+        self.recorder.events.clear()
+        self.observer.poll()
+        return sorted(self.recorder.events)
+
+    def test_baseline_reports_nothing(self):
+        self.assertEqual(self.poll(), [])
+
+    def test_created_modified_moved_deleted(self):
+        new = self.root / "sub" / "new.jpg"
+        new.write_bytes(b"x")
+        self.assertEqual(self.poll(), [("created", str(new), None)])
+
+        new.write_bytes(b"xx")
+        self.assertEqual(self.poll(), [("modified", str(new), None)])
+
+        moved = self.root / "moved.jpg"
+        new.rename(moved)
+        self.assertEqual(self.poll(), [("moved", str(new), str(moved))])
+
+        moved.unlink()
+        self.assertEqual(self.poll(), [("deleted", str(moved), None)])
+
+    def test_new_and_removed_subtrees(self):
+        deep = self.root / "sub" / "a" / "b"
+        deep.mkdir(parents=True)
+        (deep / "one.jpg").write_bytes(b"1")
+        self.assertEqual(self.poll(), [("created", str(deep / "one.jpg"), None)])
+
+        shutil.rmtree(self.root / "sub" / "a")
+        self.assertEqual(self.poll(), [("deleted", str(deep / "one.jpg"), None)])
+
+    def test_unchanged_directories_are_not_listed(self):
+        past = time.time_ns() - 2 * RACY_WINDOW_NS
+        for directory in (self.root, self.root / "sub"):
+            os.utime(directory, ns=(past, past))
+        self.poll()  # Relists once, now that the mtimes are old enough to trust
+        with mock.patch.object(ScandirPollingObserver, "_list", wraps=ScandirPollingObserver._list) as listing:
+            self.assertEqual(self.poll(), [])
+            listing.assert_not_called()
+
+            (self.root / "sub" / "late.jpg").write_bytes(b"x")
+            self.assertEqual(self.poll(), [("created", str(self.root / "sub" / "late.jpg"), None)])
+            listed = [os.path.relpath(call.args[0]) for call in listing.call_args_list]
+            self.assertEqual(listed, [str(self.root / "sub")])
+
+    def test_adaptive_interval(self):
+        observer = ScandirPollingObserver(min_interval=0.5, max_interval=4, backoff=2)
+        for expected in (1, 2, 4, 4):
+            observer._adapt(0)
+            self.assertEqual(observer.interval, expected)
+        observer._adapt(3)
+        self.assertEqual(observer.interval, 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
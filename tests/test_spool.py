@@ -0,0 +1,78 @@
+import unittest
+import shutil
+import threading
+import time
+from pathlib import Path
+from src.spool import SpoolQueue
+
+class TestSpoolQueue(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_spool_data")
+        self.test_dir.mkdir(exist_ok=True)
+        self.spool_path = self.test_dir / "queue.spool"
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_spills_beyond_memory_limit_in_order(self):
+        queue = SpoolQueue(self.spool_path, max_memory=10)
+        for i in range(100):
+            queue.put(f"file_{i}.jpg")
+        self.assertEqual(queue.depth(), 100)
+        self.assertEqual(len(queue._memory), 10)
+        self.assertGreater(self.spool_path.stat().st_size, 0)
+
+        self.assertEqual([queue.get() for _ in range(100)], [f"file_{i}.jpg" for i in range(100)])
+        self.assertEqual(queue.depth(), 0)
+        # Fully drained spool is truncated
+        self.assertEqual(self.spool_path.stat().st_size, 0)
+        queue.close()
+
+    def test_survives_restart(self):
+        queue = SpoolQueue(self.spool_path, max_memory=5)
+        for i in range(20):
+            queue.put(f"file_{i}.jpg")
+        for i in range(7):
+            self.assertEqual(queue.get(), f"file_{i}.jpg")
+        queue.close()
+
+        # A torn record from a crash during the next append is ignored
+        with open(self.spool_path, "ab") as f:
+            f.write(b'{"path": "half')
+        queue = SpoolQueue(self.spool_path, max_memory=5)
+        self.assertEqual(queue.depth(), 13)
+        self.assertEqual([queue.get() for _ in range(13)], [f"file_{i}.jpg" for i in range(7, 20)])
+        self.assertIsNone(queue.get(timeout=0.01))
+        queue.close()
+
+    def test_oldest_age(self):
+        queue = SpoolQueue(max_memory=10)
+        self.assertIsNone(queue.oldest_age())
+        queue.put("a.jpg")
+        time.sleep(0.05)
+        queue.put("b.jpg")
+        self.assertGreaterEqual(queue.oldest_age(), 0.05)
+        queue.get()
+        self.assertLess(queue.oldest_age(), 0.05)
+        queue.close()
+
+    def test_memory_only_queue_applies_backpressure(self):
+        queue = SpoolQueue(max_memory=2)
+        queue.put("a.jpg")
+        queue.put("b.jpg")
+        done = threading.Event()
+
+        def producer():
+            queue.put("c.jpg")
+            done.set()
+
+        threading.Thread(target=producer, daemon=True).start()
+        self.assertFalse(done.wait(0.1))
+        self.assertEqual(queue.get(), "a.jpg")
+        self.assertTrue(done.wait(5))
+        self.assertEqual(queue.depth(), 2)
+        queue.close()
+
+if __name__ == '__main__':
+    unittest.main()
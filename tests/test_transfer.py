@@ -0,0 +1,119 @@
+import unittest
+import errno
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+from src import transfer
+from src.transfer import move_file, copy_file
+
+class TestTransfer(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_transfer_data")
+        self.test_dir.mkdir(exist_ok=True)
+        self.payload = os.urandom(3 * transfer.COPY_BLOCK_SIZE + 123)
+        self.src = self.test_dir / "src.jpg"
+        self.src.write_bytes(self.payload)
+        os.utime(self.src, (1_600_000_000, 1_600_000_000))
+        self.dst = self.test_dir / "dst.jpg"
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def cross_device(self):
+        return mock.patch("src.transfer.os.link", side_effect=OSError(errno.EXDEV, "cross-device"))
+
+    def test_same_device_move_is_a_link(self):
+        with mock.patch("src.transfer._hashing_copy") as hashing:
+            self.assertIsNone(move_file(self.src, self.dst))
+        hashing.assert_not_called()
+        self.assertFalse(self.src.exists())
+        self.assertEqual(self.dst.read_bytes(), self.payload)
+
+    def test_cross_device_move_uses_kernel_copy(self):
+        with self.cross_device(), mock.patch("src.transfer._hashing_copy") as hashing, \
+             mock.patch("src.transfer.os.fsync", wraps=os.fsync) as fsync:
+            self.assertIsNone(move_file(self.src, self.dst))
+        # Nothing to compare a digest with: no Python-level copy
+        hashing.assert_not_called()
+        fsync.assert_called_once()
+        self.assertFalse(self.src.exists())
+        self.assertEqual(self.dst.read_bytes(), self.payload)
+        self.assertEqual(self.dst.stat().st_mtime, 1_600_000_000)
+
+    def test_cross_device_move_with_digest_is_compared(self):
+        payload_digest = hashlib.md5(self.payload).hexdigest()
+        with self.cross_device(), mock.patch("src.transfer._kernel_copy") as kernel:
+            self.assertEqual(move_file(self.src, self.dst, expected=payload_digest), payload_digest)
+        kernel.assert_not_called()
+        self.assertEqual(self.dst.read_bytes(), self.payload)
+
+        # Without a kernel copy the Python-level copy is hashed anyway
+        other = self.test_dir / "other.jpg"
+        with self.cross_device(), mock.patch("src.transfer._kernel_copy", return_value=False):
+            self.assertEqual(move_file(self.dst, other), payload_digest)
+        self.assertEqual(other.read_bytes(), self.payload)
+
+    def test_checksum_mismatch_keeps_source(self):
+        with self.cross_device(), mock.patch("src.transfer.open", wraps=open) as opened:
+            with self.assertRaises(OSError):
+                move_file(self.src, self.dst, expected="bad")
+        self.assertEqual(self.src.read_bytes(), self.payload)
+        self.assertFalse(self.dst.exists())
+        # One read pass: the copy is not read back
+        self.assertEqual([call.args[1] for call in opened.call_args_list], ["rb", "xb"])
+
+        with self.cross_device():
+            move_file(self.src, self.dst, expected=hashlib.md5(self.payload).hexdigest())
+        self.assertEqual(self.dst.read_bytes(), self.payload)
+
+    def test_failed_source_unlink_removes_copy(self):
+        real_unlink = os.unlink
+
+        def unlink(path):
+            if Path(path) == self.src:
+                raise PermissionError(errno.EACCES, "read-only source")
+            real_unlink(path)
+
+        for patch in (self.cross_device(), mock.patch("src.transfer.os.link", wraps=os.link)):
+            with patch, mock.patch("src.transfer.os.unlink", side_effect=unlink):
+                with self.assertRaises(PermissionError):
+                    move_file(self.src, self.dst)
+            self.assertFalse(self.dst.exists())
+            self.assertEqual(self.src.read_bytes(), self.payload)
+
+    def test_copy_uses_kernel_and_falls_back(self):
+        self.assertIsNone(copy_file(self.src, self.dst))
+        self.assertEqual(self.dst.read_bytes(), self.payload)
+        self.assertEqual(self.dst.stat().st_mtime, 1_600_000_000)
+
+        unsupported = OSError(errno.ENOSYS, "not here")
+        other = self.test_dir / "fallback.jpg"
+        with mock.patch("src.transfer.os.copy_file_range", side_effect=unsupported, create=True), \
+             mock.patch("src.transfer.os.sendfile", side_effect=unsupported, create=True):
+            copy_file(self.src, other)
+        self.assertEqual(other.read_bytes(), self.payload)
+        self.assertTrue(self.src.exists())
+
+    def test_never_overwrites_existing_target(self):
+        self.dst.write_bytes(b"USER FILE")
+        no_links = mock.patch("src.transfer.os.link", side_effect=OSError(errno.EPERM, "no links"))
+        for patch in (mock.patch("src.transfer.os.link", wraps=os.link), no_links, self.cross_device()):
+            with patch, self.assertRaises(FileExistsError):
+                move_file(self.src, self.dst)
+            self.assertEqual(self.dst.read_bytes(), b"USER FILE")
+            self.assertEqual(self.src.read_bytes(), self.payload)
+        with self.assertRaises(FileExistsError):
+            copy_file(self.src, self.dst)
+        self.assertEqual(self.dst.read_bytes(), b"USER FILE")
+
+    def test_move_without_hardlinks(self):
+        with mock.patch("src.transfer.os.link", side_effect=OSError(errno.EPERM, "no links")):
+            self.assertIsNone(move_file(self.src, self.dst))
+        self.assertFalse(self.src.exists())
+        self.assertEqual(self.dst.read_bytes(), self.payload)
+
+if __name__ == '__main__':
+    unittest.main()